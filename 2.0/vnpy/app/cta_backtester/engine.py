@@ -14,13 +14,21 @@ from vnpy.trader.object import HistoryRequest
 from vnpy.trader.rqdata import rqdata_client
 from vnpy.trader.database import database_manager
 from vnpy.app.cta_strategy import CtaTemplate
-from vnpy.app.cta_strategy.backtesting import BacktestingEngine, OptimizationSetting
+from vnpy.app.cta_strategy.backtesting import (
+    BacktestingEngine,
+    OptimizationSetting,
+    OptimizationExecutor
+)
+from vnpy.app.cta_strategy.batch import BatchBacktestingEngine
 
 APP_NAME = "CtaBacktester"
 
 EVENT_BACKTESTER_LOG = "eBacktesterLog"
 EVENT_BACKTESTER_BACKTESTING_FINISHED = "eBacktesterBacktestingFinished"
 EVENT_BACKTESTER_OPTIMIZATION_FINISHED = "eBacktesterOptimizationFinished"
+EVENT_BACKTESTER_OPTIMIZATION_PROGRESS = "eBacktesterOptimizationProgress"
+EVENT_BACKTESTER_BATCH_FINISHED = "eBacktesterBatchFinished"
+EVENT_BACKTESTER_BATCH_PROGRESS = "eBacktesterBatchProgress"
 
 
 class BacktesterEngine(BaseEngine):
@@ -36,6 +44,9 @@ class BacktesterEngine(BaseEngine):
         self.backtesting_engine = None
         self.thread = None
 
+        # Worker processes are kept alive for later optimization
+        self.executor = None
+
         # Backtesting reuslt
         self.result_df = None
         self.result_statistics = None
@@ -43,6 +54,9 @@ class BacktesterEngine(BaseEngine):
         # Optimization result
         self.result_values = None
 
+        # Batch backtesting result
+        self.batch_engine = None
+
     def init_engine(self):
         """"""
         self.write_log("初始化CTA回测引擎")
@@ -51,6 +65,11 @@ class BacktesterEngine(BaseEngine):
         # Redirect log from backtesting engine outside.
         self.backtesting_engine.output = self.write_log
 
+        self.executor = OptimizationExecutor(output=self.write_log)
+
+        self.batch_engine = BatchBacktestingEngine()
+        self.batch_engine.output = self.write_log
+
         self.load_strategy_class()
         self.write_log("策略文件加载完成")
 
@@ -167,9 +186,18 @@ class BacktesterEngine(BaseEngine):
         )
 
         engine.load_data()
-        engine.run_backtesting()
-        self.result_df = engine.calculate_result()
-        self.result_statistics = engine.calculate_statistics(output=False)
+
+        # Skip running if identical backtesting is cached
+        statistics = engine.load_result_cache()
+
+        if statistics:
+            self.result_df = engine.daily_df
+            self.result_statistics = statistics
+        else:
+            engine.run_backtesting()
+            self.result_df = engine.calculate_result()
+            self.result_statistics = engine.calculate_statistics(output=False)
+            engine.save_result_cache(self.result_statistics)
 
         # Clear thread object handler.
         self.thread = None
@@ -285,12 +313,16 @@ class BacktesterEngine(BaseEngine):
         if use_ga:
             self.result_values = engine.run_ga_optimization(
                 optimization_setting,
-                output=False
+                output=False,
+                executor=self.executor,
+                callback=self.put_optimization_progress
             )
         else:
             self.result_values = engine.run_optimization(
                 optimization_setting,
-                output=False
+                output=False,
+                executor=self.executor,
+                callback=self.put_optimization_progress
             )
 
         # Clear thread object handler.
@@ -301,6 +333,32 @@ class BacktesterEngine(BaseEngine):
         event = Event(EVENT_BACKTESTER_OPTIMIZATION_FINISHED)
         self.event_engine.put(event)
 
+    def put_optimization_progress(self, finished: int, total: int, results: list):
+        """"""
+        event = Event(
+            EVENT_BACKTESTER_OPTIMIZATION_PROGRESS,
+            {"finished": finished, "total": total, "results": results}
+        )
+        self.event_engine.put(event)
+
+    def stop_optimization(self):
+        """
+        Cancel running optimization or batch backtesting, finished results
+        are still kept.
+        """
+        if not self.thread or not self.executor:
+            return False
+
+        self.executor.cancel()
+        self.write_log("已发出停止请求，等待运行中的回测完成")
+        return True
+
+    def close(self):
+        """"""
+        if self.executor:
+            self.executor.cancel()
+            self.executor.stop()
+
     def start_optimization(
         self,
         class_name: str,
@@ -344,6 +402,103 @@ class BacktesterEngine(BaseEngine):
 
         return True
 
+    def run_batch_backtesting(
+        self,
+        class_name: str,
+        interval: str,
+        start: datetime,
+        end: datetime,
+        capital: int,
+        tasks: list
+    ):
+        """
+        Each task is a dict with vt_symbol, setting, rate, slippage, size,
+        pricetick and optional inverse.
+        """
+        engine = self.batch_engine
+        engine.clear_tasks()
+
+        engine.set_parameters(
+            strategy_class=self.classes[class_name],
+            interval=interval,
+            start=start,
+            end=end,
+            capital=capital
+        )
+
+        for task in tasks:
+            engine.add_task(**task)
+
+        engine.run_batch(
+            executor=self.executor,
+            callback=self.put_batch_progress
+        )
+        engine.calculate_result()
+
+        # Clear thread object handler.
+        self.thread = None
+
+        # Put batch backtesting done event
+        event = Event(EVENT_BACKTESTER_BATCH_FINISHED)
+        self.event_engine.put(event)
+
+    def put_batch_progress(self, finished: int, total: int, result: dict):
+        """"""
+        event = Event(
+            EVENT_BACKTESTER_BATCH_PROGRESS,
+            {"finished": finished, "total": total, "result": result}
+        )
+        self.event_engine.put(event)
+
+    def start_batch_backtesting(
+        self,
+        class_name: str,
+        interval: str,
+        start: datetime,
+        end: datetime,
+        capital: int,
+        tasks: list
+    ):
+        if self.thread:
+            self.write_log("已有任务在运行中，请等待完成")
+            return False
+
+        self.write_log("-" * 40)
+        self.thread = Thread(
+            target=self.run_batch_backtesting,
+            args=(
+                class_name,
+                interval,
+                start,
+                end,
+                capital,
+                tasks
+            )
+        )
+        self.thread.start()
+
+        return True
+
+    def get_batch_statistics(self):
+        """
+        Return statistics of each task and of aggregate equity curve.
+        """
+        engine = self.batch_engine
+        if not engine.results:
+            return None, None
+
+        return engine.get_statistics_df(), engine.calculate_statistics(output=False)
+
+    def get_batch_balance(self):
+        """
+        Return equity curve of each task and aggregate daily result.
+        """
+        engine = self.batch_engine
+        if not engine.results:
+            return None, None
+
+        return engine.get_balance_df(), engine.daily_df
+
     def run_downloading(
         self,
         vt_symbol: str,
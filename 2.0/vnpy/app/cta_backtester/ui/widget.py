@@ -19,6 +19,7 @@ from ..engine import (
     EVENT_BACKTESTER_LOG,
     EVENT_BACKTESTER_BACKTESTING_FINISHED,
     EVENT_BACKTESTER_OPTIMIZATION_FINISHED,
+    EVENT_BACKTESTER_OPTIMIZATION_PROGRESS,
     OptimizationSetting
 )
 
@@ -31,6 +32,7 @@ class BacktesterManager(QtWidgets.QWidget):
     signal_log = QtCore.pyqtSignal(Event)
     signal_backtesting_finished = QtCore.pyqtSignal(Event)
     signal_optimization_finished = QtCore.pyqtSignal(Event)
+    signal_optimization_progress = QtCore.pyqtSignal(Event)
 
     def __init__(self, main_engine: MainEngine, event_engine: EventEngine):
         """"""
@@ -107,6 +109,12 @@ class BacktesterManager(QtWidgets.QWidget):
         self.result_button.clicked.connect(self.show_optimization_result)
         self.result_button.setEnabled(False)
 
+        self.stop_button = QtWidgets.QPushButton("停止优化")
+        self.stop_button.clicked.connect(self.stop_optimization)
+        self.stop_button.setEnabled(False)
+
+        self.progress_bar = QtWidgets.QProgressBar()
+
         downloading_button = QtWidgets.QPushButton("下载数据")
         downloading_button.clicked.connect(self.start_downloading)
 
@@ -137,6 +145,7 @@ class BacktesterManager(QtWidgets.QWidget):
             optimization_button,
             downloading_button,
             self.result_button,
+            self.stop_button,
             self.order_button,
             self.trade_button,
             self.daily_button,
@@ -173,6 +182,8 @@ class BacktesterManager(QtWidgets.QWidget):
         left_vbox.addLayout(result_grid)
         left_vbox.addStretch()
         left_vbox.addWidget(optimization_button)
+        left_vbox.addWidget(self.progress_bar)
+        left_vbox.addWidget(self.stop_button)
         left_vbox.addWidget(self.result_button)
         left_vbox.addStretch()
         left_vbox.addWidget(edit_button)
@@ -257,12 +268,16 @@ class BacktesterManager(QtWidgets.QWidget):
             self.process_backtesting_finished_event)
         self.signal_optimization_finished.connect(
             self.process_optimization_finished_event)
+        self.signal_optimization_progress.connect(
+            self.process_optimization_progress_event)
 
         self.event_engine.register(EVENT_BACKTESTER_LOG, self.signal_log.emit)
         self.event_engine.register(
             EVENT_BACKTESTER_BACKTESTING_FINISHED, self.signal_backtesting_finished.emit)
         self.event_engine.register(
             EVENT_BACKTESTER_OPTIMIZATION_FINISHED, self.signal_optimization_finished.emit)
+        self.event_engine.register(
+            EVENT_BACKTESTER_OPTIMIZATION_PROGRESS, self.signal_optimization_progress.emit)
 
     def process_log_event(self, event: Event):
         """"""
@@ -292,6 +307,13 @@ class BacktesterManager(QtWidgets.QWidget):
         """"""
         self.write_log("请点击[优化结果]按钮查看")
         self.result_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+
+    def process_optimization_progress_event(self, event: Event):
+        """"""
+        data = event.data
+        self.progress_bar.setMaximum(data["total"])
+        self.progress_bar.setValue(data["finished"])
 
     def start_backtesting(self):
         """"""
@@ -391,7 +413,7 @@ class BacktesterManager(QtWidgets.QWidget):
         optimization_setting, use_ga = dialog.get_setting()
         self.target_display = dialog.target_display
 
-        self.backtester_engine.start_optimization(
+        result = self.backtester_engine.start_optimization(
             class_name,
             vt_symbol,
             interval,
@@ -407,7 +429,15 @@ class BacktesterManager(QtWidgets.QWidget):
             use_ga
         )
 
-        self.result_button.setEnabled(False)
+        if result:
+            self.result_button.setEnabled(False)
+            self.stop_button.setEnabled(True)
+            self.progress_bar.setValue(0)
+
+    def stop_optimization(self):
+        """"""
+        if self.backtester_engine.stop_optimization():
+            self.stop_button.setEnabled(False)
 
     def start_downloading(self):
         """"""
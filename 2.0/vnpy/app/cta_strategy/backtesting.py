@@ -1,12 +1,22 @@
-from collections import defaultdict
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import fields
 from datetime import date, datetime, timedelta
-from typing import Callable
-from itertools import product
-from functools import lru_cache
+from operator import attrgetter
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, TYPE_CHECKING
+from itertools import chain, dropwhile, islice, product
+from functools import lru_cache, partial
+from queue import Full, Queue
 from time import time
+import gc
+import hashlib
 import multiprocessing
+import os
+import pickle
 import random
+import shutil
 import traceback
+from pathlib import Path
+from threading import Event, Thread
 
 import numpy as np
 from pandas import DataFrame
@@ -14,11 +24,20 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from deap import creator, base, tools, algorithms
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:     # Python 3.7
+    shared_memory = None
+
 from vnpy.trader.constant import (Direction, Offset, Exchange,
                                   Interval, Status)
-from vnpy.trader.database import database_manager
+from vnpy.trader.setting import SETTINGS
+from vnpy.trader.database import database_manager, tick_archive
+from vnpy.trader.database.database import aggregate_bars, BAR_ARRAY_FIELDS
+from vnpy.trader.database.tick_archive import TICK_ORDERED_FIELDS
 from vnpy.trader.object import OrderData, TradeData, BarData, TickData
-from vnpy.trader.utility import round_to
+from vnpy.trader.utility import round_to, get_folder_path, get_day_starts, split_days
+from vnpy.trader.profiler import BacktestingProfiler
 
 from .base import (
     BacktestingMode,
@@ -29,7 +48,41 @@ from .base import (
     INTERVAL_DELTA_MAP
 )
 from .template import CtaTemplate
-
+from .cache import backtesting_cache, generate_cache_key, get_code_fingerprint
+
+if TYPE_CHECKING:
+    from .search import SearchAlgorithm
+
+
+BAR_ORDERED_FIELDS = [f.name for f in fields(BarData) if f.name in BAR_ARRAY_FIELDS]
+
+# Engine attributes saved in backtesting checkpoint together with strategy
+CHECKPOINT_FIELDS = [
+    "datetime",
+    "bar",
+    "tick",
+    "days",
+    "stop_order_count",
+    "stop_orders",
+    "active_stop_orders",
+    "limit_order_count",
+    "limit_orders",
+    "active_limit_orders",
+    "stop_order_index",
+    "limit_order_index",
+    "submitting_orders",
+    "trade_count",
+    "trades",
+    "logs",
+    "daily_results",
+]
+
+# Shared memory blocks attached by worker process
+shared_memories = {}
+
+# Optimization config and cancel event of worker process
+worker_configs = {}
+worker_cancel_event = None
 
 # Set deap algo
 creator.create("FitnessMax", base.Fitness, weights=(1.0,))
@@ -128,6 +181,8 @@ class BacktestingEngine:
         self.interval = None
         self.days = 0
         self.callback = None
+        self.init_interval = Interval.MINUTE
+        self.init_window = 0
         self.history_data = []
 
         self.stop_order_count = 0
@@ -138,6 +193,17 @@ class BacktestingEngine:
         self.limit_orders = {}
         self.active_limit_orders = {}
 
+        # Active orders sorted by price for crossing
+        self.stop_order_index = {
+            Direction.LONG: OrderPriceIndex(),
+            Direction.SHORT: OrderPriceIndex()
+        }
+        self.limit_order_index = {
+            Direction.LONG: OrderPriceIndex(),
+            Direction.SHORT: OrderPriceIndex()
+        }
+        self.submitting_orders = []
+
         self.trade_count = 0
         self.trades = {}
 
@@ -146,6 +212,16 @@ class BacktestingEngine:
         self.daily_results = {}
         self.daily_df = None
 
+        self.strategy_setting = {}
+        self.data_fingerprint = ""
+
+        # Snapshot state every checkpoint_interval trading days
+        self.checkpoint_interval = 0
+        self.resume_datetime = None
+
+        self.profiling = False
+        self.profiler = None
+
     def clear_data(self):
         """
         Clear all data of last backtesting.
@@ -163,12 +239,21 @@ class BacktestingEngine:
         self.limit_orders.clear()
         self.active_limit_orders.clear()
 
+        for index in self.stop_order_index.values():
+            index.clear()
+        for index in self.limit_order_index.values():
+            index.clear()
+        self.submitting_orders.clear()
+
         self.trade_count = 0
         self.trades.clear()
 
         self.logs.clear()
         self.daily_results.clear()
 
+        self.resume_datetime = None
+        self.profiler = None
+
     def set_parameters(
         self,
         vt_symbol: str,
@@ -204,14 +289,21 @@ class BacktestingEngine:
     def add_strategy(self, strategy_class: type, setting: dict):
         """"""
         self.strategy_class = strategy_class
+        self.strategy_setting = setting
         self.strategy = strategy_class(
             self, strategy_class.__name__, self.vt_symbol, setting
         )
 
-    def load_data(self):
-        """"""
+    def load_data(self, prefetch_chunks: int = 0, chunk_days: int = 30):
+        """
+        If prefetch_chunks is set, history data is not loaded here but by
+        a background thread during run_backtesting, chunk by chunk of
+        chunk_days, with at most prefetch_chunks loaded chunks waiting.
+        """
         self.output("开始加载历史数据")
 
+        self.data_fingerprint = ""
+
         if not self.end:
             self.end = datetime.now()
 
@@ -219,93 +311,214 @@ class BacktestingEngine:
             self.output("起始日期必须小于结束日期")
             return
 
-        self.history_data.clear()       # Clear previously loaded history data
-
-        # Load 30 days of data each time and allow for progress update
-        progress_delta = timedelta(days=30)
-        total_delta = self.end - self.start
-        interval_delta = INTERVAL_DELTA_MAP[self.interval]
-
-        start = self.start
-        end = self.start + progress_delta
-        progress = 0
+        # Clear previously loaded history data
+        if isinstance(self.history_data, PrefetchHistoryData):
+            self.history_data.close()
+            self.history_data = []
+        self.history_data.clear()
+
+        # Only data after checkpoint is needed when resuming
+        if self.resume_datetime:
+            start = self.resume_datetime.replace(tzinfo=None)
+            if start >= self.end:
+                self.output("检查点已覆盖回测区间，无需加载历史数据")
+                return
+        else:
+            start = self.start
 
-        while start < self.end:
-            end = min(end, self.end)  # Make sure end time stays within set range
+        periods = self.get_load_periods(start, chunk_days)
 
-            if self.mode == BacktestingMode.BAR:
-                data = load_bar_data(
-                    self.symbol,
-                    self.exchange,
-                    self.interval,
-                    start,
-                    end
-                )
-            else:
-                data = load_tick_data(
-                    self.symbol,
-                    self.exchange,
-                    start,
-                    end
-                )
+        if prefetch_chunks:
+            self.history_data = PrefetchHistoryData(
+                self.load_period_data, periods, prefetch_chunks, self.output
+            )
+            self.output(f"历史数据将在回测时后台加载，分段数量：{len(periods)}")
+            return
 
+        # Load chunks one by one and allow for progress update
+        for n, (start, end) in enumerate(periods):
+            data = self.load_period_data(start, end, True)
             self.history_data.extend(data)
 
-            progress += progress_delta / total_delta
-            progress = min(progress, 1)
+            progress = (n + 1) / len(periods)
             progress_bar = "#" * int(progress * 10)
             self.output(f"加载进度：{progress_bar} [{progress:.0%}]")
 
+        self.output(f"历史数据加载完成，数据量：{len(self.history_data)}")
+
+    def get_load_periods(self, start: datetime, chunk_days: int) -> List[tuple]:
+        """
+        Split period from start to end of backtesting into chunks for
+        loading data.
+        """
+        progress_delta = timedelta(days=chunk_days)
+        interval_delta = INTERVAL_DELTA_MAP[self.interval]
+
+        periods = []
+        end = start + progress_delta
+
+        while start < self.end:
+            end = min(end, self.end)  # Make sure end time stays within set range
+            periods.append((start, end))
+
             start = end + interval_delta
             end += (progress_delta + interval_delta)
 
-        self.output(f"历史数据加载完成，数据量：{len(self.history_data)}")
+        return periods
 
-    def run_backtesting(self):
+    def load_period_data(self, start: datetime, end: datetime, use_cache: bool = False) -> list:
+        """
+        Load data of one chunk. Cached loading functions are not used by
+        prefetching, so that memory is not held by the cache.
+        """
+        if self.mode == BacktestingMode.BAR:
+            func = load_bar_data if use_cache else load_bar_data.__wrapped__
+            return func(self.symbol, self.exchange, self.interval, start, end)
+        else:
+            func = load_tick_data if use_cache else load_tick_data.__wrapped__
+            return func(self.symbol, self.exchange, start, end)
+
+    def set_profiling(self, profiling: bool):
+        """
+        Time engine stages and strategy callbacks during replay, the
+        breakdown is output together with statistics.
+        """
+        self.profiling = profiling
+
+    def start_profiling(self):
         """"""
+        self.profiler = BacktestingProfiler()
+        self.profiler.wrap_engine(self, [
+            "new_bar",
+            "new_tick",
+            "cross_limit_order",
+            "cross_stop_order",
+            "update_daily_close",
+            "send_order",
+            "cancel_order",
+        ])
+        self.profiler.wrap_strategy(self.strategy, [
+            "on_bar",
+            "on_tick",
+            "on_trade",
+            "on_order",
+            "on_stop_order",
+        ])
+        self.profiler.start()
+
+    def run_backtesting(self):
+        """
+        History data is replayed day by day, with day boundaries found in
+        batch instead of comparing datetime of every data. Daily close
+        price is updated once at the end of each day.
+        """
+        if self.resume_datetime:
+            # Strategy is restored from checkpoint, skip data replayed before
+            resume_datetime = self.resume_datetime
+            days = iterate_days(dropwhile(
+                lambda data: data.datetime <= resume_datetime, self.history_data
+            ))
+            self.output(f"已从检查点恢复：{resume_datetime}，开始回放历史数据")
+        else:
+            days = self.init_strategy()
+            if days is None:
+                return
+
+            self.strategy.on_start()
+            self.strategy.trading = True
+            self.output("开始回放历史数据")
+
+        if self.profiling:
+            self.start_profiling()
+        else:
+            self.profiler = None
+
         if self.mode == BacktestingMode.BAR:
             func = self.new_bar
+            get_price = attrgetter("close_price")
         else:
             func = self.new_tick
+            get_price = attrgetter("last_price")
+
+        checkpoint_count = 0
+        day_count = 0
+
+        try:
+            for day_data in days:
+                # State at the end of previous day is saved
+                if self.checkpoint_interval and self.datetime:
+                    day_count += 1
+                    if day_count >= self.checkpoint_interval:
+                        day_count = 0
+                        checkpoint_count += self.save_checkpoint()
+
+                try:
+                    for data in day_data:
+                        func(data)
+                except Exception:
+                    self.output("触发异常，回测终止")
+                    self.output(traceback.format_exc())
+
+                    # Keep result of the unfinished day for trades in it
+                    self.update_daily_close(get_price(data))
+                    return
+
+                self.update_daily_close(get_price(day_data[-1]))
+        finally:
+            if self.profiler:
+                self.profiler.stop()
+
+        # Final state is saved for extending backtesting period later
+        if self.checkpoint_interval:
+            checkpoint_count += self.save_checkpoint()
+            self.output(f"回测检查点保存数量：{checkpoint_count}")
 
+        self.output("历史数据回放结束")
+
+    def init_strategy(self) -> Optional[Iterator[list]]:
+        """
+        Use the first [days] of history data for initializing strategy.
+        History data is iterated only once, so that prefetched data can
+        be released after replay. Return iterator of data lists of the
+        rest days, or None if initializing failed.
+        """
         self.strategy.on_init()
 
-        # Use the first [days] of history data for initializing strategy
-        day_count = 1
-        ix = 0
+        days = iterate_days(self.history_data)
+
+        # Window bars are aggregated in batch from 1-minute bars
+        aggregate = self.init_window and self.mode == BacktestingMode.BAR
+        init_bars = []
 
-        for ix, data in enumerate(self.history_data):
-            if self.datetime and data.datetime.day != self.datetime.day:
-                day_count += 1
-                if day_count >= self.days:
-                    break
+        # Backtesting starts from the first data of the [days]th day
+        for day_data in islice(days, max(self.days - 1, 1)):
+            self.datetime = day_data[-1].datetime
 
-            self.datetime = data.datetime
+            if aggregate:
+                init_bars.extend(day_data)
+                continue
 
             try:
-                self.callback(data)
+                for data in day_data:
+                    self.callback(data)
             except Exception:
                 self.output("触发异常，回测终止")
                 self.output(traceback.format_exc())
-                return
+                return None
+
+        if aggregate:
+            for bar in aggregate_bars(init_bars, self.init_window, self.init_interval):
+                try:
+                    self.callback(bar)
+                except Exception:
+                    self.output("触发异常，回测终止")
+                    self.output(traceback.format_exc())
+                    return None
 
         self.strategy.inited = True
         self.output("策略初始化完成")
 
-        self.strategy.on_start()
-        self.strategy.trading = True
-        self.output("开始回放历史数据")
-
-        # Use the rest of history data for running backtesting
-        for data in self.history_data[ix:]:
-            try:
-                func(data)
-            except Exception:
-                self.output("触发异常，回测终止")
-                self.output(traceback.format_exc())
-                return
-
-        self.output("历史数据回放结束")
+        return days
 
     def calculate_result(self):
         """"""
@@ -315,37 +528,117 @@ class BacktestingEngine:
             self.output("成交记录为空，无法计算")
             return
 
-        # Add trade data into daily reuslt.
-        for trade in self.trades.values():
+        daily_results = list(self.daily_results.values())
+        day_count = len(daily_results)
+        day_index = {d: ix for ix, d in enumerate(self.daily_results)}
+
+        # Add trade data into daily result.
+        for daily_result in daily_results:
+            daily_result.trades = []
+
+        trades = list(self.trades.values())
+        trade_day = []
+
+        for trade in trades:
             d = trade.datetime.date()
-            daily_result = self.daily_results[d]
-            daily_result.add_trade(trade)
-
-        # Calculate daily result by iteration.
-        pre_close = 0
-        start_pos = 0
-
-        for daily_result in self.daily_results.values():
-            daily_result.calculate_pnl(
-                pre_close,
-                start_pos,
-                self.size,
-                self.rate,
-                self.slippage,
-                self.inverse
-            )
+            self.daily_results[d].add_trade(trade)
+            trade_day.append(day_index[d])
+
+        # Sort trades by day, same as iterating trades of each daily result
+        trade_day = np.array(trade_day, dtype=np.int64)
+        ix = np.argsort(trade_day, kind="stable")
+        trade_day = trade_day[ix]
+
+        price = np.array([trade.price for trade in trades])[ix]
+        volume = np.array([trade.volume for trade in trades])[ix]
+        long_trade = np.array([trade.direction == Direction.LONG for trade in trades])[ix]
+        pos_change = np.where(long_trade, volume, -volume)
+
+        close_price = np.array([daily_result.close_price for daily_result in daily_results])
+        trade_close = close_price[trade_day]
 
-            pre_close = daily_result.close_price
-            start_pos = daily_result.end_pos
+        # If no pre_close provided on the first day,
+        # use value 1 to avoid zero division error
+        pre_close = np.empty_like(close_price)
+        pre_close[0] = 0
+        pre_close[1:] = close_price[:-1]
+        pre_close[pre_close == 0] = 1
+
+        # Position is accumulated in order of trades across days
+        end_pos = np.cumsum(pos_change)[
+            np.searchsorted(trade_day, np.arange(day_count), side="right") - 1
+        ]
+        end_pos[np.arange(day_count) < trade_day[0]] = 0
+        start_pos = np.empty_like(end_pos)
+        start_pos[0] = 0
+        start_pos[1:] = end_pos[:-1]
+
+        size = self.size
+        if not self.inverse:     # For normal contract
+            holding_pnl = start_pos * (close_price - pre_close) * size
+            turnover = volume * size * price
+            trading_pnl = pos_change * (trade_close - price) * size
+            slippage = volume * size * self.slippage
+        else:               # For crypto currency inverse contract
+            holding_pnl = start_pos * (1 / pre_close - 1 / close_price) * size
+            turnover = volume * size / price
+            trading_pnl = pos_change * (1 / price - 1 / trade_close) * size
+
+            # Numpy squares by multiplying, which may differ in last bit
+            # from float power of python used by DailyResult
+            price_square = np.array([trade.price ** 2 for trade in trades])[ix]
+            slippage = volume * size * self.slippage / price_square
+
+        commission = turnover * self.rate
+
+        def sum_daily(values: np.ndarray) -> np.ndarray:
+            """
+            Sum trade values of each day in trade order, which gives the same
+            result as adding one by one.
+            """
+            result = np.bincount(trade_day, weights=values, minlength=day_count)
+            if values.dtype.kind != "f":
+                result = result.astype(values.dtype)
+            return result
+
+        trade_count = np.bincount(trade_day, minlength=day_count)
+        turnover = sum_daily(turnover)
+        commission = sum_daily(commission)
+        slippage = sum_daily(slippage)
+        trading_pnl = sum_daily(trading_pnl)
+
+        # Net pnl takes account of commission and slippage cost
+        total_pnl = trading_pnl + holding_pnl
+        net_pnl = total_pnl - commission - slippage
+
+        # Generate dataframe, with same columns of daily result
+        results = {
+            "date": list(self.daily_results.keys()),
+            "close_price": close_price,
+            "pre_close": pre_close,
+            "trades": [daily_result.trades for daily_result in daily_results],
+            "trade_count": trade_count,
+            "start_pos": start_pos,
+            "end_pos": end_pos,
+            "turnover": turnover,
+            "commission": commission,
+            "slippage": slippage,
+            "trading_pnl": trading_pnl,
+            "holding_pnl": holding_pnl,
+            "total_pnl": total_pnl,
+            "net_pnl": net_pnl,
+        }
 
-        # Generate dataframe
-        results = defaultdict(list)
+        # Update daily result objects for display
+        names = list(results.keys())[4:]
+        columns = zip(pre_close.tolist(), *[results[name].tolist() for name in names])
 
-        for daily_result in self.daily_results.values():
-            for key, value in daily_result.__dict__.items():
-                results[key].append(value)
+        for daily_result, values in zip(daily_results, columns):
+            daily_result.pre_close = values[0]
+            for name, value in zip(names, values[1:]):
+                setattr(daily_result, name, value)
 
-        self.daily_df = DataFrame.from_dict(results).set_index("date")
+        self.daily_df = DataFrame(results).set_index("date")
 
         self.output("逐日盯市盈亏计算完成")
         return self.daily_df
@@ -387,54 +680,66 @@ class BacktestingEngine:
             sharpe_ratio = 0
             return_drawdown_ratio = 0
         else:
-            # Calculate balance related time series data
-            df["balance"] = df["net_pnl"].cumsum() + self.capital
-            df["return"] = np.log(df["balance"] / df["balance"].shift(1)).fillna(0)
-            df["highlevel"] = (
-                df["balance"].rolling(
-                    min_periods=1, window=len(df), center=False).max()
-            )
-            df["drawdown"] = df["balance"] - df["highlevel"]
-            df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+            # Calculate balance related time series data with numpy
+            net_pnl = df["net_pnl"].to_numpy()
+
+            balance = np.cumsum(net_pnl) + self.capital
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = np.zeros(len(balance))
+                returns[1:] = np.log(balance[1:] / balance[:-1])
+                returns[np.isnan(returns)] = 0
+
+                highlevel = np.maximum.accumulate(balance.astype(np.float64))
+                drawdown = balance - highlevel
+                ddpercent = drawdown / highlevel * 100
+
+            df["balance"] = balance
+            df["return"] = returns
+            df["highlevel"] = highlevel
+            df["drawdown"] = drawdown
+            df["ddpercent"] = ddpercent
 
             # Calculate statistics value
             start_date = df.index[0]
             end_date = df.index[-1]
 
             total_days = len(df)
-            profit_days = len(df[df["net_pnl"] > 0])
-            loss_days = len(df[df["net_pnl"] < 0])
+            profit_days = int(np.count_nonzero(net_pnl > 0))
+            loss_days = int(np.count_nonzero(net_pnl < 0))
+
+            end_balance = balance[-1]
+            max_drawdown = drawdown.min()
+            max_ddpercent = ddpercent.min()
 
-            end_balance = df["balance"].iloc[-1]
-            max_drawdown = df["drawdown"].min()
-            max_ddpercent = df["ddpercent"].min()
-            max_drawdown_end = df["drawdown"].idxmin()
+            max_drawdown_ix = int(np.argmin(drawdown))
+            max_drawdown_end = df.index[max_drawdown_ix]
 
             if isinstance(max_drawdown_end, date):
-                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
+                max_drawdown_start = df.index[np.argmax(balance[:max_drawdown_ix + 1])]
                 max_drawdown_duration = (max_drawdown_end - max_drawdown_start).days
             else:
                 max_drawdown_duration = 0
 
-            total_net_pnl = df["net_pnl"].sum()
+            total_net_pnl = net_pnl.sum()
             daily_net_pnl = total_net_pnl / total_days
 
-            total_commission = df["commission"].sum()
+            total_commission = df["commission"].to_numpy().sum()
             daily_commission = total_commission / total_days
 
-            total_slippage = df["slippage"].sum()
+            total_slippage = df["slippage"].to_numpy().sum()
             daily_slippage = total_slippage / total_days
 
-            total_turnover = df["turnover"].sum()
+            total_turnover = df["turnover"].to_numpy().sum()
             daily_turnover = total_turnover / total_days
 
-            total_trade_count = df["trade_count"].sum()
+            total_trade_count = df["trade_count"].to_numpy().sum()
             daily_trade_count = total_trade_count / total_days
 
             total_return = (end_balance / self.capital - 1) * 100
             annual_return = total_return / total_days * 240
-            daily_return = df["return"].mean() * 100
-            return_std = df["return"].std() * 100
+            daily_return = returns.mean() * 100
+            return_std = returns.std(ddof=1) * 100
 
             if return_std:
                 sharpe_ratio = daily_return / return_std * np.sqrt(240)
@@ -479,6 +784,9 @@ class BacktestingEngine:
             self.output(f"Sharpe Ratio：\t{sharpe_ratio:,.2f}")
             self.output(f"收益回撤比：\t{return_drawdown_ratio:,.2f}")
 
+            if self.profiler:
+                self.profiler.output_report(self.output)
+
         statistics = {
             "start_date": start_date,
             "end_date": end_date,
@@ -559,8 +867,260 @@ class BacktestingEngine:
         fig.update_layout(height=1000, width=1000)
         fig.show()
 
-    def run_optimization(self, optimization_setting: OptimizationSetting, output=True):
+    def get_data_fingerprint(self) -> str:
         """"""
+        if not self.data_fingerprint:
+            self.data_fingerprint = get_data_fingerprint(self.history_data, self.mode)
+        return self.data_fingerprint
+
+    def get_cache_base(self) -> dict:
+        """
+        Everything except strategy setting used for generating cache key.
+        """
+        return {
+            "code": get_code_fingerprint(self.strategy_class),
+            "data": self.get_data_fingerprint(),
+            "vt_symbol": self.vt_symbol,
+            "interval": self.interval,
+            "start": self.start,
+            "end": self.end,
+            "rate": self.rate,
+            "slippage": self.slippage,
+            "size": self.size,
+            "pricetick": self.pricetick,
+            "capital": self.capital,
+            "mode": self.mode,
+            "inverse": self.inverse
+        }
+
+    def load_result_cache(self) -> Optional[dict]:
+        """
+        Restore result of identical backtesting from cache, return
+        statistics if found. Should be called after load_data.
+        """
+        if not backtesting_cache.active:
+            return None
+
+        key = generate_cache_key(self.get_cache_base(), self.strategy_setting)
+        data = backtesting_cache.get(key)
+
+        # Result only with statistics saved by optimization
+        if not data or "daily_df" not in data:
+            return None
+
+        self.trades = data["trades"]
+        self.limit_orders = data["orders"]
+        self.daily_results = data["daily_results"]
+        self.daily_df = data["daily_df"]
+
+        self.output("已从缓存加载相同回测的结果")
+        return data["statistics"]
+
+    def save_result_cache(self, statistics: dict) -> None:
+        """
+        Save result after calculate_result and calculate_statistics.
+        """
+        if not backtesting_cache.active:
+            return
+
+        key = generate_cache_key(self.get_cache_base(), self.strategy_setting)
+        data = {
+            "statistics": statistics,
+            "daily_df": self.daily_df,
+            "trades": self.trades,
+            "orders": self.limit_orders,
+            "daily_results": self.daily_results
+        }
+        backtesting_cache.put(key, data)
+
+    def set_checkpoint(self, interval: int):
+        """
+        Save checkpoint of backtesting state every [interval] trading days
+        and at the end of replay, 0 to disable.
+        """
+        self.checkpoint_interval = interval
+
+    def get_checkpoint_folder(self) -> Path:
+        """
+        Checkpoints are shared by backtesting with the same strategy code,
+        setting and parameters, except end of backtesting period.
+        """
+        base = {
+            "code": get_code_fingerprint(self.strategy_class),
+            "vt_symbol": self.vt_symbol,
+            "interval": self.interval,
+            "start": self.start,
+            "rate": self.rate,
+            "slippage": self.slippage,
+            "size": self.size,
+            "pricetick": self.pricetick,
+            "capital": self.capital,
+            "mode": self.mode,
+            "inverse": self.inverse
+        }
+        key = generate_cache_key(base, self.strategy_setting)
+
+        folder = get_folder_path("backtesting_checkpoint").joinpath(key)
+        folder.mkdir(exist_ok=True)
+        return folder
+
+    def get_checkpoints(self) -> List[tuple]:
+        """
+        Return list of (datetime, path) of saved checkpoints sorted by datetime.
+        """
+        checkpoints = []
+
+        for path in self.get_checkpoint_folder().glob("*.pkl"):
+            dt = datetime.strptime(path.stem, "%Y%m%d%H%M%S%f")
+            checkpoints.append((dt, path))
+
+        checkpoints.sort()
+        return checkpoints
+
+    def save_checkpoint(self) -> bool:
+        """
+        Save state of engine and strategy after data at current datetime.
+        """
+        if not self.datetime:
+            return False
+
+        state = {name: getattr(self, name, None) for name in CHECKPOINT_FIELDS}
+        state["strategy"] = self.strategy
+
+        path = self.get_checkpoint_folder().joinpath(f"{self.datetime:%Y%m%d%H%M%S%f}.pkl")
+        temp_path = path.with_suffix(".tmp")
+
+        try:
+            with open(temp_path, "wb") as f:
+                CheckpointPickler(f, self).dump({"datetime": self.datetime, "state": state})
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            temp_path.unlink()
+            self.checkpoint_interval = 0
+            self.output(f"策略状态无法保存到检查点，停止保存检查点：{e}")
+            return False
+
+        os.replace(temp_path, path)
+        return True
+
+    def resume_checkpoint(self, before: datetime = None) -> bool:
+        """
+        Restore state from the latest checkpoint earlier than before, which
+        defaults to end of backtesting. Use before to resume from data
+        boundary when history data after it is changed.
+
+        Should be called after add_strategy and before load_data, then
+        only history data after the checkpoint is loaded and replayed.
+        """
+        self.resume_datetime = None
+
+        boundary = before or self.end
+        checkpoints = self.get_checkpoints()
+        if boundary:
+            boundary = boundary.replace(tzinfo=None)
+            checkpoints = [c for c in checkpoints if c[0] < boundary]
+
+        if not checkpoints:
+            self.output("未找到可用的回测检查点")
+            return False
+
+        dt, path = checkpoints[-1]
+
+        try:
+            with open(path, "rb") as f:
+                data = CheckpointUnpickler(f, self).load()
+        except Exception:
+            self.output(f"回测检查点加载失败：{path}")
+            self.output(traceback.format_exc())
+            return False
+
+        for name, value in data["state"].items():
+            setattr(self, name, value)
+        self.resume_datetime = data["datetime"]
+
+        self.output(f"回测检查点加载完成：{dt}")
+        return True
+
+    def clear_checkpoints(self):
+        """"""
+        shutil.rmtree(self.get_checkpoint_folder())
+
+    def run_cached_optimization(
+        self,
+        executor: "OptimizationExecutor",
+        config: dict,
+        settings: List[dict],
+        callback: Callable = None
+    ) -> list:
+        """
+        Return results of evaluated settings from cache directly and
+        run the rest by executor.
+        """
+        return run_cached_settings(executor, config, settings, self.output, callback)
+
+    def get_optimization_config(self, target_name: str, history_data: Sequence) -> dict:
+        """
+        Engine configuration shipped to optimization workers.
+        """
+        return {
+            "target_name": target_name,
+            "strategy_class": self.strategy_class,
+            "history_data": history_data,
+            "cache_base": self.get_cache_base() if backtesting_cache.active else None,
+            "parameters": {
+                "vt_symbol": self.vt_symbol,
+                "interval": self.interval,
+                "start": self.start,
+                "rate": self.rate,
+                "slippage": self.slippage,
+                "size": self.size,
+                "pricetick": self.pricetick,
+                "capital": self.capital,
+                "end": self.end,
+                "mode": self.mode,
+                "inverse": self.inverse
+            }
+        }
+
+    def get_period_config(
+        self,
+        target_name: str,
+        history_data: Optional[Sequence],
+        start: datetime,
+        end: datetime
+    ) -> dict:
+        """
+        Optimization config for part of loaded history data, which is
+        given by shared data slice of [start, end] period.
+        """
+        config = self.get_optimization_config(target_name, history_data)
+
+        parameters = config["parameters"]
+        parameters["start"] = start
+        parameters["end"] = end
+
+        # Workers load data of the period by themselves without shared memory
+        if history_data is None:
+            config["cache_base"] = None
+        elif config["cache_base"]:
+            config["cache_base"].update({
+                "start": start,
+                "end": end,
+                "data": get_data_fingerprint(history_data, self.mode)
+            })
+
+        return config
+
+    def run_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output=True,
+        executor: "OptimizationExecutor" = None,
+        callback: Callable = None
+    ):
+        """
+        Executor is created and stopped each time if not provided.
+        Callback is called with (finished, total, results) during running.
+        """
         # Get optimization setting and target
         settings = optimization_setting.generate_setting()
         target_name = optimization_setting.target_name
@@ -573,36 +1133,50 @@ class BacktestingEngine:
             self.output("优化目标未设置，请检查")
             return
 
-        # Use multiprocessing pool for running backtesting with different setting
-        # Force to use spawn method to create new process (instead of fork on Linux)
-        ctx = multiprocessing.get_context("spawn")
-        pool = ctx.Pool(multiprocessing.cpu_count())
+        # Load history data once and share with all worker processes
+        self.load_data()
+        history_data = SharedHistoryData.create(self.history_data, self.mode)
 
-        results = []
-        for setting in settings:
-            result = (pool.apply_async(optimize, (
-                target_name,
-                self.strategy_class,
-                setting,
-                self.vt_symbol,
-                self.interval,
-                self.start,
-                self.rate,
-                self.slippage,
-                self.size,
-                self.pricetick,
-                self.capital,
-                self.end,
-                self.mode,
-                self.inverse
-            )))
-            results.append(result)
-
-        pool.close()
-        pool.join()
+        if history_data:
+            self.data_fingerprint = get_data_fingerprint(history_data, self.mode)
+        else:
+            self.output("共享内存不可用，子进程将分别加载历史数据")
+
+        temp_executor = not executor
+        if temp_executor:
+            executor = OptimizationExecutor(output=self.output)
+        executor.reset()
+
+        config = self.get_optimization_config(target_name, history_data)
+        progress_step = 0
+
+        def on_progress(finished: int, total: int, results: list):
+            """"""
+            nonlocal progress_step
+
+            progress = finished / total
+            if int(progress * 10) > progress_step:
+                progress_step = int(progress * 10)
+                self.output(f"优化进度：{'#' * progress_step} [{progress:.0%}]")
+
+            if callback:
+                callback(finished, total, results)
+
+        try:
+            result_values = self.run_cached_optimization(
+                executor, config, settings, on_progress
+            )
+        finally:
+            if temp_executor:
+                executor.stop()
+
+            if history_data:
+                history_data.release()
+
+        if executor.cancelled:
+            self.output(f"参数优化已停止，完成数量：{len(result_values)}/{len(settings)}")
 
         # Sort results and output
-        result_values = [result.get() for result in results]
         result_values.sort(reverse=True, key=lambda result: result[1])
 
         if output:
@@ -612,8 +1186,20 @@ class BacktestingEngine:
 
         return result_values
 
-    def run_ga_optimization(self, optimization_setting: OptimizationSetting, population_size=100, ngen_size=30, output=True):
-        """"""
+    def run_ga_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        population_size=100,
+        ngen_size=30,
+        output=True,
+        executor: "OptimizationExecutor" = None,
+        callback: Callable = None
+    ):
+        """
+        Each generation is evaluated in parallel by executor.
+        Callback is called with (finished, total, results) after each
+        generation.
+        """
         # Get optimization setting and target
         settings = optimization_setting.generate_setting_ga()
         target_name = optimization_setting.target_name
@@ -626,119 +1212,126 @@ class BacktestingEngine:
             self.output("优化目标未设置，请检查")
             return
 
-        # Define parameter generation function
-        def generate_parameter():
-            """"""
-            return random.choice(settings)
+        # Load history data once and share with all worker processes
+        self.load_data()
+        history_data = SharedHistoryData.create(self.history_data, self.mode)
+
+        if history_data:
+            self.data_fingerprint = get_data_fingerprint(history_data, self.mode)
+
+        temp_executor = not executor
+        if temp_executor:
+            executor = OptimizationExecutor(output=self.output)
+        executor.reset()
+
+        config = self.get_optimization_config(target_name, history_data)
+
+        try:
+            results = run_ga(
+                config,
+                executor,
+                settings,
+                population_size,
+                ngen_size,
+                self.output,
+                callback
+            )
+        finally:
+            if temp_executor:
+                executor.stop()
 
-        def mutate_individual(individual, indpb):
-            """"""
-            size = len(individual)
-            paramlist = generate_parameter()
-            for i in range(size):
-                if random.random() < indpb:
-                    individual[i] = paramlist[i]
-            return individual,
-
-        # Create ga object function
-        global ga_target_name
-        global ga_strategy_class
-        global ga_setting
-        global ga_vt_symbol
-        global ga_interval
-        global ga_start
-        global ga_rate
-        global ga_slippage
-        global ga_size
-        global ga_pricetick
-        global ga_capital
-        global ga_end
-        global ga_mode
-        global ga_inverse
-
-        ga_target_name = target_name
-        ga_strategy_class = self.strategy_class
-        ga_setting = settings[0]
-        ga_vt_symbol = self.vt_symbol
-        ga_interval = self.interval
-        ga_start = self.start
-        ga_rate = self.rate
-        ga_slippage = self.slippage
-        ga_size = self.size
-        ga_pricetick = self.pricetick
-        ga_capital = self.capital
-        ga_end = self.end
-        ga_mode = self.mode
-        ga_inverse = self.inverse
-
-        # Set up genetic algorithem
-        toolbox = base.Toolbox()
-        toolbox.register("individual", tools.initIterate, creator.Individual, generate_parameter)
-        toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-        toolbox.register("mate", tools.cxTwoPoint)
-        toolbox.register("mutate", mutate_individual, indpb=1)
-        toolbox.register("evaluate", ga_optimize)
-        toolbox.register("select", tools.selNSGA2)
-
-        total_size = len(settings)
-        pop_size = population_size                      # number of individuals in each generation
-        lambda_ = pop_size                              # number of children to produce at each generation
-        mu = int(pop_size * 0.8)                        # number of individuals to select for the next generation
-
-        cxpb = 0.95         # probability that an offspring is produced by crossover
-        mutpb = 1 - cxpb    # probability that an offspring is produced by mutation
-        ngen = ngen_size    # number of generation
-
-        pop = toolbox.population(pop_size)
-        hof = tools.ParetoFront()               # end result of pareto front
-
-        stats = tools.Statistics(lambda ind: ind.fitness.values)
-        np.set_printoptions(suppress=True)
-        stats.register("mean", np.mean, axis=0)
-        stats.register("std", np.std, axis=0)
-        stats.register("min", np.min, axis=0)
-        stats.register("max", np.max, axis=0)
-
-        # Multiprocessing is not supported yet.
-        # pool = multiprocessing.Pool(multiprocessing.cpu_count())
-        # toolbox.register("map", pool.map)
-
-        # Run ga optimization
-        self.output(f"参数优化空间：{total_size}")
-        self.output(f"每代族群总数：{pop_size}")
-        self.output(f"优良筛选个数：{mu}")
-        self.output(f"迭代次数：{ngen}")
-        self.output(f"交叉概率：{cxpb:.0%}")
-        self.output(f"突变概率：{mutpb:.0%}")
+            if history_data:
+                history_data.release()
 
+        return results
+
+    def run_search_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        algorithm: "SearchAlgorithm",
+        output=True,
+        executor: "OptimizationExecutor" = None,
+        callback: Callable = None
+    ):
+        """
+        Run search algorithm of search.py, each batch of settings chosen
+        by algorithm is evaluated in parallel. Budget of evaluation is the
+        fraction of history data used from the beginning.
+        Callback is called with (cost, best target, results) after each batch.
+        """
+        target_name = optimization_setting.target_name
+
+        if not optimization_setting.params:
+            self.output("优化参数组合为空，请检查")
+            return
+
+        if not target_name:
+            self.output("优化目标未设置，请检查")
+            return
+
+        # Load history data once and share with all worker processes
+        self.load_data()
+        history_data = SharedHistoryData.create(self.history_data, self.mode)
+
+        if history_data:
+            self.data_fingerprint = get_data_fingerprint(history_data, self.mode)
+        else:
+            self.output("共享内存不可用，子进程将分别加载历史数据")
+
+        temp_executor = not executor
+        if temp_executor:
+            executor = OptimizationExecutor(output=self.output)
+        executor.reset()
+
+        count = len(self.history_data)
+        configs = {}
+
+        def evaluate(settings: List[dict], budget: float) -> list:
+            """"""
+            size = max(int(count * budget), 1)
+
+            config = configs.get(size, None)
+            if not config:
+                if size >= count:
+                    config = self.get_optimization_config(target_name, history_data)
+                else:
+                    # Period end is inclusive when loading data
+                    end = self.history_data[size - 1].datetime.replace(tzinfo=None)
+                    data = history_data[:size] if history_data else None
+                    config = self.get_period_config(target_name, data, self.start, end)
+                configs[size] = config
+
+            results = self.run_cached_optimization(executor, config, settings)
+
+            if executor.cancelled:
+                raise OptimizationCancelled()
+            return results
+
+        self.output(f"参数优化空间：{algorithm.space_size}，搜索算法：{algorithm.name}")
         start = time()
 
-        algorithms.eaMuPlusLambda(
-            pop,
-            toolbox,
-            mu,
-            lambda_,
-            cxpb,
-            mutpb,
-            ngen,
-            stats,
-            halloffame=hof
-        )
+        try:
+            algorithm.run(optimization_setting, evaluate, callback)
+        except OptimizationCancelled:
+            self.output("参数优化已停止")
+        finally:
+            if temp_executor:
+                executor.stop()
 
-        end = time()
-        cost = int((end - start))
+            if history_data:
+                history_data.release()
 
-        self.output(f"遗传算法优化完成，耗时{cost}秒")
+        cost = int(time() - start)
+        self.output(f"搜索优化完成，耗时{cost}秒，折算回测次数：{algorithm.cost:.1f}")
 
-        # Return result list
-        results = []
+        result_values = algorithm.get_results()
 
-        for parameter_values in hof:
-            setting = dict(parameter_values)
-            target_value = ga_optimize(parameter_values)[0]
-            results.append((setting, target_value, {}))
+        if output:
+            for value in result_values:
+                msg = f"参数：{value[0]}, 目标：{value[1]}"
+                self.output(msg)
 
-        return results
+        return result_values
 
     def update_daily_close(self, price: float):
         """"""
@@ -759,8 +1352,6 @@ class BacktestingEngine:
         self.cross_stop_order()
         self.strategy.on_bar(bar)
 
-        self.update_daily_close(bar.close_price)
-
     def new_tick(self, tick: TickData):
         """"""
         self.tick = tick
@@ -770,8 +1361,6 @@ class BacktestingEngine:
         self.cross_stop_order()
         self.strategy.on_tick(tick)
 
-        self.update_daily_close(tick.last_price)
-
     def cross_limit_order(self):
         """
         Cross limit order with last bar/tick data.
@@ -787,7 +1376,29 @@ class BacktestingEngine:
             long_best_price = long_cross_price
             short_best_price = short_cross_price
 
-        for order in list(self.active_limit_orders.values()):
+        # Only orders crossed by price or still submitting need to be
+        # processed, in the same order as they were sent.
+        candidates = [
+            (int(order.orderid), order.vt_orderid)
+            for order in self.submitting_orders
+        ]
+        self.submitting_orders = []
+
+        if long_cross_price > 0:
+            candidates.extend(
+                self.limit_order_index[Direction.LONG].get_above(long_cross_price)
+            )
+        if short_cross_price > 0:
+            candidates.extend(
+                self.limit_order_index[Direction.SHORT].get_below(short_cross_price)
+            )
+
+        for _, vt_orderid in sorted(set(candidates)):
+            # Order may be cancelled in callback of previous order
+            order = self.active_limit_orders.get(vt_orderid, None)
+            if not order:
+                continue
+
             # Push order update with status "not traded" (pending).
             if order.status == Status.SUBMITTING:
                 order.status = Status.NOTTRADED
@@ -815,6 +1426,7 @@ class BacktestingEngine:
             self.strategy.on_order(order)
 
             self.active_limit_orders.pop(order.vt_orderid)
+            self.remove_limit_order_index(order)
 
             # Push trade update
             self.trade_count += 1
@@ -859,7 +1471,14 @@ class BacktestingEngine:
             long_best_price = long_cross_price
             short_best_price = short_cross_price
 
-        for stop_order in list(self.active_stop_orders.values()):
+        candidates = (
+            self.stop_order_index[Direction.LONG].get_below(long_cross_price)
+            + self.stop_order_index[Direction.SHORT].get_above(short_cross_price)
+        )
+
+        for _, stop_orderid in sorted(candidates):
+            stop_order = self.stop_orders[stop_orderid]
+
             # Check whether stop order can be triggered.
             long_cross = (
                 stop_order.direction == Direction.LONG
@@ -923,6 +1542,7 @@ class BacktestingEngine:
 
             if stop_order.stop_orderid in self.active_stop_orders:
                 self.active_stop_orders.pop(stop_order.stop_orderid)
+                self.remove_stop_order_index(stop_order)
 
             # Push update to strategy.
             self.strategy.on_stop_order(stop_order)
@@ -937,11 +1557,14 @@ class BacktestingEngine:
         days: int,
         interval: Interval,
         callback: Callable,
-        use_database: bool
+        use_database: bool,
+        window: int = 0
     ):
         """"""
         self.days = days
         self.callback = callback
+        self.init_interval = interval
+        self.init_window = window
 
     def load_tick(self, vt_symbol: str, days: int, callback: Callable):
         """"""
@@ -989,6 +1612,10 @@ class BacktestingEngine:
         self.active_stop_orders[stop_order.stop_orderid] = stop_order
         self.stop_orders[stop_order.stop_orderid] = stop_order
 
+        self.stop_order_index[direction].add(
+            price, self.stop_order_count, stop_order.stop_orderid
+        )
+
         return stop_order.stop_orderid
 
     def send_limit_order(
@@ -1017,6 +1644,11 @@ class BacktestingEngine:
         self.active_limit_orders[order.vt_orderid] = order
         self.limit_orders[order.vt_orderid] = order
 
+        self.limit_order_index[direction].add(
+            price, self.limit_order_count, order.vt_orderid
+        )
+        self.submitting_orders.append(order)
+
         return order.vt_orderid
 
     def cancel_order(self, strategy: CtaTemplate, vt_orderid: str):
@@ -1033,6 +1665,7 @@ class BacktestingEngine:
         if vt_orderid not in self.active_stop_orders:
             return
         stop_order = self.active_stop_orders.pop(vt_orderid)
+        self.remove_stop_order_index(stop_order)
 
         stop_order.status = StopOrderStatus.CANCELLED
         self.strategy.on_stop_order(stop_order)
@@ -1042,10 +1675,24 @@ class BacktestingEngine:
         if vt_orderid not in self.active_limit_orders:
             return
         order = self.active_limit_orders.pop(vt_orderid)
+        self.remove_limit_order_index(order)
 
         order.status = Status.CANCELLED
         self.strategy.on_order(order)
 
+    def remove_stop_order_index(self, stop_order: StopOrder):
+        """"""
+        seq = int(stop_order.stop_orderid.split(".")[-1])
+        self.stop_order_index[stop_order.direction].remove(
+            stop_order.price, seq, stop_order.stop_orderid
+        )
+
+    def remove_limit_order_index(self, order: OrderData):
+        """"""
+        self.limit_order_index[order.direction].remove(
+            order.price, int(order.orderid), order.vt_orderid
+        )
+
     def cancel_all(self, strategy: CtaTemplate):
         """
         Cancel all orders, both limit and stop.
@@ -1208,6 +1855,471 @@ class DailyResult:
         self.net_pnl = self.total_pnl - self.commission - self.slippage
 
 
+class OrderPriceIndex:
+    """
+    Active orders of one direction sorted by price, so that orders crossed
+    by bar/tick price can be found with bisect instead of checking all.
+
+    Each key is (price, sequence number, orderid).
+    """
+
+    def __init__(self):
+        """"""
+        self.keys = []
+
+    def add(self, price: float, seq: int, orderid: str):
+        """"""
+        # Order with nan price can never be crossed
+        if price == price:
+            insort(self.keys, (price, seq, orderid))
+
+    def remove(self, price: float, seq: int, orderid: str):
+        """"""
+        key = (price, seq, orderid)
+        ix = bisect_left(self.keys, key)
+
+        if ix < len(self.keys) and self.keys[ix] == key:
+            del self.keys[ix]
+
+    def get_above(self, price: float) -> List[tuple]:
+        """
+        Return (seq, orderid) of orders with price >= given price.
+        """
+        if price != price:
+            return []
+
+        ix = bisect_left(self.keys, (price, 0))
+        return [key[1:] for key in self.keys[ix:]]
+
+    def get_below(self, price: float) -> List[tuple]:
+        """
+        Return (seq, orderid) of orders with price <= given price.
+        """
+        if price != price:
+            return []
+
+        ix = bisect_right(self.keys, (price, float("inf")))
+        return [key[1:] for key in self.keys[:ix]]
+
+    def clear(self):
+        """"""
+        self.keys.clear()
+
+
+class CheckpointPickler(pickle.Pickler):
+    """
+    Engine referenced by strategy is saved as persistent id, so that
+    history data is not pickled into checkpoint.
+    """
+
+    def __init__(self, file, engine: BacktestingEngine):
+        """"""
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.engine = engine
+
+    def persistent_id(self, obj):
+        """"""
+        if obj is self.engine:
+            return "engine"
+        return None
+
+
+class CheckpointUnpickler(pickle.Unpickler):
+    """
+    Persistent id of engine is replaced by the engine resuming checkpoint.
+    """
+
+    def __init__(self, file, engine: BacktestingEngine):
+        """"""
+        super().__init__(file)
+        self.engine = engine
+
+    def persistent_load(self, pid):
+        """"""
+        if pid == "engine":
+            return self.engine
+        raise pickle.UnpicklingError(f"unsupported persistent id: {pid}")
+
+
+class PrefetchHistoryData:
+    """
+    History data loaded chunk by chunk by a background thread while it is
+    being iterated, so that backtesting starts without waiting for all
+    data. At most max_chunks loaded chunks are kept in queue, plus one
+    being replayed and one being loaded.
+    """
+
+    def __init__(
+        self,
+        loader: Callable,
+        periods: List[tuple],
+        max_chunks: int,
+        output: Callable = print
+    ):
+        """"""
+        self.loader = loader
+        self.periods = periods
+        self.max_chunks = max_chunks
+        self.output = output
+
+        self.count = 0
+        self.thread = None
+        self.stop_event = Event()
+
+    def __bool__(self):
+        """"""
+        return bool(self.periods)
+
+    def __iter__(self):
+        """
+        Start a new loading thread for each iteration.
+        """
+        self.close()
+
+        self.count = 0
+        self.stop_event = Event()
+        queue = Queue(maxsize=self.max_chunks)
+
+        self.thread = Thread(target=self.run, args=(queue, self.stop_event), daemon=True)
+        self.thread.start()
+
+        return self.generate(queue)
+
+    def generate(self, queue: Queue):
+        """"""
+        try:
+            while True:
+                chunk = queue.get()
+
+                if chunk is None:
+                    return
+                elif isinstance(chunk, Exception):
+                    raise chunk
+
+                yield from chunk
+        finally:
+            self.close()
+
+    def run(self, queue: Queue, stop_event: Event):
+        """
+        Load chunks in background thread.
+        """
+        try:
+            for n, (start, end) in enumerate(self.periods):
+                data = self.loader(start, end)
+                self.count += len(data)
+
+                if not self.put(queue, stop_event, data):
+                    return
+
+                progress = (n + 1) / len(self.periods)
+                progress_bar = "#" * int(progress * 10)
+                self.output(f"加载进度：{progress_bar} [{progress:.0%}]")
+
+            self.output(f"历史数据加载完成，数据量：{self.count}")
+            self.put(queue, stop_event, None)
+        except Exception as e:
+            self.put(queue, stop_event, e)
+
+    @staticmethod
+    def put(queue: Queue, stop_event: Event, item) -> bool:
+        """
+        Wait for free space in queue until stopped.
+        """
+        while not stop_event.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def close(self):
+        """
+        Stop loading thread if iteration is not finished.
+        """
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+
+class SharedHistoryData:
+    """
+    History data stored as columnar arrays in a shared memory block.
+
+    The parent process loads data once and creates the block, workers
+    receive only metadata by pickle and attach to the block without copy.
+    Data objects are generated chunk by chunk when iterating, so that
+    memory usage stays near one copy of the dataset for any pool size.
+    """
+
+    chunk_size = 10000
+
+    def __init__(self, shm_name: str, meta: dict, start: int = 0, stop: int = None):
+        """"""
+        self.shm_name = shm_name
+        self.meta = meta
+        self.start = start
+        self.stop = meta["count"] if stop is None else stop
+
+        self.shm = None
+        self.owner = False
+        self.datetimes = None
+        self.values = None
+
+    @classmethod
+    def create(
+        cls,
+        history_data: list,
+        mode: BacktestingMode,
+        extra_fields: Sequence[str] = ()
+    ):
+        """
+        Copy history data into a new shared memory block. Return None
+        if shared memory is not supported or data is empty.
+
+        Extra fields are numeric attributes not defined by dataclass,
+        which are set onto data objects after generated.
+        """
+        if not shared_memory or not history_data:
+            return None
+
+        names = get_history_fields(mode) + list(extra_fields)
+        first = history_data[0]
+        count = len(history_data)
+
+        meta = {
+            "mode": mode,
+            "count": count,
+            "fields": names,
+            "extra_fields": list(extra_fields),
+            "gateway_name": first.gateway_name,
+            "symbol": first.symbol,
+            "exchange": first.exchange,
+            "interval": getattr(first, "interval", None),
+            "name": getattr(first, "name", ""),
+            "tzinfo": first.datetime.tzinfo,
+        }
+
+        size = (len(names) + 1) * count * 8
+        shm = shared_memory.SharedMemory(create=True, size=size)
+
+        history = cls(shm.name, meta)
+        history.shm = shm
+        history.owner = True
+        history.attach()
+
+        try:
+            history.datetimes[:], history.values[:] = history_to_arrays(
+                history_data, mode, extra_fields
+            )
+        except Exception:
+            history.release()
+            raise
+
+        return history
+
+    def attach(self):
+        """
+        Create numpy views on shared memory block.
+        """
+        if self.datetimes is not None:
+            return
+
+        if not self.shm:
+            shm = shared_memories.get(self.shm_name, None)
+            if not shm:
+                shm = shared_memory.SharedMemory(name=self.shm_name)
+                shared_memories[self.shm_name] = shm
+            self.shm = shm
+
+        count = self.meta["count"]
+
+        self.datetimes = np.ndarray(
+            (count,), dtype="datetime64[us]", buffer=self.shm.buf
+        )
+        self.values = np.ndarray(
+            (len(self.meta["fields"]), count),
+            dtype=np.float64,
+            buffer=self.shm.buf,
+            offset=count * 8
+        )
+
+    def release(self):
+        """
+        Close and remove shared memory block, only called by creator.
+        """
+        self.datetimes = None
+        self.values = None
+
+        if self.owner and self.shm:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def generate(self, start: int, stop: int) -> list:
+        """
+        Generate data objects of [start, stop) position.
+        """
+        self.attach()
+
+        meta = self.meta
+        tzinfo = meta["tzinfo"]
+        dts = [dt.replace(tzinfo=tzinfo) for dt in self.datetimes[start:stop].tolist()]
+        columns = [row.tolist() for row in self.values[:, start:stop]]
+
+        gateway_name = meta["gateway_name"]
+        symbol = meta["symbol"]
+        exchange = meta["exchange"]
+
+        # Values of extra fields are stored after dataclass fields
+        extra_fields = meta.get("extra_fields", [])
+        n = len(columns) - len(extra_fields)
+
+        if meta["mode"] == BacktestingMode.BAR:
+            interval = meta["interval"]
+            data = [
+                BarData(gateway_name, symbol, exchange, dt, interval, *values)
+                for dt, values in zip(dts, zip(*columns[:n]))
+            ]
+        else:
+            name = meta["name"]
+            data = [
+                TickData(gateway_name, symbol, exchange, dt, name, *values)
+                for dt, values in zip(dts, zip(*columns[:n]))
+            ]
+
+        for field, column in zip(extra_fields, columns[n:]):
+            for d, value in zip(data, column):
+                setattr(d, field, value)
+
+        return data
+
+    def get_day_starts(self) -> np.ndarray:
+        """
+        Index array of the first data of each day, calculated from date
+        of datetime array.
+        """
+        self.attach()
+        return get_day_starts(self.datetimes[self.start:self.stop])
+
+    def __len__(self):
+        """"""
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        """"""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("共享历史数据不支持步长切片")
+
+            history = SharedHistoryData(
+                self.shm_name,
+                self.meta,
+                self.start + start,
+                self.start + max(start, stop)
+            )
+            history.shm = self.shm
+            history.datetimes = self.datetimes
+            history.values = self.values
+            return history
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("共享历史数据索引越界")
+
+        ix = self.start + index
+        return self.generate(ix, ix + 1)[0]
+
+    def __iter__(self):
+        """"""
+        for ix in range(self.start, self.stop, self.chunk_size):
+            yield from self.generate(ix, min(ix + self.chunk_size, self.stop))
+
+    def __getstate__(self):
+        """
+        Only pickle metadata for sending to worker process.
+        """
+        return {
+            "shm_name": self.shm_name,
+            "meta": self.meta,
+            "start": self.start,
+            "stop": self.stop
+        }
+
+    def __setstate__(self, state: dict):
+        """"""
+        self.__init__(**state)
+
+
+def get_history_fields(mode: BacktestingMode) -> List[str]:
+    """
+    Numeric fields of bar or tick data in dataclass order.
+    """
+    if mode == BacktestingMode.BAR:
+        return BAR_ORDERED_FIELDS
+    else:
+        return TICK_ORDERED_FIELDS
+
+
+def history_to_arrays(
+    history_data: Sequence,
+    mode: BacktestingMode,
+    extra_fields: Sequence[str] = ()
+) -> tuple:
+    """
+    Convert history data into naive datetime array and 2D value array
+    with one row for each field.
+    """
+    datetimes = np.array(
+        [d.datetime.replace(tzinfo=None) for d in history_data],
+        dtype="datetime64[us]"
+    )
+
+    names = get_history_fields(mode) + list(extra_fields)
+    values = np.array(
+        list(map(attrgetter(*names), history_data)), dtype=np.float64
+    ).reshape(-1, len(names)).T
+
+    return datetimes, values
+
+
+def iterate_days(history_data: Iterable) -> Iterator[list]:
+    """
+    Yield data list of each day. Day boundaries of shared history data are
+    found from its datetime array.
+    """
+    if isinstance(history_data, SharedHistoryData):
+        starts = history_data.get_day_starts() + history_data.start
+        ends = chain(starts[1:].tolist(), [history_data.stop])
+
+        for start, end in zip(starts.tolist(), ends):
+            yield history_data.generate(start, end)
+    else:
+        yield from split_days(history_data)
+
+
+def get_data_fingerprint(history_data: Sequence, mode: BacktestingMode) -> str:
+    """
+    Hash all datetime and values of history data.
+    """
+    if isinstance(history_data, SharedHistoryData):
+        history_data.attach()
+        start, stop = history_data.start, history_data.stop
+        datetimes = history_data.datetimes[start:stop]
+        values = history_data.values[:, start:stop]
+    else:
+        datetimes, values = history_to_arrays(history_data, mode)
+
+    md5 = hashlib.md5()
+    md5.update(np.ascontiguousarray(datetimes).tobytes())
+    md5.update(np.ascontiguousarray(values).tobytes())
+    return md5.hexdigest()
+
+
 def optimize(
     target_name: str,
     strategy_class: CtaTemplate,
@@ -1222,7 +2334,8 @@ def optimize(
     capital: int,
     end: datetime,
     mode: BacktestingMode,
-    inverse: bool
+    inverse: bool,
+    history_data: Sequence = None
 ):
     """
     Function for running in multiprocessing.pool
@@ -1244,7 +2357,13 @@ def optimize(
     )
 
     engine.add_strategy(strategy_class, setting)
-    engine.load_data()
+
+    # Use history data loaded by parent process if provided
+    if history_data is not None:
+        engine.history_data = history_data
+    else:
+        engine.load_data()
+
     engine.run_backtesting()
     engine.calculate_result()
     statistics = engine.calculate_statistics(output=False)
@@ -1253,33 +2372,422 @@ def optimize(
     return (str(setting), target_value, statistics)
 
 
-@lru_cache(maxsize=1000000)
-def _ga_optimize(parameter_values: tuple):
-    """"""
-    setting = dict(parameter_values)
-
-    result = optimize(
-        ga_target_name,
-        ga_strategy_class,
-        setting,
-        ga_vt_symbol,
-        ga_interval,
-        ga_start,
-        ga_rate,
-        ga_slippage,
-        ga_size,
-        ga_pricetick,
-        ga_capital,
-        ga_end,
-        ga_mode,
-        ga_inverse
-    )
-    return (result[1],)
+def run_cached_settings(
+    executor: "OptimizationExecutor",
+    config: dict,
+    settings: List[dict],
+    output: Callable = print,
+    callback: Callable = None
+) -> list:
+    """
+    Return results of evaluated settings from cache directly and
+    run the rest by executor.
+    """
+    cache_base = config["cache_base"]
+    if not cache_base:
+        return executor.run(config, settings, callback)
 
+    keys = [generate_cache_key(cache_base, setting) for setting in settings]
+    cached = backtesting_cache.get_many(keys)
 
-def ga_optimize(parameter_values: list):
-    """"""
-    return _ga_optimize(tuple(parameter_values))
+    target_name = config["target_name"]
+    results = []
+    new_settings = []
+
+    for key, setting in zip(keys, settings):
+        data = cached.get(key, None)
+
+        if data:
+            statistics = data["statistics"]
+            results.append((str(setting), statistics[target_name], statistics))
+        else:
+            new_settings.append(setting)
+
+    total = len(settings)
+    count = len(results)
+
+    if count:
+        output(f"从缓存读取回测结果数量：{count}")
+
+        if callback:
+            callback(count, total, list(results))
+
+    def on_progress(finished: int, _: int, chunk_results: list):
+        """"""
+        if callback:
+            callback(count + finished, total, chunk_results)
+
+    results.extend(executor.run(config, new_settings, on_progress))
+    return results
+
+
+def run_ga(
+    config: dict,
+    executor: "OptimizationExecutor",
+    settings: List[list],
+    population_size: int,
+    ngen_size: int,
+    output: Callable = print,
+    callback: Callable = None,
+    verbose: bool = True
+) -> list:
+    """
+    Genetic algorithm optimization of settings generated by
+    OptimizationSetting.generate_setting_ga, each generation is evaluated
+    in parallel by executor with engine config.
+
+    Callback is called with (finished, total, results) after each
+    generation.
+    """
+    # Define parameter generation function
+    def generate_parameter():
+        """"""
+        return random.choice(settings)
+
+    def mutate_individual(individual, indpb):
+        """"""
+        size = len(individual)
+        paramlist = generate_parameter()
+        for i in range(size):
+            if random.random() < indpb:
+                individual[i] = paramlist[i]
+        return individual,
+
+    # Results of evaluated individuals, shared by all generations
+    cache = {}
+    evaluated_settings = {}
+    ngen = ngen_size    # number of generation
+    generations = []
+
+    def evaluate(individual):
+        """
+        Individual failed or not evaluated (chunk lost in executor) gets
+        the lowest fitness.
+        """
+        result = cache.get(str(dict(individual)), None)
+        if not result:
+            return (-np.inf,)
+        return (result[1],)
+
+    def map_population(func, population):
+        """
+        Run backtesting of new individuals in parallel, then evaluate.
+        """
+        population = list(population)
+
+        new_settings = {}
+        for individual in population:
+            setting = dict(individual)
+            key = str(setting)
+            if key not in cache:
+                new_settings[key] = setting
+                evaluated_settings[key] = setting
+
+        results = run_cached_settings(
+            executor, config, list(new_settings.values()), output
+        )
+        for result in results:
+            cache[result[0]] = result
+
+        if executor.cancelled:
+            raise OptimizationCancelled()
+
+        generations.append(len(results))
+        if callback:
+            callback(len(generations), ngen + 1, results)
+
+        return [func(individual) for individual in population]
+
+    # Set up genetic algorithem
+    toolbox = base.Toolbox()
+    toolbox.register("individual", tools.initIterate, creator.Individual, generate_parameter)
+    toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+    toolbox.register("mate", tools.cxTwoPoint)
+    toolbox.register("mutate", mutate_individual, indpb=1)
+    toolbox.register("evaluate", evaluate)
+    toolbox.register("select", tools.selNSGA2)
+    toolbox.register("map", map_population)
+
+    total_size = len(settings)
+    pop_size = population_size                      # number of individuals in each generation
+    lambda_ = pop_size                              # number of children to produce at each generation
+    mu = int(pop_size * 0.8)                        # number of individuals to select for the next generation
+
+    cxpb = 0.95         # probability that an offspring is produced by crossover
+    mutpb = 1 - cxpb    # probability that an offspring is produced by mutation
+
+    pop = toolbox.population(pop_size)
+    hof = tools.ParetoFront()               # end result of pareto front
+
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    np.set_printoptions(suppress=True)
+    stats.register("mean", np.mean, axis=0)
+    stats.register("std", np.std, axis=0)
+    stats.register("min", np.min, axis=0)
+    stats.register("max", np.max, axis=0)
+
+    # Run ga optimization
+    output(f"参数优化空间：{total_size}")
+    output(f"每代族群总数：{pop_size}")
+    output(f"优良筛选个数：{mu}")
+    output(f"迭代次数：{ngen}")
+    output(f"交叉概率：{cxpb:.0%}")
+    output(f"突变概率：{mutpb:.0%}")
+
+    start = time()
+
+    try:
+        # Statistics of generation with failed individuals are -inf or nan
+        with np.errstate(invalid="ignore"):
+            algorithms.eaMuPlusLambda(
+                pop,
+                toolbox,
+                mu,
+                lambda_,
+                cxpb,
+                mutpb,
+                ngen,
+                stats,
+                halloffame=hof,
+                verbose=verbose
+            )
+    except OptimizationCancelled:
+        output(f"遗传算法优化已停止，完成迭代：{len(generations)}/{ngen + 1}")
+
+    end = time()
+    cost = int((end - start))
+
+    output(f"遗传算法优化完成，耗时{cost}秒，回测次数：{len(cache)}")
+
+    # Return result list
+    results = []
+
+    if hof:
+        for parameter_values in hof:
+            setting = dict(parameter_values)
+            result = cache.get(str(setting), None)
+            if result:
+                results.append((setting, result[1], result[2]))
+    # Use all evaluated results if stopped before first generation
+    else:
+        for key, result in cache.items():
+            results.append((evaluated_settings[key], result[1], result[2]))
+        results.sort(reverse=True, key=lambda result: result[1])
+
+    return results
+
+
+class OptimizationCancelled(Exception):
+    """
+    Raised when optimization is cancelled by executor.
+    """
+    pass
+
+
+class OptimizationExecutor:
+    """
+    Process pool kept alive across optimization sweeps.
+
+    Settings are dispatched in chunks with guided scheduling: chunk size
+    shrinks as remaining settings decrease, so that all workers finish
+    at about the same time. Engine configuration is pickled once for each
+    sweep and unpickled once by each worker. The pickled bytes are still
+    sent with every chunk, since pool can not address a worker, but they
+    are small as history data is passed by shared memory.
+    """
+
+    def __init__(self, max_workers: int = 0, output: Callable = print):
+        """"""
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.output = output
+
+        self.pool = None
+        self.cancel_event = None
+        self.cancelled = False
+        self.run_count = 0
+
+    def start(self):
+        """
+        Start worker processes if not started yet.
+        """
+        if self.pool:
+            return
+
+        # Force to use spawn method to create new process (instead of fork on Linux)
+        ctx = multiprocessing.get_context("spawn")
+        self.cancel_event = ctx.Event()
+        self.pool = ctx.Pool(
+            self.max_workers,
+            initializer=init_optimization_worker,
+            initargs=(self.cancel_event,)
+        )
+
+    def stop(self):
+        """
+        Stop worker processes after running tasks finished.
+        """
+        if not self.pool:
+            return
+
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+
+    def cancel(self):
+        """
+        Stop dispatching settings and notify workers to skip the rest.
+        """
+        self.cancelled = True
+
+        if self.cancel_event:
+            self.cancel_event.set()
+
+    def reset(self):
+        """
+        Clear cancel status before starting a new sweep.
+        """
+        self.cancelled = False
+
+        if self.cancel_event:
+            self.cancel_event.clear()
+
+    def run(self, config: dict, settings: List[dict], callback: Callable = None) -> list:
+        """
+        Run backtesting of every setting and return optimize results
+        in finishing order. Callback is called with (finished, total,
+        results) whenever a chunk is finished.
+        """
+        if self.cancelled or not settings:
+            return []
+
+        self.start()
+
+        self.run_count += 1
+        key = f"{os.getpid()}_{id(self)}_{self.run_count}"
+        data = pickle.dumps(config)
+
+        done_queue = Queue()
+        total = len(settings)
+        ix = 0
+        running = 0
+        finished = 0
+        results = []
+
+        while ix < total or running:
+            # Keep two chunks for each worker in queue
+            while ix < total and running < self.max_workers * 2 and not self.cancelled:
+                size = max(1, (total - ix) // (self.max_workers * 4))
+                chunk = settings[ix:ix + size]
+                ix += size
+
+                self.pool.apply_async(
+                    run_optimization_chunk,
+                    (key, data, chunk),
+                    callback=partial(self.put_done, done_queue, len(chunk)),
+                    error_callback=partial(self.put_done, done_queue, len(chunk))
+                )
+                running += 1
+
+            if not running:
+                break
+
+            count, chunk_results = done_queue.get()
+            running -= 1
+            finished += count
+
+            if isinstance(chunk_results, BaseException):
+                self.output(f"参数优化子进程触发异常：{chunk_results}")
+                continue
+
+            for result in chunk_results:
+                if "error" in result[2]:
+                    self.output(f"参数{result[0]}回测触发异常：\n{result[2]['error']}")
+
+            results.extend(chunk_results)
+
+            if callback:
+                callback(finished, total, chunk_results)
+
+        return results
+
+    @staticmethod
+    def put_done(done_queue: Queue, count: int, chunk_results):
+        """"""
+        done_queue.put((count, chunk_results))
+
+
+def init_optimization_worker(cancel_event):
+    """
+    Initializer of optimization worker process.
+    """
+    global worker_cancel_event
+    worker_cancel_event = cancel_event
+
+
+def run_optimization_chunk(key: str, data: bytes, settings: List[dict]) -> list:
+    """
+    Function for running a chunk of settings in optimization worker.
+    """
+    config = worker_configs.get(key, None)
+
+    if not config:
+        # Release history data of last sweep before loading new config
+        worker_configs.clear()
+        release_shared_memories()
+
+        config = pickle.loads(data)
+        worker_configs[key] = config
+
+    # Optimize function of other backtesting engine can be given in config
+    func = config.get("optimize_func", optimize)
+    results = []
+
+    for setting in settings:
+        if worker_cancel_event and worker_cancel_event.is_set():
+            break
+
+        try:
+            result = func(
+                config["target_name"],
+                config["strategy_class"],
+                setting,
+                history_data=config["history_data"],
+                **config["parameters"]
+            )
+        except Exception:
+            # Failed setting gets the lowest target, so that other settings
+            # of the chunk and the whole optimization still go on
+            results.append(failed_result(setting, traceback.format_exc()))
+            continue
+
+        results.append(result)
+
+        if config["cache_base"]:
+            cache_key = generate_cache_key(config["cache_base"], setting)
+            backtesting_cache.put(cache_key, {"statistics": result[2]})
+
+    return results
+
+
+def failed_result(setting: dict, error: str) -> tuple:
+    """
+    Optimize result of setting which raised exception in backtesting.
+    """
+    return (str(setting), -np.inf, {"error": error})
+
+
+def release_shared_memories():
+    """
+    Close shared memory blocks attached by worker process.
+    """
+    gc.collect()
+
+    for name, shm in list(shared_memories.items()):
+        try:
+            shm.close()
+            shared_memories.pop(name)
+        except BufferError:
+            pass
 
 
 @lru_cache(maxsize=999)
@@ -1304,22 +2812,12 @@ def load_tick_data(
     end: datetime
 ):
     """"""
+    if SETTINGS["database.tick_archive"]:
+        return tick_archive.load_tick_data(
+            symbol, exchange, start, end
+        )
+
     return database_manager.load_tick_data(
         symbol, exchange, start, end
     )
 
-
-# GA related global value
-ga_end = None
-ga_mode = None
-ga_target_name = None
-ga_strategy_class = None
-ga_setting = None
-ga_vt_symbol = None
-ga_interval = None
-ga_start = None
-ga_rate = None
-ga_slippage = None
-ga_size = None
-ga_pricetick = None
-ga_capital = None
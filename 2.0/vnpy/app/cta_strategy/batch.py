@@ -0,0 +1,365 @@
+"""
+Batch backtesting of one CTA strategy over multiple instruments.
+
+Each task is a (vt_symbol, setting, cost parameters) combination. History
+data of each symbol is loaded only once by the parent process into a
+shared memory block, which is used by all tasks of the symbol running in
+worker processes. Symbols are loaded one by one while workers are busy
+with tasks of previous symbols, and the block is released as soon as
+all tasks of the symbol are finished.
+
+Daily results of all tasks are summed into an aggregate equity curve,
+which is analyzed by the same statistics of BacktestingEngine.
+"""
+
+import pickle
+from datetime import datetime
+from functools import partial
+from queue import Queue
+from typing import Callable, Optional
+
+from pandas import DataFrame, concat
+
+from vnpy.trader.constant import Interval
+
+from .base import BacktestingMode
+from .backtesting import (
+    BacktestingEngine,
+    OptimizationExecutor,
+    SharedHistoryData,
+    release_shared_memories
+)
+from .walkforward import get_daily_df
+
+
+SUM_COLUMNS = [
+    "trade_count",
+    "turnover",
+    "commission",
+    "slippage",
+    "trading_pnl",
+    "holding_pnl",
+    "total_pnl",
+    "net_pnl",
+]
+
+
+class BatchBacktestingEngine:
+    """
+    Set common parameters and add tasks, then call run_batch.
+    """
+
+    def __init__(self):
+        """"""
+        self.strategy_class = None
+        self.interval = Interval.MINUTE
+        self.start = None
+        self.end = None
+        self.capital = 1_000_000
+        self.mode = BacktestingMode.BAR
+
+        self.tasks = []
+        self.results = []
+        self.daily_df = None
+
+    def set_parameters(
+        self,
+        strategy_class: type,
+        interval: Interval,
+        start: datetime,
+        end: datetime = None,
+        capital: int = 1_000_000,
+        mode: BacktestingMode = BacktestingMode.BAR
+    ):
+        """"""
+        self.strategy_class = strategy_class
+        self.interval = Interval(interval)
+        self.start = start
+        self.end = end or datetime.now()
+        self.capital = capital
+        self.mode = mode
+
+    def add_task(
+        self,
+        vt_symbol: str,
+        setting: dict,
+        rate: float,
+        slippage: float,
+        size: float,
+        pricetick: float,
+        capital: int = 0,
+        inverse: bool = False,
+        name: str = ""
+    ):
+        """
+        Name of task defaults to vt_symbol, with number appended if the
+        symbol is added more than once.
+        """
+        if not name:
+            count = len([task for task in self.tasks if task["vt_symbol"] == vt_symbol])
+            name = f"{vt_symbol}_{count}" if count else vt_symbol
+
+        task = {
+            "name": name,
+            "vt_symbol": vt_symbol,
+            "setting": setting,
+            "rate": rate,
+            "slippage": slippage,
+            "size": size,
+            "pricetick": pricetick,
+            "capital": capital or self.capital,
+            "inverse": inverse
+        }
+        self.tasks.append(task)
+
+    def clear_tasks(self):
+        """"""
+        self.tasks.clear()
+        self.results.clear()
+        self.daily_df = None
+
+    def run_batch(
+        self,
+        executor: OptimizationExecutor = None,
+        callback: Callable = None
+    ) -> list:
+        """
+        Return list of result dict of finished tasks in adding order.
+        Callback is called with (finished, total, result) after each task.
+        """
+        if not self.tasks:
+            self.output("批量回测任务为空，请检查")
+            return []
+
+        self.output("开始批量回测")
+
+        # Group tasks by symbol in adding order
+        groups = {}
+        for ix, task in enumerate(self.tasks):
+            groups.setdefault(task["vt_symbol"], []).append(ix)
+
+        pending = list(groups.items())
+        remaining = {vt_symbol: len(indexes) for vt_symbol, indexes in pending}
+        shared_data = {}
+
+        temp_executor = not executor
+        if temp_executor:
+            executor = OptimizationExecutor(output=self.output)
+        executor.reset()
+        executor.start()
+
+        done_queue = Queue()
+        results = [None] * len(self.tasks)
+        total = len(self.tasks)
+        finished = 0
+        running = 0
+
+        try:
+            while pending or running:
+                # Load next symbol only when workers are running out of tasks
+                while pending and running < executor.max_workers * 2 and not executor.cancelled:
+                    vt_symbol, indexes = pending.pop(0)
+
+                    history_data = self.load_shared_data(vt_symbol)
+                    if history_data is False:
+                        self.output(f"{vt_symbol}历史数据为空，跳过")
+                        finished += len(indexes)
+                        continue
+
+                    if history_data:
+                        shared_data[vt_symbol] = history_data
+
+                    for ix in indexes:
+                        data = pickle.dumps(self.get_task_config(self.tasks[ix], history_data))
+                        executor.pool.apply_async(
+                            run_batch_task,
+                            (data,),
+                            callback=partial(executor.put_done, done_queue, ix),
+                            error_callback=partial(executor.put_done, done_queue, ix)
+                        )
+                        running += 1
+
+                if not running:
+                    break
+
+                ix, result = done_queue.get()
+                running -= 1
+                finished += 1
+
+                task = self.tasks[ix]
+                vt_symbol = task["vt_symbol"]
+
+                # Release shared data after all tasks of symbol are finished
+                remaining[vt_symbol] -= 1
+                if not remaining[vt_symbol] and vt_symbol in shared_data:
+                    shared_data.pop(vt_symbol).release()
+
+                if isinstance(result, BaseException):
+                    self.output(f"{task['name']}回测子进程触发异常：{result}")
+                    continue
+
+                result.update({
+                    "name": task["name"],
+                    "vt_symbol": vt_symbol,
+                    "setting": task["setting"],
+                    "capital": task["capital"]
+                })
+                results[ix] = result
+
+                self.output(f"批量回测进度：{finished}/{total}，{task['name']}完成")
+
+                if callback:
+                    callback(finished, total, result)
+        finally:
+            for history_data in shared_data.values():
+                history_data.release()
+
+            if temp_executor:
+                executor.stop()
+
+        self.results = [result for result in results if result]
+        self.daily_df = None
+
+        if executor.cancelled:
+            self.output(f"批量回测已停止，完成任务：{len(self.results)}/{total}")
+        else:
+            self.output("批量回测完成")
+
+        return self.results
+
+    def load_shared_data(self, vt_symbol: str):
+        """
+        Load history data of symbol into shared memory block. Return False
+        if data is empty, or None if shared memory is not supported and
+        workers should load data by themselves.
+        """
+        engine = BacktestingEngine()
+        engine.set_parameters(
+            vt_symbol=vt_symbol,
+            interval=self.interval,
+            start=self.start,
+            rate=0,
+            slippage=0,
+            size=1,
+            pricetick=0,
+            end=self.end,
+            mode=self.mode
+        )
+
+        # Data is loaded without cache, since each symbol is used only once
+        history_data = engine.load_period_data(self.start, self.end)
+        if not history_data:
+            return False
+
+        return SharedHistoryData.create(history_data, self.mode)
+
+    def get_task_config(self, task: dict, history_data: Optional[SharedHistoryData]) -> dict:
+        """
+        Engine configuration shipped to worker for running task.
+        """
+        return {
+            "strategy_class": self.strategy_class,
+            "setting": task["setting"],
+            "history_data": history_data,
+            "parameters": {
+                "vt_symbol": task["vt_symbol"],
+                "interval": self.interval,
+                "start": self.start,
+                "rate": task["rate"],
+                "slippage": task["slippage"],
+                "size": task["size"],
+                "pricetick": task["pricetick"],
+                "capital": task["capital"],
+                "end": self.end,
+                "mode": self.mode,
+                "inverse": task["inverse"]
+            }
+        }
+
+    def calculate_result(self) -> Optional[DataFrame]:
+        """
+        Sum daily results of all tasks by date.
+        """
+        self.output("开始计算组合逐日盯市盈亏")
+
+        if not self.results:
+            self.output("批量回测结果为空，无法计算")
+            return None
+
+        dfs = [result["daily_df"][SUM_COLUMNS] for result in self.results]
+        self.daily_df = concat(dfs).groupby(level=0).sum().sort_index()
+
+        self.output("组合逐日盯市盈亏计算完成")
+        return self.daily_df
+
+    def calculate_statistics(self, df: DataFrame = None, output: bool = True) -> dict:
+        """
+        Statistics of aggregate equity curve, with capital of all tasks.
+        """
+        engine = BacktestingEngine()
+        engine.output = self.output
+        engine.capital = sum(result["capital"] for result in self.results)
+
+        if df is None:
+            df = self.daily_df
+
+        return engine.calculate_statistics(df, output)
+
+    def get_statistics_df(self) -> DataFrame:
+        """
+        Statistics of each task in one row.
+        """
+        data = {result["name"]: result["statistics"] for result in self.results}
+        return DataFrame.from_dict(data, orient="index")
+
+    def get_balance_df(self) -> DataFrame:
+        """
+        Equity curve of each task in one column.
+        """
+        data = {
+            result["name"]: result["daily_df"]["net_pnl"].cumsum() + result["capital"]
+            for result in self.results
+        }
+        return DataFrame(data).sort_index().ffill()
+
+    def output(self, msg):
+        """
+        Output message of batch backtesting.
+        """
+        print(f"{datetime.now()}\t{msg}")
+
+
+def run_batch_task(data: bytes) -> dict:
+    """
+    Function for running one task of batch backtesting in worker.
+    """
+    config = pickle.loads(data)
+
+    engine = BacktestingEngine()
+    engine.output = lambda msg: None
+
+    engine.set_parameters(**config["parameters"])
+    engine.add_strategy(config["strategy_class"], config["setting"])
+
+    # Use history data shared by parent process if provided
+    if config["history_data"] is not None:
+        engine.history_data = config["history_data"]
+    else:
+        engine.load_data()
+
+    engine.run_backtesting()
+    engine.calculate_result()
+    statistics = engine.calculate_statistics(output=False)
+
+    result = {
+        "statistics": statistics,
+        "daily_df": get_daily_df(engine).drop(columns="trades"),
+        "trades": list(engine.trades.values())
+    }
+
+    # Shared memory block of symbol is closed for releasing memory
+    engine.history_data = []
+    config.clear()
+    release_shared_memories()
+
+    return result
@@ -0,0 +1,297 @@
+"""
+Content-addressed cache of backtesting results.
+
+Cache key is hash of strategy source code, strategy setting, backtesting
+parameters and fingerprint of history data, so that any change of them
+leads to a new key and stale results are never returned.
+"""
+
+import hashlib
+import inspect
+import json
+import pickle
+import sqlite3
+import sys
+import sysconfig
+from contextlib import closing
+from pathlib import Path
+from time import time
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Set
+
+import vnpy
+from vnpy.trader.setting import SETTINGS
+from vnpy.trader.utility import get_file_path
+
+
+class BacktestingCache:
+    """
+    Backtesting results stored in sqlite file with LRU eviction.
+
+    A new connection is used for each operation, so that the cache can
+    be shared by threads and optimization worker processes.
+    """
+
+    def __init__(self, path: Path, size_limit: int):
+        """
+        size_limit is in MB, cache is disabled if set to 0.
+        """
+        self.path = path
+        self.size_limit = size_limit * 1024 * 1024
+        self.inited = False
+
+    @property
+    def active(self) -> bool:
+        """"""
+        return self.size_limit > 0
+
+    def connect(self) -> sqlite3.Connection:
+        """"""
+        conn = sqlite3.connect(str(self.path), timeout=30)
+
+        # Row replaced by INSERT OR REPLACE also fires delete trigger
+        conn.execute("PRAGMA recursive_triggers=ON")
+
+        if not self.inited:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result ("
+                "key TEXT PRIMARY KEY, "
+                "data BLOB NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "access_time REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS result_access_time ON result (access_time)"
+            )
+
+            # Total size of results is kept up to date by triggers,
+            # so that it is not summed up again on every insert
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), "
+                "size INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO usage (id, size) "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM result"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS result_insert AFTER INSERT ON result "
+                "BEGIN UPDATE usage SET size = size + new.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS result_delete AFTER DELETE ON result "
+                "BEGIN UPDATE usage SET size = size - old.size WHERE id = 0; END"
+            )
+            conn.commit()
+            self.inited = True
+
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return cached value and mark it as recently used.
+        """
+        return self.get_many([key]).get(key, None)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Return dict of cached values found for keys.
+        """
+        if not self.active or not keys:
+            return {}
+
+        values = {}
+        now = time()
+
+        with closing(self.connect()) as conn:
+            # Query in batches to stay within sqlite variable limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                marks = ",".join("?" * len(batch))
+
+                rows = conn.execute(
+                    f"SELECT key, data FROM result WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, data in rows:
+                    values[key] = pickle.loads(data)
+
+                conn.execute(
+                    f"UPDATE result SET access_time = ? WHERE key IN ({marks})",
+                    [now] + batch
+                )
+
+            conn.commit()
+
+        return values
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store value and evict least recently used ones if over size limit.
+        """
+        if not self.active:
+            return
+
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # Value larger than whole cache is not stored
+        if len(data) > self.size_limit:
+            return
+
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO result (key, data, size, access_time) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time())
+            )
+
+            total = conn.execute("SELECT size FROM usage").fetchone()[0]
+
+            if total > self.size_limit:
+                rows = conn.execute(
+                    "SELECT key, size FROM result ORDER BY access_time"
+                ).fetchall()
+
+                evicted = []
+                for row_key, size in rows:
+                    if total <= self.size_limit:
+                        break
+                    evicted.append((row_key,))
+                    total -= size
+
+                conn.executemany("DELETE FROM result WHERE key = ?", evicted)
+
+            conn.commit()
+
+    def clear(self) -> None:
+        """"""
+        with closing(self.connect()) as conn:
+            conn.execute("DELETE FROM result")
+            conn.commit()
+            conn.execute("VACUUM")
+
+    def get_statistics(self) -> dict:
+        """
+        Return count and total size of cached results.
+        """
+        with closing(self.connect()) as conn:
+            count, size = conn.execute(
+                "SELECT COUNT(*), SUM(size) FROM result"
+            ).fetchone()
+
+        return {"count": count, "size": size or 0, "size_limit": self.size_limit}
+
+
+# Sources used in backtesting besides strategy, such as bar generator,
+# array manager and bar aggregation
+VNPY_FOLDER = Path(vnpy.__file__).parent
+VNPY_ROOT = VNPY_FOLDER.resolve()
+
+ENGINE_SOURCES = [
+    Path(__file__).with_name("backtesting.py"),
+    VNPY_FOLDER.joinpath("trader", "utility.py"),
+    VNPY_FOLDER.joinpath("trader", "database", "database.py"),
+]
+
+# Modules in standard library and site-packages are not hashed, changes
+# of them come with Python or package updates
+LIBRARY_FOLDERS = {
+    Path(sysconfig.get_paths()[name]).resolve()
+    for name in ("stdlib", "platstdlib", "purelib", "platlib")
+}
+
+
+def get_code_fingerprint(strategy_class: type) -> str:
+    """
+    Hash source files of strategy class and its base classes, modules
+    imported by them out of vn.py (such as helper and indicator modules
+    of user strategies), together with backtesting engine sources and
+    vn.py version.
+    """
+    paths = set(ENGINE_SOURCES)
+    modules = []
+
+    for cls in strategy_class.__mro__:
+        try:
+            paths.add(Path(inspect.getfile(cls)))
+        except TypeError:           # Builtin class
+            continue
+
+        module = sys.modules.get(cls.__module__, None)
+        if module:
+            modules.append(module)
+
+    paths.update(get_imported_paths(modules))
+
+    md5 = hashlib.md5(vnpy.__version__.encode())
+    for path in sorted(paths):
+        if path.exists():
+            md5.update(path.read_bytes())
+
+    return md5.hexdigest()
+
+
+def get_imported_paths(modules: List[ModuleType]) -> Set[Path]:
+    """
+    Source files of modules imported by given modules recursively, which
+    are neither in vn.py nor in library folders.
+    """
+    paths = set()
+    visited = {module.__name__ for module in modules}
+    pending = list(modules)
+
+    while pending:
+        module = pending.pop()
+
+        for value in list(vars(module).values()):
+            # Module imported directly, or module of imported function/class
+            if isinstance(value, ModuleType):
+                imported = value
+            else:
+                name = getattr(value, "__module__", None)
+                if not isinstance(name, str):
+                    continue
+                imported = sys.modules.get(name, None)
+
+            if not imported or imported.__name__ in visited:
+                continue
+            visited.add(imported.__name__)
+
+            path = get_user_source_path(imported)
+            if path:
+                paths.add(path)
+                pending.append(imported)
+
+    return paths
+
+
+def get_user_source_path(module: ModuleType) -> Optional[Path]:
+    """
+    Return source file of module if it is neither in vn.py nor in
+    library folders.
+    """
+    file = getattr(module, "__file__", None)
+    if not file or not file.endswith(".py"):
+        return None
+
+    path = Path(file).resolve()
+    parents = set(path.parents)
+
+    if VNPY_ROOT in parents or parents & LIBRARY_FOLDERS:
+        return None
+    return path
+
+
+def generate_cache_key(base: dict, setting: dict) -> str:
+    """
+    Generate key from backtesting config and strategy setting.
+    """
+    text = json.dumps([base, setting], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+backtesting_cache = BacktestingCache(
+    get_file_path("backtesting_cache.db"),
+    SETTINGS["backtester.cache_size"]
+)
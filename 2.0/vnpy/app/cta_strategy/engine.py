@@ -38,6 +38,7 @@ from vnpy.trader.constant import (
 )
 from vnpy.trader.utility import load_json, save_json, extract_vt_symbol, round_to
 from vnpy.trader.database import database_manager
+from vnpy.trader.database.database import aggregate_bars
 from vnpy.trader.rqdata import rqdata_client
 from vnpy.trader.converter import OffsetConverter
 
@@ -529,7 +530,8 @@ class CtaEngine(BaseEngine):
         days: int,
         interval: Interval,
         callback: Callable[[BarData], None],
-        use_database: bool
+        use_database: bool,
+        window: int = 0
     ):
         """"""
         symbol, exchange = extract_vt_symbol(vt_symbol)
@@ -537,6 +539,9 @@ class CtaEngine(BaseEngine):
         start = end - timedelta(days)
         bars = []
 
+        # Window bars are aggregated from 1-minute bars
+        query_interval = Interval.MINUTE if window else interval
+
         # Pass gateway and RQData if use_database set to True
         if not use_database:
             # Query bars from gateway if available
@@ -546,7 +551,7 @@ class CtaEngine(BaseEngine):
                 req = HistoryRequest(
                     symbol=symbol,
                     exchange=exchange,
-                    interval=interval,
+                    interval=query_interval,
                     start=start,
                     end=end
                 )
@@ -554,16 +559,29 @@ class CtaEngine(BaseEngine):
 
             # Try to query bars from RQData, if not found, load from database.
             else:
-                bars = self.query_bar_from_rq(symbol, exchange, interval, start, end)
+                bars = self.query_bar_from_rq(symbol, exchange, query_interval, start, end)
+
+            if bars and window:
+                bars = aggregate_bars(bars, window, interval)
 
         if not bars:
-            bars = database_manager.load_bar_data(
-                symbol=symbol,
-                exchange=exchange,
-                interval=interval,
-                start=start,
-                end=end,
-            )
+            if window:
+                bars = database_manager.load_window_bar_data(
+                    symbol=symbol,
+                    exchange=exchange,
+                    interval=interval,
+                    window=window,
+                    start=start,
+                    end=end,
+                )
+            else:
+                bars = database_manager.load_bar_data(
+                    symbol=symbol,
+                    exchange=exchange,
+                    interval=interval,
+                    start=start,
+                    end=end,
+                )
 
         for bar in bars:
             callback(bar)
@@ -0,0 +1,426 @@
+"""
+Monte Carlo robustness analysis of CTA backtesting result.
+
+Two resampling methods are supported:
+
+    * bootstrap: daily results are drawn with replacement (in blocks of
+      consecutive days if block_size > 1), keeping the calendar of the
+      original backtesting
+    * shuffle: pnl of each trade on closed trade basis is shuffled among
+      trades, so that the same trades happen in a different order
+
+Statistics of all samples are calculated on 2D arrays with the same rules
+of BacktestingEngine.calculate_statistics. Samples are split into chunks
+to bound memory usage, chunks are run in worker processes if executor is
+provided, and each chunk uses its own random seed spawned from the seed
+of the analysis, so results are reproducible with or without executor.
+"""
+
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+import numpy as np
+from pandas import DataFrame
+
+from vnpy.trader.constant import Direction
+from vnpy.trader.object import TradeData
+
+from .backtesting import OptimizationExecutor
+
+
+STATISTICS_NAMES = [
+    "total_days",
+    "profit_days",
+    "loss_days",
+    "end_balance",
+    "max_drawdown",
+    "max_ddpercent",
+    "max_drawdown_duration",
+    "total_net_pnl",
+    "daily_net_pnl",
+    "total_commission",
+    "daily_commission",
+    "total_slippage",
+    "daily_slippage",
+    "total_turnover",
+    "daily_turnover",
+    "total_trade_count",
+    "daily_trade_count",
+    "total_return",
+    "annual_return",
+    "daily_return",
+    "return_std",
+    "sharpe_ratio",
+    "return_drawdown_ratio",
+]
+
+COST_COLUMNS = ["commission", "slippage", "turnover", "trade_count"]
+
+
+class MonteCarloAnalyzer:
+    """
+    Analyze daily_df and trades of a finished backtesting, with the same
+    capital and contract parameters.
+    """
+
+    def __init__(
+        self,
+        daily_df: DataFrame,
+        trades: List[TradeData],
+        capital: int,
+        size: float = 1,
+        rate: float = 0,
+        slippage: float = 0,
+        inverse: bool = False
+    ):
+        """"""
+        self.daily_df = daily_df
+        self.trades = trades
+        self.capital = capital
+        self.size = size
+        self.rate = rate
+        self.slippage = slippage
+        self.inverse = inverse
+
+        self.dates = np.array(list(daily_df.index), dtype="datetime64[D]")
+        self.net_pnl = daily_df["net_pnl"].to_numpy(dtype=np.float64)
+        self.costs = {
+            name: daily_df[name].to_numpy(dtype=np.float64) for name in COST_COLUMNS
+        }
+
+    def run_bootstrap(
+        self,
+        n_samples: int = 10000,
+        block_size: int = 1,
+        seed: int = None,
+        chunk_size: int = 1000,
+        executor: OptimizationExecutor = None
+    ) -> DataFrame:
+        """
+        Return statistics of bootstrap samples, one row for each sample.
+        """
+        self.output(f"开始Bootstrap重采样，样本数量：{n_samples}，区块长度：{block_size}")
+
+        arrays = {"net_pnl": self.net_pnl, **self.costs}
+        args = {"block_size": block_size}
+
+        return self.run_samples("bootstrap", arrays, args, n_samples, seed, chunk_size, executor)
+
+    def run_shuffle(
+        self,
+        n_samples: int = 10000,
+        seed: int = None,
+        chunk_size: int = 1000,
+        executor: OptimizationExecutor = None
+    ) -> DataFrame:
+        """
+        Return statistics of trade shuffle samples, one row for each sample.
+        """
+        self.output(f"开始成交乱序重采样，样本数量：{n_samples}")
+
+        trade_pnl, trade_days, final_pnl = self.calculate_trade_pnl()
+
+        if not len(trade_pnl):
+            self.output("成交记录为空，无法重采样")
+            return DataFrame(columns=STATISTICS_NAMES)
+
+        # Position pnl not closed at the end is added on the last day
+        base_pnl = np.zeros(len(self.dates))
+        base_pnl[-1] = final_pnl
+
+        arrays = {"base_pnl": base_pnl, **self.costs}
+        args = {"trade_pnl": trade_pnl, "trade_days": trade_days}
+
+        return self.run_samples("shuffle", arrays, args, n_samples, seed, chunk_size, executor)
+
+    def run_samples(
+        self,
+        method: str,
+        arrays: Dict[str, np.ndarray],
+        args: dict,
+        n_samples: int,
+        seed: int,
+        chunk_size: int,
+        executor: OptimizationExecutor
+    ) -> DataFrame:
+        """"""
+        seeds = np.random.SeedSequence(seed).spawn((n_samples + chunk_size - 1) // chunk_size)
+        counts = [min(chunk_size, n_samples - i * chunk_size) for i in range(len(seeds))]
+
+        tasks = [
+            (method, arrays, args, self.dates, self.capital, count, seed_seq)
+            for count, seed_seq in zip(counts, seeds)
+        ]
+
+        if executor:
+            executor.start()
+            chunk_results = executor.pool.starmap(run_monte_carlo_chunk, tasks)
+        else:
+            chunk_results = [run_monte_carlo_chunk(*task) for task in tasks]
+
+        data = {
+            name: np.concatenate([result[name] for result in chunk_results])
+            for name in STATISTICS_NAMES
+        }
+
+        self.output("重采样完成")
+        return DataFrame(data, columns=STATISTICS_NAMES)
+
+    def calculate_trade_pnl(self) -> tuple:
+        """
+        Match trades first in first out, return array of net pnl of each
+        trade (realized pnl of closed volume minus cost of the trade),
+        array of day position of each trade and pnl of open position
+        at the last close price.
+        """
+        day_index = {d: ix for ix, d in enumerate(self.dates.tolist())}
+        size = self.size
+
+        lots = deque()      # (price, signed volume) of open position
+        trade_pnl = []
+        trade_days = []
+
+        for trade in self.trades:
+            if trade.direction == Direction.LONG:
+                volume = trade.volume
+            else:
+                volume = -trade.volume
+
+            if self.inverse:
+                turnover = trade.volume * size / trade.price
+                cost = turnover * self.rate + trade.volume * size * self.slippage / (trade.price ** 2)
+            else:
+                turnover = trade.volume * size * trade.price
+                cost = turnover * self.rate + trade.volume * size * self.slippage
+
+            pnl = -cost
+
+            # Close open lots of opposite direction first
+            while volume and lots and lots[0][1] * volume < 0:
+                price, lot_volume = lots[0]
+                closed = min(abs(volume), abs(lot_volume))
+                sign = 1 if lot_volume > 0 else -1
+
+                pnl += self.get_price_pnl(price, trade.price) * closed * sign * size
+
+                if closed == abs(lot_volume):
+                    lots.popleft()
+                else:
+                    lots[0] = (price, lot_volume - closed * sign)
+                volume += closed * sign
+
+            if volume:
+                lots.append((trade.price, volume))
+
+            trade_day = day_index.get(trade.datetime.date(), None)
+            if trade_day is None:
+                trade_day = int(np.searchsorted(self.dates, np.datetime64(trade.datetime.date())))
+                trade_day = min(trade_day, len(self.dates) - 1)
+
+            trade_pnl.append(pnl)
+            trade_days.append(trade_day)
+
+        close_price = self.daily_df["close_price"].iloc[-1]
+        final_pnl = sum(
+            self.get_price_pnl(price, close_price) * volume * size
+            for price, volume in lots
+        )
+
+        return np.array(trade_pnl), np.array(trade_days, dtype=np.int64), final_pnl
+
+    def get_price_pnl(self, open_price: float, close_price: float) -> float:
+        """
+        Pnl of one long contract with size of 1.
+        """
+        if self.inverse:
+            return 1 / open_price - 1 / close_price
+        else:
+            return close_price - open_price
+
+    def calculate_original(self) -> dict:
+        """
+        Statistics of original daily results with the same array rules.
+        """
+        statistics = calculate_statistics_array(
+            self.net_pnl[None, :],
+            {name: values[None, :] for name, values in self.costs.items()},
+            self.dates,
+            self.capital
+        )
+        return {name: values[0] for name, values in statistics.items()}
+
+    def get_percentiles(
+        self,
+        samples: DataFrame,
+        percentiles: Sequence[float] = (1, 5, 25, 50, 75, 95, 99)
+    ) -> DataFrame:
+        """
+        Return percentiles, mean and std of each statistics, together with
+        value of original backtesting.
+        """
+        values = samples.to_numpy(dtype=np.float64)
+
+        data = {"original": self.calculate_original()}
+        for percentile in percentiles:
+            data[f"{percentile}%"] = dict(zip(samples.columns, np.percentile(values, percentile, axis=0)))
+        data["mean"] = dict(zip(samples.columns, values.mean(axis=0)))
+        data["std"] = dict(zip(samples.columns, values.std(axis=0)))
+
+        return DataFrame(data, index=samples.columns)
+
+    def output_confidence_interval(
+        self,
+        samples: DataFrame,
+        names: Sequence[str] = ("total_return", "max_ddpercent", "sharpe_ratio"),
+        confidence: float = 0.95
+    ) -> None:
+        """"""
+        low = (1 - confidence) / 2 * 100
+        high = 100 - low
+        original = self.calculate_original()
+
+        self.output("-" * 30)
+        for name in names:
+            values = samples[name].to_numpy(dtype=np.float64)
+            low_value, median, high_value = np.percentile(values, [low, 50, high])
+            self.output(
+                f"{name}：\t原始{original[name]:,.2f}，中位数{median:,.2f}，"
+                f"{confidence:.0%}置信区间[{low_value:,.2f}, {high_value:,.2f}]"
+            )
+
+    def output(self, msg):
+        """
+        Output message of robustness analysis.
+        """
+        print(f"{datetime.now()}\t{msg}")
+
+
+def run_monte_carlo_chunk(
+    method: str,
+    arrays: Dict[str, np.ndarray],
+    args: dict,
+    dates: np.ndarray,
+    capital: int,
+    count: int,
+    seed_seq: np.random.SeedSequence
+) -> Dict[str, np.ndarray]:
+    """
+    Function for generating a chunk of samples in worker process.
+    """
+    rng = np.random.default_rng(seed_seq)
+    days = len(dates)
+
+    if method == "bootstrap":
+        block_size = max(1, min(args["block_size"], days))
+
+        # Start days of blocks, then fill consecutive days of each block
+        block_count = (days + block_size - 1) // block_size
+        starts = rng.integers(0, days - block_size + 1, size=(count, block_count))
+        index = (starts[:, :, None] + np.arange(block_size)).reshape(count, -1)[:, :days]
+
+        net_pnl = arrays["net_pnl"][index]
+        costs = {name: arrays[name][index] for name in COST_COLUMNS}
+    else:
+        trade_pnl = args["trade_pnl"]
+        trade_days = args["trade_days"]
+
+        # Shuffle trade pnl of each sample, then sum by day
+        shuffled = rng.permuted(np.tile(trade_pnl, (count, 1)), axis=1)
+        index = trade_days[None, :] + days * np.arange(count)[:, None]
+
+        net_pnl = np.bincount(
+            index.ravel(), weights=shuffled.ravel(), minlength=count * days
+        ).reshape(count, days)
+        net_pnl += arrays["base_pnl"]
+
+        costs = {name: np.broadcast_to(arrays[name], (count, days)) for name in COST_COLUMNS}
+
+    return calculate_statistics_array(net_pnl, costs, dates, capital)
+
+
+def calculate_statistics_array(
+    net_pnl: np.ndarray,
+    costs: Dict[str, np.ndarray],
+    dates: np.ndarray,
+    capital: int
+) -> Dict[str, np.ndarray]:
+    """
+    Statistics of samples in rows of daily arrays, with the same rules
+    of BacktestingEngine.calculate_statistics.
+    """
+    count, total_days = net_pnl.shape
+
+    balance = np.cumsum(net_pnl, axis=1) + capital
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.zeros(balance.shape)
+        returns[:, 1:] = np.log(balance[:, 1:] / balance[:, :-1])
+        returns[np.isnan(returns)] = 0
+
+        highlevel = np.maximum.accumulate(balance, axis=1)
+        drawdown = balance - highlevel
+        ddpercent = drawdown / highlevel * 100
+
+    end_balance = balance[:, -1]
+    max_drawdown = drawdown.min(axis=1)
+    max_ddpercent = ddpercent.min(axis=1)
+
+    # Highest balance before max drawdown
+    max_drawdown_end = np.argmin(drawdown, axis=1)
+    before_end = np.arange(total_days)[None, :] <= max_drawdown_end[:, None]
+    max_drawdown_start = np.argmax(np.where(before_end, balance, -np.inf), axis=1)
+    max_drawdown_duration = (
+        dates[max_drawdown_end] - dates[max_drawdown_start]
+    ).astype(np.int64)
+
+    total_net_pnl = net_pnl.sum(axis=1)
+    total_commission = costs["commission"].sum(axis=1)
+    total_slippage = costs["slippage"].sum(axis=1)
+    total_turnover = costs["turnover"].sum(axis=1)
+    total_trade_count = costs["trade_count"].sum(axis=1)
+
+    total_return = (end_balance / capital - 1) * 100
+    daily_return = returns.mean(axis=1) * 100
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if total_days > 1:
+            return_std = returns.std(axis=1, ddof=1) * 100
+        else:
+            return_std = np.full(count, np.nan)
+
+        sharpe_ratio = np.where(return_std != 0, daily_return / return_std * np.sqrt(240), 0)
+        return_drawdown_ratio = -total_return / max_ddpercent
+
+    statistics = {
+        "total_days": np.full(count, total_days),
+        "profit_days": np.count_nonzero(net_pnl > 0, axis=1),
+        "loss_days": np.count_nonzero(net_pnl < 0, axis=1),
+        "end_balance": end_balance,
+        "max_drawdown": max_drawdown,
+        "max_ddpercent": max_ddpercent,
+        "max_drawdown_duration": max_drawdown_duration,
+        "total_net_pnl": total_net_pnl,
+        "daily_net_pnl": total_net_pnl / total_days,
+        "total_commission": total_commission,
+        "daily_commission": total_commission / total_days,
+        "total_slippage": total_slippage,
+        "daily_slippage": total_slippage / total_days,
+        "total_turnover": total_turnover,
+        "daily_turnover": total_turnover / total_days,
+        "total_trade_count": total_trade_count,
+        "daily_trade_count": total_trade_count / total_days,
+        "total_return": total_return,
+        "annual_return": total_return / total_days * 240,
+        "daily_return": daily_return,
+        "return_std": return_std,
+        "sharpe_ratio": sharpe_ratio,
+        "return_drawdown_ratio": return_drawdown_ratio,
+    }
+
+    # Filter potential error infinite value
+    for name, values in statistics.items():
+        values = np.where(np.isinf(values), 0, values)
+        statistics[name] = np.nan_to_num(values)
+
+    return statistics
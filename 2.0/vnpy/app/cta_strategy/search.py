@@ -0,0 +1,431 @@
+"""
+Adaptive search algorithms for CTA strategy optimization.
+
+Instead of backtesting the whole cartesian product of OptimizationSetting,
+these algorithms choose batches of settings to evaluate, which are run
+in parallel by BacktestingEngine.run_search_optimization:
+
+    * RandomSearch: uniform samples of parameter space
+    * SuccessiveHalving: evaluate many settings on a small part of history
+      data, keep the best 1/eta and grow data by eta times each round
+    * Hyperband: run successive halving with different trade-offs between
+      number of settings and data size
+    * ModelBasedSearch: sequential model-based search with tree-structured
+      parzen estimator, which samples new settings near good ones
+
+Budget of an evaluation is the fraction of history data used (from the
+beginning), so that cost of algorithms is counted in full backtesting.
+"""
+
+from math import ceil, log
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .backtesting import BacktestingEngine, OptimizationExecutor, OptimizationSetting
+
+
+class SearchAlgorithm:
+    """
+    Base class of search algorithm, sub class implements search method
+    which calls evaluate with batches of settings.
+    """
+
+    name = ""
+
+    def __init__(self, seed: int = None):
+        """"""
+        self.rng = np.random.default_rng(seed)
+
+        self.names = []
+        self.values = []
+        self.evaluate_func = None
+        self.callback = None
+
+        self.results = {}       # full budget results by setting key
+        self.cost = 0           # evaluations counted in full budget
+        self.trace = []         # (cost, best target) after each batch
+
+    @property
+    def space_size(self) -> int:
+        """"""
+        return int(np.prod([len(v) for v in self.values], dtype=np.float64))
+
+    @property
+    def best_value(self) -> Optional[float]:
+        """"""
+        if not self.trace:
+            return None
+        return self.trace[-1][1]
+
+    def run(
+        self,
+        optimization_setting: OptimizationSetting,
+        evaluate: Callable,
+        callback: Callable = None
+    ) -> list:
+        """
+        evaluate is called with (settings, budget) and returns list of
+        (setting key, target value, statistics). Callback is called with
+        (cost, best target, results) after each batch.
+        """
+        self.names = list(optimization_setting.params.keys())
+        self.values = list(optimization_setting.params.values())
+        self.evaluate_func = evaluate
+        self.callback = callback
+
+        self.results = {}
+        self.cost = 0
+        self.trace = []
+
+        self.search()
+
+        return self.get_results()
+
+    def search(self) -> None:
+        """"""
+        raise NotImplementedError
+
+    def evaluate(self, settings: List[dict], budget: float = 1.0) -> list:
+        """
+        Evaluate a batch of settings in parallel.
+        """
+        if not settings:
+            return []
+
+        budget = min(budget, 1.0)
+        results = self.evaluate_func(settings, budget)
+        self.cost += len(settings) * budget
+
+        if budget == 1.0:
+            for result in results:
+                self.results[result[0]] = result
+
+        if self.results:
+            best = max(result[1] for result in self.results.values())
+        else:
+            best = None
+        self.trace.append((self.cost, best))
+
+        if self.callback:
+            self.callback(self.cost, best, results)
+
+        return results
+
+    def get_results(self) -> list:
+        """
+        Return full budget results sorted by target value.
+        """
+        results = list(self.results.values())
+        results.sort(reverse=True, key=lambda result: result[1])
+        return results
+
+    def get_evaluations_to_target(self, target_value: float) -> Optional[float]:
+        """
+        Return cost when best target reached target value, or None if not.
+        """
+        for cost, best in self.trace:
+            if best is not None and best >= target_value:
+                return cost
+        return None
+
+    def to_setting(self, index: tuple) -> dict:
+        """
+        Convert value index of each parameter into setting.
+        """
+        return {name: values[i] for name, values, i in zip(self.names, self.values, index)}
+
+    def sample(self, count: int, exclude: set = None) -> List[dict]:
+        """
+        Sample distinct settings uniformly, excluding those already
+        evaluated in full budget or given in exclude.
+        """
+        exclude = set(exclude or ()) | set(self.results.keys())
+        total = self.space_size
+        count = min(count, total - len(exclude))
+
+        settings = []
+        keys = set()
+        shape = [len(v) for v in self.values]
+
+        # Shuffle whole space if it is small, otherwise draw until enough
+        if total <= count * 10 or total <= 100_000:
+            for ix in self.rng.permutation(total).tolist():
+                if len(settings) >= count:
+                    break
+
+                setting = self.to_setting(np.unravel_index(ix, shape))
+                key = str(setting)
+                if key not in exclude:
+                    settings.append(setting)
+        else:
+            while len(settings) < count:
+                index = [self.rng.integers(size) for size in shape]
+                setting = self.to_setting(index)
+                key = str(setting)
+
+                if key not in exclude and key not in keys:
+                    settings.append(setting)
+                    keys.add(key)
+
+        return settings
+
+    def halve(self, settings: List[dict], min_budget: float, eta: int) -> None:
+        """
+        Successive halving of settings, starting from min_budget.
+        """
+        budget = min_budget
+
+        while settings:
+            # Last survivor is evaluated in full budget directly, so that
+            # it is always counted in results
+            if len(settings) == 1:
+                budget = 1.0
+
+            results = self.evaluate(settings, budget)
+            if budget >= 1:
+                break
+
+            # Keep the best 1/eta settings and use eta times data
+            setting_map = {str(setting): setting for setting in settings}
+            results.sort(reverse=True, key=lambda result: result[1])
+            count = max(len(settings) // eta, 1)
+
+            settings = [setting_map[result[0]] for result in results[:count]]
+            budget = budget * eta
+            if budget > 1 - 1e-9:
+                budget = 1.0
+
+
+class RandomSearch(SearchAlgorithm):
+    """"""
+
+    name = "随机搜索"
+
+    def __init__(self, n_samples: int = 100, batch_size: int = 32, seed: int = None):
+        """"""
+        super().__init__(seed)
+
+        self.n_samples = n_samples
+        self.batch_size = batch_size
+
+    def search(self) -> None:
+        """"""
+        settings = self.sample(self.n_samples)
+
+        for i in range(0, len(settings), self.batch_size):
+            self.evaluate(settings[i:i + self.batch_size])
+
+
+class SuccessiveHalving(SearchAlgorithm):
+    """"""
+
+    name = "逐次减半"
+
+    def __init__(
+        self,
+        n_candidates: int = 81,
+        min_budget: float = 1 / 9,
+        eta: int = 3,
+        seed: int = None
+    ):
+        """"""
+        super().__init__(seed)
+
+        self.n_candidates = n_candidates
+        self.min_budget = min_budget
+        self.eta = eta
+
+    def search(self) -> None:
+        """"""
+        settings = self.sample(self.n_candidates)
+        self.halve(settings, self.min_budget, self.eta)
+
+
+class Hyperband(SearchAlgorithm):
+    """"""
+
+    name = "Hyperband"
+
+    def __init__(self, min_budget: float = 1 / 9, eta: int = 3, seed: int = None):
+        """"""
+        super().__init__(seed)
+
+        self.min_budget = min_budget
+        self.eta = eta
+
+    def search(self) -> None:
+        """"""
+        eta = self.eta
+        s_max = int(log(1 / self.min_budget, eta) + 1e-9)
+
+        for s in range(s_max, -1, -1):
+            count = ceil((s_max + 1) / (s + 1) * eta ** s)
+            settings = self.sample(count)
+            self.halve(settings, eta ** -s, eta)
+
+
+class ModelBasedSearch(SearchAlgorithm):
+    """
+    Tree-structured parzen estimator: evaluated settings are split into
+    good and bad by target value, new settings are chosen by maximizing
+    l(x) / g(x), where l and g are densities of good and bad settings.
+    Each parameter is modelled separately on its value index.
+    """
+
+    name = "模型搜索"
+
+    def __init__(
+        self,
+        n_evaluations: int = 100,
+        n_initial: int = 20,
+        batch_size: int = 8,
+        gamma: float = 0.25,
+        n_candidates: int = 64,
+        seed: int = None
+    ):
+        """"""
+        super().__init__(seed)
+
+        self.n_evaluations = n_evaluations
+        self.n_initial = n_initial
+        self.batch_size = batch_size
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+
+        self.indexes: Dict[str, tuple] = {}
+
+    def search(self) -> None:
+        """"""
+        self.indexes = {}
+
+        settings = self.sample(min(self.n_initial, self.n_evaluations))
+        self.evaluate_batch(settings)
+
+        while len(self.results) < self.n_evaluations:
+            count = min(self.batch_size, self.n_evaluations - len(self.results))
+            settings = self.suggest(count)
+
+            if not settings:
+                break
+            self.evaluate_batch(settings)
+
+    def evaluate_batch(self, settings: List[dict]) -> None:
+        """"""
+        for setting in settings:
+            self.indexes[str(setting)] = tuple(
+                values.index(setting[name]) for name, values in zip(self.names, self.values)
+            )
+
+        self.evaluate(settings)
+
+    def suggest(self, count: int) -> List[dict]:
+        """
+        Suggest settings with highest expected improvement.
+        """
+        results = self.get_results()
+        n_good = max(int(ceil(self.gamma * len(results))), 1)
+
+        good = np.array([self.indexes[result[0]] for result in results[:n_good]])
+        bad = np.array([self.indexes[result[0]] for result in results[n_good:]])
+
+        # Sample candidates from density of good settings
+        columns = []
+        scores = 0
+
+        for d, values in enumerate(self.values):
+            size = len(values)
+            l_density = self.estimate_density(good[:, d], size)
+            g_density = self.estimate_density(bad[:, d] if len(bad) else bad, size)
+
+            column = self.rng.choice(size, size=self.n_candidates * count, p=l_density)
+            columns.append(column)
+            scores = scores + np.log(l_density[column]) - np.log(g_density[column])
+
+        candidates = np.stack(columns, axis=1)
+
+        settings = []
+        keys = set()
+        for ix in np.argsort(-scores, kind="stable").tolist():
+            setting = self.to_setting(candidates[ix])
+            key = str(setting)
+
+            if key not in self.results and key not in keys:
+                settings.append(setting)
+                keys.add(key)
+
+                if len(settings) >= count:
+                    break
+
+        # Fill with random settings if candidates are exhausted
+        if len(settings) < count:
+            settings.extend(self.sample(count - len(settings), keys))
+
+        return settings
+
+    def estimate_density(self, observations: np.ndarray, size: int) -> np.ndarray:
+        """
+        Gaussian kernel density on value index, mixed with uniform prior.
+        """
+        positions = np.arange(size)
+        density = np.full(size, 1.0 / size)
+
+        if len(observations):
+            bandwidth = max(1.0, size / (len(observations) ** 0.5 + 1) / 2)
+            distance = (positions[:, None] - observations[None, :]) / bandwidth
+            kernel = np.exp(-0.5 * distance ** 2)
+            kernel /= kernel.sum(axis=0)
+
+            density = density + kernel.sum(axis=1)
+
+        return density / density.sum()
+
+
+def compare_search(
+    engine: BacktestingEngine,
+    optimization_setting: OptimizationSetting,
+    algorithms: List[SearchAlgorithm],
+    top_ratio: float = 0.01,
+    executor: OptimizationExecutor = None,
+    output: Callable = print
+) -> list:
+    """
+    Run brute force optimization and search algorithms, then report the
+    evaluations needed by each algorithm to find a setting within the
+    top_ratio of all settings.
+    """
+    brute_results = engine.run_optimization(
+        optimization_setting, output=False, executor=executor
+    )
+    if not brute_results:
+        return []
+
+    total = len(brute_results)
+    target_value = brute_results[max(int(total * top_ratio) - 1, 0)][1]
+    best_value = brute_results[0][1]
+
+    output(f"穷举优化：回测次数{total}，最优目标{best_value}，前{top_ratio:.0%}目标{target_value}")
+
+    reports = []
+    for algorithm in algorithms:
+        engine.run_search_optimization(
+            optimization_setting, algorithm, output=False, executor=executor
+        )
+
+        evaluations = algorithm.get_evaluations_to_target(target_value)
+        report = {
+            "name": algorithm.name,
+            "cost": algorithm.cost,
+            "best_value": algorithm.best_value,
+            "evaluations_to_target": evaluations,
+            "brute_force_evaluations": total,
+        }
+        reports.append(report)
+
+        if evaluations is None:
+            msg = "未达到目标"
+        else:
+            msg = f"达到目标回测次数{evaluations:.1f}（穷举的{evaluations / total:.1%}）"
+        output(f"{algorithm.name}：总回测次数{algorithm.cost:.1f}，最优目标{algorithm.best_value}，{msg}")
+
+    return reports
@@ -229,10 +229,15 @@ class CtaTemplate(ABC):
         days: int,
         interval: Interval = Interval.MINUTE,
         callback: Callable = None,
-        use_database: bool = False
+        use_database: bool = False,
+        window: int = 0
     ):
         """
         Load historical bar data for initializing strategy.
+
+        If window is set, 1-minute bars are aggregated into x-minute/x-hour
+        (by interval) bars with the same rules as BarGenerator before
+        passed to callback.
         """
         if not callback:
             callback = self.on_bar
@@ -242,7 +247,8 @@ class CtaTemplate(ABC):
             days,
             interval,
             callback,
-            use_database
+            use_database,
+            window
         )
 
     def load_tick(self, days: int):
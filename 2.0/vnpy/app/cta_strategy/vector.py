@@ -0,0 +1,599 @@
+"""
+Vectorized backtesting for signal based CTA strategies.
+
+Strategy is expressed as target position array over full columns of bar
+data. On each bar after initialization, any unfilled order is cancelled
+and a new limit order of (target - pos) is sent at close price plus/minus
+price_add, which is matched with next bar by the same rules of the event
+driven BacktestingEngine. So that result can be cross checked against
+TargetFollowStrategy running in BacktestingEngine.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Dict, List
+
+import numpy as np
+import talib
+from pandas import DataFrame
+
+from vnpy.trader.constant import Direction, Offset
+from vnpy.trader.database import database_manager
+from vnpy.trader.database.database import DB_TZ
+from vnpy.trader.object import TradeData, BarData
+from vnpy.trader.utility import round_to, get_day_starts
+
+from .backtesting import (
+    BacktestingEngine,
+    BacktestingMode,
+    DailyResult,
+    BAR_ORDERED_FIELDS,
+    history_to_arrays
+)
+from .template import CtaTemplate
+
+
+class VectorSignal:
+    """
+    Signal generating target position array from full columns of bar
+    data: datetime, volume, open_interest, open_price, high_price,
+    low_price and close_price.
+
+    Target of each bar should only depend on data up to that bar.
+    """
+
+    author = ""
+    parameters = []
+
+    init_days = 10      # days of data for initializing, same as load_bar
+    price_add = 0       # added to close price for sending order
+
+    def __init__(self, setting: dict):
+        """"""
+        for name in self.parameters:
+            if name in setting:
+                setattr(self, name, setting[name])
+
+    def generate_target(self, data: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Return target position array with same length as data columns.
+        """
+        raise NotImplementedError
+
+
+class DoubleMaSignal(VectorSignal):
+    """
+    Vectorized version of DoubleMaStrategy signal.
+    """
+
+    author = "用Python的交易员"
+
+    fast_window = 10
+    slow_window = 20
+
+    parameters = ["fast_window", "slow_window"]
+
+    def generate_target(self, data: Dict[str, np.ndarray]) -> np.ndarray:
+        """"""
+        close = data["close_price"]
+
+        fast_ma = talib.SMA(close, self.fast_window)
+        slow_ma = talib.SMA(close, self.slow_window)
+
+        fast_ma1 = np.roll(fast_ma, 1)
+        slow_ma1 = np.roll(slow_ma, 1)
+        fast_ma1[0] = slow_ma1[0] = np.nan
+
+        with np.errstate(invalid="ignore"):
+            cross_over = (fast_ma > slow_ma) & (fast_ma1 < slow_ma1)
+            cross_below = (fast_ma < slow_ma) & (fast_ma1 > slow_ma1)
+
+        signal = np.zeros(len(close))
+        signal[cross_over] = 1
+        signal[cross_below] = -1
+
+        return forward_fill(signal)
+
+
+class TargetFollowStrategy(CtaTemplate):
+    """
+    Follow precomputed target positions in event driven engine, with the
+    same order rules of VectorBacktestingEngine.
+    """
+
+    author = "用Python的交易员"
+
+    price_add = 0
+    init_days = 10
+
+    parameters = ["price_add", "init_days"]
+
+    def __init__(self, cta_engine, strategy_name, vt_symbol, setting):
+        """"""
+        super().__init__(cta_engine, strategy_name, vt_symbol, setting)
+
+        # Target position of each bar datetime
+        self.targets = {}
+
+    def on_init(self):
+        """"""
+        self.load_bar(self.init_days)
+
+    def on_bar(self, bar: BarData):
+        """"""
+        self.cancel_all()
+
+        target = self.targets.get(bar.datetime, self.pos)
+        pos_change = target - self.pos
+
+        if pos_change > 0:
+            self.buy(bar.close_price + self.price_add, pos_change)
+        elif pos_change < 0:
+            self.short(bar.close_price - self.price_add, -pos_change)
+
+
+class VectorBacktestingEngine(BacktestingEngine):
+    """
+    Run signal based backtesting with numpy instead of event loop.
+    """
+
+    def __init__(self):
+        """"""
+        super().__init__()
+
+        self.signal = None
+        self.target = None
+        self.data_arrays = {}
+
+        self.init_days = VectorSignal.init_days
+        self.price_add = VectorSignal.price_add
+
+    def add_signal(self, signal_class: type, setting: dict):
+        """"""
+        self.signal = signal_class(setting)
+        self.target = None
+
+        self.init_days = self.signal.init_days
+        self.price_add = self.signal.price_add
+
+    def set_target_pos(self, target: np.ndarray, init_days: int = 10, price_add: float = 0):
+        """
+        Use target position array directly instead of signal.
+        """
+        self.signal = None
+        self.target = np.asarray(target, dtype=np.float64)
+
+        self.init_days = init_days
+        self.price_add = price_add
+
+    def load_data(self):
+        """
+        Load bar data from database as columns directly, without creating
+        BarData objects.
+        """
+        self.output("开始加载历史数据")
+
+        self.data_fingerprint = ""
+        self.history_data.clear()
+        self.data_arrays = {}
+
+        if self.mode != BacktestingMode.BAR:
+            self.output("向量化回测只支持K线模式")
+            return
+
+        if not self.end:
+            self.end = datetime.now()
+
+        if self.start >= self.end:
+            self.output("起始日期必须小于结束日期")
+            return
+
+        self.data_arrays = database_manager.load_bar_array(
+            self.symbol,
+            self.exchange,
+            self.interval,
+            self.start,
+            self.end
+        )
+
+        self.output(f"历史数据加载完成，数据量：{len(self.data_arrays['datetime'])}")
+
+    def get_data_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Return loaded columns, or convert history data into columns if
+        it is set directly.
+        """
+        if not self.history_data:
+            return self.data_arrays
+
+        datetimes, values = history_to_arrays(self.history_data, BacktestingMode.BAR)
+
+        data = {"datetime": datetimes}
+        for name, column in zip(BAR_ORDERED_FIELDS, values):
+            data[name] = column
+        return data
+
+    def get_trading_index(self, datetimes: np.ndarray) -> int:
+        """
+        Index of first trading bar, with the same day counting rule of
+        initializing in BacktestingEngine.run_backtesting.
+        """
+        day_starts = get_day_starts(datetimes)
+
+        # Trading starts at the first bar of day after initializing days
+        n = max(self.init_days - 1, 1)
+        if n < len(day_starts):
+            return int(day_starts[n])
+        return len(datetimes) - 1
+
+    def run_backtesting(self):
+        """"""
+        if self.mode != BacktestingMode.BAR:
+            self.output("向量化回测只支持K线模式")
+            return
+
+        data = self.get_data_arrays()
+
+        if not len(data.get("datetime", [])):
+            self.output("历史数据为空，无法回测")
+            return
+
+        if self.signal:
+            target = self.signal.generate_target(data)
+        else:
+            target = self.target
+
+        target = np.nan_to_num(np.asarray(target, dtype=np.float64))
+        if len(target) != len(data["datetime"]):
+            self.output("目标仓位数组长度和历史数据不一致")
+            return
+
+        ix = self.get_trading_index(data["datetime"])
+        self.output("策略初始化完成")
+
+        self.output("开始向量化回测")
+        fill_ix, pos_change, trade_price = self.match_orders(data, target, ix)
+        self.generate_trades(data, fill_ix, pos_change, trade_price)
+        self.generate_daily_results(data, ix, fill_ix, pos_change, trade_price)
+        self.output("向量化回测结束")
+
+    def match_orders(self, data: Dict[str, np.ndarray], target: np.ndarray, ix: int) -> tuple:
+        """
+        Return bar index, position change and price of every trade.
+
+        Only bars with target different from position are visited, so
+        the loop count is about the number of trades instead of bars.
+        """
+        open_price = data["open_price"].tolist()
+        high_price = data["high_price"].tolist()
+        low_price = data["low_price"].tolist()
+        close_price = data["close_price"].tolist()
+
+        # Bars where target changes, used for skipping bars without order
+        changes = np.flatnonzero(target[1:] != target[:-1]) + 1
+        target_list = target.tolist()
+
+        fill_ix = []
+        pos_changes = []
+        trade_prices = []
+
+        count = len(target_list)
+        pos = 0
+        k = ix
+
+        while k < count - 1:
+            t = target_list[k]
+
+            if t == pos:
+                n = np.searchsorted(changes, k, side="right")
+                if n == len(changes):
+                    break
+                k = int(changes[n])
+                continue
+
+            j = k + 1
+
+            if t > pos:
+                price = round_to(close_price[k] + self.price_add, self.pricetick)
+                if price >= low_price[j] and low_price[j] > 0:
+                    fill_ix.append(j)
+                    pos_changes.append(t - pos)
+                    trade_prices.append(min(price, open_price[j]))
+                    pos = t
+            else:
+                price = round_to(close_price[k] - self.price_add, self.pricetick)
+                if price <= high_price[j] and high_price[j] > 0:
+                    fill_ix.append(j)
+                    pos_changes.append(t - pos)
+                    trade_prices.append(max(price, open_price[j]))
+                    pos = t
+
+            k = j
+
+        return (
+            np.array(fill_ix, dtype=np.int64),
+            np.array(pos_changes, dtype=np.float64),
+            np.array(trade_prices, dtype=np.float64)
+        )
+
+    def generate_trades(
+        self,
+        data: Dict[str, np.ndarray],
+        fill_ix: np.ndarray,
+        pos_change: np.ndarray,
+        trade_price: np.ndarray
+    ):
+        """
+        Create trade data for result display.
+        """
+        self.trades.clear()
+
+        # Same timezone handling as database drivers
+        datetimes = data["datetime"][fill_ix].astype(datetime).tolist()
+
+        for dt, change, price in zip(datetimes, pos_change.tolist(), trade_price.tolist()):
+            self.trade_count += 1
+
+            trade = TradeData(
+                symbol=self.symbol,
+                exchange=self.exchange,
+                orderid=str(self.trade_count),
+                tradeid=str(self.trade_count),
+                direction=Direction.LONG if change > 0 else Direction.SHORT,
+                offset=Offset.OPEN,
+                price=price,
+                volume=abs(change),
+                datetime=dt.replace(tzinfo=DB_TZ),
+                gateway_name=self.gateway_name,
+            )
+            self.trades[trade.vt_tradeid] = trade
+
+    def generate_daily_results(
+        self,
+        data: Dict[str, np.ndarray],
+        ix: int,
+        fill_ix: np.ndarray,
+        pos_change: np.ndarray,
+        trade_price: np.ndarray
+    ):
+        """
+        Calculate daily pnl of trading period with numpy.
+        """
+        self.daily_results.clear()
+
+        dates = data["datetime"][ix:].astype("datetime64[D]")
+        close_price = data["close_price"][ix:]
+
+        # Last bar of each day gives daily close price
+        day_starts = get_day_starts(dates)
+        day_ends = np.concatenate((day_starts[1:], [len(dates)])) - 1
+
+        day_dates = dates[day_starts]
+        day_close = close_price[day_ends]
+        day_count = len(day_dates)
+
+        pre_close = np.concatenate(([0], day_close[:-1]))
+        pre_close[pre_close == 0] = 1
+
+        # Map each trade to its day
+        trade_day = np.searchsorted(day_starts, fill_ix - ix, side="right") - 1
+        trade_close = day_close[trade_day]
+        volume = np.abs(pos_change)
+
+        size = self.size
+        if not self.inverse:
+            turnover = volume * size * trade_price
+            trading_pnl = pos_change * (trade_close - trade_price) * size
+            slippage = volume * size * self.slippage
+        else:
+            turnover = volume * size / trade_price
+            trading_pnl = pos_change * (1 / trade_price - 1 / trade_close) * size
+            slippage = volume * size * self.slippage / (trade_price ** 2)
+
+        commission = turnover * self.rate
+
+        def daily_sum(values: np.ndarray) -> np.ndarray:
+            return np.bincount(trade_day, weights=values, minlength=day_count)
+
+        trade_count = np.bincount(trade_day, minlength=day_count)
+
+        # Position after each trade, then position after last trade of each day
+        pos = np.concatenate(([0], np.cumsum(pos_change)))
+        end_pos = pos[np.searchsorted(trade_day, np.arange(day_count), side="right")]
+        start_pos = np.concatenate(([0], end_pos[:-1]))
+
+        if not self.inverse:
+            holding_pnl = start_pos * (day_close - pre_close) * size
+        else:
+            holding_pnl = start_pos * (1 / pre_close - 1 / day_close) * size
+
+        day_turnover = daily_sum(turnover)
+        day_commission = daily_sum(commission)
+        day_slippage = daily_sum(slippage)
+        day_trading_pnl = daily_sum(trading_pnl)
+        total_pnl = day_trading_pnl + holding_pnl
+        net_pnl = total_pnl - day_commission - day_slippage
+
+        date_list = day_dates.astype(datetime).tolist()
+
+        columns = zip(
+            date_list,
+            day_close.tolist(),
+            pre_close.tolist(),
+            trade_count.tolist(),
+            start_pos.tolist(),
+            end_pos.tolist(),
+            day_turnover.tolist(),
+            day_commission.tolist(),
+            day_slippage.tolist(),
+            day_trading_pnl.tolist(),
+            holding_pnl.tolist(),
+            total_pnl.tolist(),
+            net_pnl.tolist()
+        )
+
+        for values in columns:
+            daily_result = DailyResult(values[0], values[1])
+            (
+                daily_result.pre_close,
+                daily_result.trade_count,
+                daily_result.start_pos,
+                daily_result.end_pos,
+                daily_result.turnover,
+                daily_result.commission,
+                daily_result.slippage,
+                daily_result.trading_pnl,
+                daily_result.holding_pnl,
+                daily_result.total_pnl,
+                daily_result.net_pnl
+            ) = values[2:]
+            self.daily_results[daily_result.date] = daily_result
+
+        for trade, n in zip(self.trades.values(), trade_day.tolist()):
+            self.daily_results[date_list[n]].trades.append(trade)
+
+    def calculate_result(self):
+        """
+        Daily results are already calculated during backtesting.
+        """
+        self.output("开始计算逐日盯市盈亏")
+
+        if not self.trades:
+            self.output("成交记录为空，无法计算")
+            return
+
+        results = defaultdict(list)
+
+        for daily_result in self.daily_results.values():
+            for key, value in daily_result.__dict__.items():
+                results[key].append(value)
+
+        self.daily_df = DataFrame.from_dict(results).set_index("date")
+
+        self.output("逐日盯市盈亏计算完成")
+        return self.daily_df
+
+
+def forward_fill(signal: np.ndarray) -> np.ndarray:
+    """
+    Fill zero values with last non-zero value.
+    """
+    ix = np.where(signal != 0, np.arange(len(signal)), 0)
+    np.maximum.accumulate(ix, out=ix)
+    return signal[ix]
+
+
+def check_lookahead(signal: VectorSignal, data: Dict[str, np.ndarray], count: int = 5) -> List[int]:
+    """
+    Generate target with truncated data at several points, and return
+    the points where result differs from that of full data.
+    """
+    target = np.nan_to_num(signal.generate_target(data))
+    size = len(target)
+
+    failed = []
+    for end in np.linspace(size // 2, size - 1, count, dtype=int).tolist():
+        part = {k: v[:end] for k, v in data.items()}
+        part_target = np.nan_to_num(signal.generate_target(part))
+
+        if not np.array_equal(part_target, target[:end]):
+            failed.append(end)
+
+    return failed
+
+
+def cross_check(
+    signal_class: type,
+    setting: dict,
+    parameters: dict,
+    rtol: float = 1e-9,
+    output: Callable = print
+) -> dict:
+    """
+    Run same signal in both vectorized and event driven engine, then
+    compare trades and statistics.
+
+    parameters is the keyword arguments of BacktestingEngine.set_parameters.
+    """
+    vector_engine = VectorBacktestingEngine()
+    vector_engine.output = lambda msg: None
+    vector_engine.set_parameters(**parameters)
+    vector_engine.add_signal(signal_class, setting)
+    vector_engine.load_data()
+
+    start = perf_counter()
+    vector_engine.run_backtesting()
+    vector_engine.calculate_result()
+    vector_statistics = vector_engine.calculate_statistics(output=False)
+    vector_seconds = perf_counter() - start
+
+    data = vector_engine.get_data_arrays()
+    signal = vector_engine.signal
+    target = np.nan_to_num(signal.generate_target(data))
+
+    event_engine = BacktestingEngine()
+    event_engine.output = lambda msg: None
+    event_engine.set_parameters(**parameters)
+    event_engine.add_strategy(
+        TargetFollowStrategy,
+        {"price_add": signal.price_add, "init_days": signal.init_days}
+    )
+    event_engine.load_data()
+
+    if len(event_engine.history_data) != len(target):
+        output("两个引擎加载的历史数据不一致")
+        return {"passed": False}
+
+    event_engine.strategy.targets = {
+        bar.datetime: pos for bar, pos in zip(event_engine.history_data, target.tolist())
+    }
+
+    start = perf_counter()
+    event_engine.run_backtesting()
+    event_engine.calculate_result()
+    event_statistics = event_engine.calculate_statistics(output=False)
+    event_seconds = perf_counter() - start
+
+    # Compare trades
+    def get_trade_keys(engine: BacktestingEngine) -> list:
+        return [
+            (t.datetime, t.direction, t.price, t.volume)
+            for t in engine.trades.values()
+        ]
+
+    trades_matched = get_trade_keys(vector_engine) == get_trade_keys(event_engine)
+
+    # Compare statistics
+    differences = {}
+    for key, event_value in event_statistics.items():
+        vector_value = vector_statistics[key]
+
+        if isinstance(event_value, (int, float, np.number)):
+            matched = np.isclose(vector_value, event_value, rtol=rtol, atol=rtol)
+        else:
+            matched = vector_value == event_value
+
+        if not matched:
+            differences[key] = (vector_value, event_value)
+
+    lookahead = check_lookahead(signal, data)
+
+    passed = trades_matched and not differences
+    report = {
+        "passed": passed,
+        "trades_matched": trades_matched,
+        "trade_count": len(vector_engine.trades),
+        "differences": differences,
+        "lookahead": lookahead,
+        "vector_seconds": vector_seconds,
+        "event_seconds": event_seconds,
+    }
+
+    output(f"成交记录一致：{trades_matched}，成交数量：{len(vector_engine.trades)}")
+    output(f"统计指标差异：{differences if differences else '无'}")
+    if lookahead:
+        output(f"信号使用了未来数据，截断位置：{lookahead}")
+    output(f"向量化耗时：{vector_seconds:.3f}秒，事件驱动耗时：{event_seconds:.3f}秒")
+
+    return report
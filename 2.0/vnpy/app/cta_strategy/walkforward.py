@@ -0,0 +1,339 @@
+"""
+Walk-forward optimization of CTA strategies.
+
+The backtesting period is split into rolling windows of in-sample and
+out-of-sample periods. Parameters are optimized on each in-sample period,
+then evaluated on the following out-of-sample period, and out-of-sample
+daily results of all windows are stitched into one equity curve.
+
+History data is loaded only once: in-sample optimization of every window
+runs in worker processes on slices of the same shared memory block, and
+out-of-sample backtesting uses slices of the loaded list.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+import numpy as np
+from pandas import DataFrame, concat
+
+from vnpy.trader.utility import get_day_starts
+
+from .backtesting import (
+    BacktestingEngine,
+    OptimizationExecutor,
+    OptimizationSetting,
+    SharedHistoryData,
+    get_data_fingerprint,
+    history_to_arrays
+)
+
+
+DAILY_COLUMNS = [
+    "close_price",
+    "pre_close",
+    "trades",
+    "trade_count",
+    "start_pos",
+    "end_pos",
+    "turnover",
+    "commission",
+    "slippage",
+    "trading_pnl",
+    "holding_pnl",
+    "total_pnl",
+    "net_pnl",
+]
+
+
+class WalkForwardEngine(BacktestingEngine):
+    """
+    Set parameters with the whole period and add strategy as usual, then
+    call run_walk_forward with optimization setting.
+    """
+
+    def __init__(self):
+        """"""
+        super().__init__()
+
+        self.in_sample_days = 180
+        self.out_sample_days = 30
+        self.anchored = False
+
+        self.window_results = []
+
+    def set_windows(
+        self,
+        in_sample_days: int,
+        out_sample_days: int,
+        anchored: bool = False
+    ):
+        """
+        Windows are rolled forward by out_sample_days, so that out-of-sample
+        periods are continuous without overlap. In-sample period starts from
+        the beginning each time if anchored.
+        """
+        self.in_sample_days = in_sample_days
+        self.out_sample_days = out_sample_days
+        self.anchored = anchored
+
+    def generate_windows(self) -> List[tuple]:
+        """
+        Return list of (in-sample start, out-of-sample start, out-of-sample end).
+        """
+        windows = []
+
+        end = self.end or datetime.now()
+        in_sample_delta = timedelta(days=self.in_sample_days)
+        out_sample_delta = timedelta(days=self.out_sample_days)
+
+        in_sample_start = self.start
+        out_sample_start = self.start + in_sample_delta
+
+        while out_sample_start < end:
+            out_sample_end = min(out_sample_start + out_sample_delta, end)
+            windows.append((in_sample_start, out_sample_start, out_sample_end))
+
+            if not self.anchored:
+                in_sample_start += out_sample_delta
+            out_sample_start = out_sample_end
+
+        return windows
+
+    def get_init_days(self, setting: dict) -> int:
+        """
+        Days of history data required by strategy for initializing.
+        """
+        engine = BacktestingEngine()
+        engine.output = lambda msg: None
+        engine.vt_symbol = self.vt_symbol
+        engine.add_strategy(self.strategy_class, setting)
+        engine.strategy.on_init()
+        return engine.days
+
+    def get_warmup_index(self, day_starts: np.ndarray, ix: int, days: int) -> int:
+        """
+        Start index of data, so that strategy starts trading from bar at ix
+        after initialized with the same rule of run_backtesting.
+        """
+        n = int(np.searchsorted(day_starts, ix))
+        return int(day_starts[max(n - max(days - 1, 1), 0)])
+
+    def run_walk_forward(
+        self,
+        optimization_setting: OptimizationSetting,
+        output: bool = True,
+        executor: OptimizationExecutor = None,
+        callback: Callable = None
+    ) -> list:
+        """
+        Return list of result dict of each window. Callback is called with
+        (finished, total, window_result) after each window.
+        """
+        settings = optimization_setting.generate_setting()
+        target_name = optimization_setting.target_name
+        setting_map = {str(setting): setting for setting in settings}
+
+        if not settings:
+            self.output("优化参数组合为空，请检查")
+            return []
+
+        if not target_name:
+            self.output("优化目标未设置，请检查")
+            return []
+
+        windows = self.generate_windows()
+        if not windows:
+            self.output("回测区间不足一个样本内周期，请检查")
+            return []
+
+        # Load history data once and share with all windows
+        self.load_data()
+        if not self.history_data:
+            return []
+
+        datetimes, _ = history_to_arrays(self.history_data, self.mode)
+        day_starts = get_day_starts(datetimes)
+
+        history_data = SharedHistoryData.create(self.history_data, self.mode)
+
+        if history_data:
+            self.data_fingerprint = get_data_fingerprint(history_data, self.mode)
+        else:
+            self.output("共享内存不可用，子进程将分别加载历史数据")
+
+        temp_executor = not executor
+        if temp_executor:
+            executor = OptimizationExecutor(output=self.output)
+        executor.reset()
+
+        self.window_results = []
+        daily_dfs = []
+
+        try:
+            for n, (in_sample_start, out_sample_start, out_sample_end) in enumerate(windows):
+                start_ix, out_start_ix, out_end_ix = np.searchsorted(
+                    datetimes,
+                    np.array(
+                        [in_sample_start, out_sample_start, out_sample_end],
+                        dtype="datetime64[us]"
+                    )
+                ).tolist()
+
+                if start_ix == out_start_ix or out_start_ix == out_end_ix:
+                    self.output(f"窗口{n + 1}历史数据为空，跳过")
+                    continue
+
+                self.output(
+                    f"窗口{n + 1}/{len(windows)}，样本内：{in_sample_start} - {out_sample_start}，"
+                    f"样本外：{out_sample_start} - {out_sample_end}"
+                )
+
+                # Optimize in-sample period in parallel
+                if history_data:
+                    window_data = history_data[start_ix:out_start_ix]
+                else:
+                    window_data = None
+
+                # Period end is inclusive when loading data
+                in_sample_end = datetimes[out_start_ix - 1].astype(datetime)
+
+                config = self.get_period_config(
+                    target_name, window_data, in_sample_start, in_sample_end
+                )
+                results = self.run_cached_optimization(executor, config, settings)
+
+                if executor.cancelled:
+                    self.output(f"滚动优化已停止，完成窗口：{len(self.window_results)}/{len(windows)}")
+                    break
+
+                if not results:
+                    self.output(f"窗口{n + 1}优化结果为空，跳过")
+                    continue
+
+                results.sort(reverse=True, key=lambda result: result[1])
+                best_setting = setting_map[results[0][0]]
+
+                # Evaluate best setting in out-of-sample period
+                init_days = self.get_init_days(best_setting)
+                warmup_ix = self.get_warmup_index(day_starts, out_start_ix, init_days)
+
+                engine = self.run_out_sample(
+                    best_setting,
+                    self.history_data[warmup_ix:out_end_ix],
+                    out_sample_start,
+                    out_sample_end
+                )
+                daily_df = get_daily_df(engine)
+                daily_dfs.append(daily_df)
+
+                if len(daily_df):
+                    statistics = engine.calculate_statistics(daily_df, output=False)
+                else:
+                    statistics = engine.calculate_statistics(output=False)
+
+                window_result = {
+                    "in_sample_start": in_sample_start,
+                    "out_sample_start": out_sample_start,
+                    "out_sample_end": out_sample_end,
+                    "setting": best_setting,
+                    "in_sample_target": results[0][1],
+                    "in_sample_statistics": results[0][2],
+                    "out_sample_statistics": statistics,
+                    "trades": list(engine.trades.values()),
+                }
+                self.window_results.append(window_result)
+
+                if output:
+                    self.output(
+                        f"窗口{n + 1}最优参数：{best_setting}，样本内目标：{results[0][1]}，"
+                        f"样本外目标：{statistics[target_name]}"
+                    )
+
+                if callback:
+                    callback(n + 1, len(windows), window_result)
+        finally:
+            if temp_executor:
+                executor.stop()
+
+            if history_data:
+                history_data.release()
+
+        # Stitch out-of-sample results into one equity curve
+        self.trades.clear()
+        self.daily_results.clear()
+
+        if daily_dfs:
+            self.daily_df = concat(daily_dfs)
+        else:
+            self.daily_df = None
+
+        for window_result in self.window_results:
+            for trade in window_result["trades"]:
+                self.trades[f"{len(self.trades)}.{trade.vt_tradeid}"] = trade
+
+        self.output("滚动优化完成")
+        return self.window_results
+
+    def run_out_sample(
+        self,
+        setting: dict,
+        history_data: list,
+        start: datetime,
+        end: datetime
+    ) -> BacktestingEngine:
+        """"""
+        engine = BacktestingEngine()
+        engine.output = lambda msg: None
+
+        engine.set_parameters(
+            vt_symbol=self.vt_symbol,
+            interval=self.interval,
+            start=start,
+            rate=self.rate,
+            slippage=self.slippage,
+            size=self.size,
+            pricetick=self.pricetick,
+            capital=self.capital,
+            end=end,
+            mode=self.mode,
+            inverse=self.inverse
+        )
+        engine.add_strategy(self.strategy_class, setting)
+        engine.history_data = history_data
+
+        engine.run_backtesting()
+        engine.calculate_result()
+        return engine
+
+    def run_backtesting(self):
+        """"""
+        self.output("滚动优化请使用run_walk_forward运行")
+
+    def calculate_result(self):
+        """
+        Daily results of all out-of-sample windows are already stitched.
+        """
+        return self.daily_df
+
+
+def get_daily_df(engine: BacktestingEngine) -> DataFrame:
+    """
+    Return daily result dataframe of engine, with zero pnl if there is
+    no trade in the period.
+    """
+    if engine.daily_df is not None:
+        return engine.daily_df
+
+    dates = list(engine.daily_results.keys())
+    close_price = [d.close_price for d in engine.daily_results.values()]
+
+    data = {column: np.zeros(len(dates)) for column in DAILY_COLUMNS}
+    data["close_price"] = close_price
+    data["pre_close"] = [1] + close_price[:-1]
+    data["trades"] = [[] for _ in dates]
+    data["trade_count"] = np.zeros(len(dates), dtype=int)
+
+    df = DataFrame(data, index=dates)
+    df.index.name = "date"
+    return df
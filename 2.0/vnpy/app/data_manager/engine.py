@@ -132,21 +132,15 @@ class ManagerEngine(BaseEngine):
 
     def get_bar_data_available(self) -> List[Dict]:
         """"""
-        data = database_manager.get_bar_data_statistics()
-
-        for d in data:
-            oldest_bar = database_manager.get_oldest_bar_data(
-                d["symbol"], Exchange(d["exchange"]), Interval(d["interval"])
-            )
-            d["start"] = oldest_bar.datetime
-
-            newest_bar = database_manager.get_newest_bar_data(
-                d["symbol"], Exchange(d["exchange"]), Interval(d["interval"])
-            )
-            d["end"] = newest_bar.datetime
-
+        data = database_manager.get_bar_overview()
         return data
 
+    def rebuild_bar_overview(self) -> None:
+        """
+        Rebuild bar data overview by scanning whole database.
+        """
+        database_manager.rebuild_bar_overview()
+
     def load_bar_data(
         self,
         symbol: str,
@@ -34,6 +34,9 @@ class ManagerWidget(QtWidgets.QWidget):
         refresh_button = QtWidgets.QPushButton("刷新")
         refresh_button.clicked.connect(self.refresh_tree)
 
+        rebuild_button = QtWidgets.QPushButton("重建概览")
+        rebuild_button.clicked.connect(self.rebuild_overview)
+
         import_button = QtWidgets.QPushButton("导入数据")
         import_button.clicked.connect(self.import_data)
 
@@ -45,6 +48,7 @@ class ManagerWidget(QtWidgets.QWidget):
 
         hbox1 = QtWidgets.QHBoxLayout()
         hbox1.addWidget(refresh_button)
+        hbox1.addWidget(rebuild_button)
         hbox1.addStretch()
         hbox1.addWidget(import_button)
         hbox1.addWidget(update_button)
@@ -195,6 +199,11 @@ class ManagerWidget(QtWidgets.QWidget):
         self.hour_child.setExpanded(True)
         self.daily_child.setExpanded(True)
 
+    def rebuild_overview(self) -> None:
+        """"""
+        self.engine.rebuild_bar_overview()
+        self.refresh_tree()
+
     def import_data(self) -> None:
         """"""
         dialog = ImportDialog()
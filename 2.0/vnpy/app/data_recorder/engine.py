@@ -4,6 +4,8 @@ import sys
 from threading import Thread
 from queue import Queue, Empty
 from copy import copy
+from time import time
+from typing import Dict, List
 
 from vnpy.event import Event, EventEngine
 from vnpy.trader.engine import BaseEngine, MainEngine
@@ -16,7 +18,8 @@ from vnpy.trader.object import (
 )
 from vnpy.trader.event import EVENT_TICK, EVENT_CONTRACT
 from vnpy.trader.utility import load_json, save_json, BarGenerator
-from vnpy.trader.database import database_manager
+from vnpy.trader.setting import SETTINGS
+from vnpy.trader.database import database_manager, tick_archive
 from vnpy.app.spread_trading.base import EVENT_SPREAD_DATA, SpreadData
 
 
@@ -26,6 +29,10 @@ EVENT_RECORDER_LOG = "eRecorderLog"
 EVENT_RECORDER_UPDATE = "eRecorderUpdate"
 EVENT_RECORDER_EXCEPTION = "eRecorderException"
 
+# Tick archive writes buffered ticks in blocks
+ARCHIVE_FLUSH_SIZE = 1000
+ARCHIVE_FLUSH_INTERVAL = 60
+
 
 class RecorderEngine(BaseEngine):
     """"""
@@ -43,6 +50,12 @@ class RecorderEngine(BaseEngine):
         self.bar_recordings = {}
         self.bar_generators = {}
 
+        self.archive_enabled: bool = SETTINGS["database.tick_archive"]
+        self.tick_buffers: Dict[str, List[TickData]] = {}
+        self.buffer_times: Dict[str, float] = {}
+        self.spread_priceticks: Dict[str, float] = {}
+        self.last_check: float = time()
+
         self.load_setting()
         self.register_event()
         self.start()
@@ -70,11 +83,19 @@ class RecorderEngine(BaseEngine):
                 task_type, data = task
 
                 if task_type == "tick":
-                    database_manager.save_tick_data([data])
+                    if self.archive_enabled:
+                        self.buffer_tick(data)
+                    else:
+                        database_manager.save_tick_data([data])
                 elif task_type == "bar":
                     database_manager.save_bar_data([data])
 
+                if self.archive_enabled:
+                    self.flush_expired_ticks()
+
             except Empty:
+                if self.archive_enabled:
+                    self.flush_expired_ticks()
                 continue
 
             except Exception:
@@ -91,6 +112,58 @@ class RecorderEngine(BaseEngine):
         if self.thread.isAlive():
             self.thread.join()
 
+        if self.archive_enabled:
+            self.flush_all_ticks()
+
+    def buffer_tick(self, tick: TickData):
+        """
+        Buffer tick for writing into tick archive in blocks.
+        """
+        buf = self.tick_buffers.get(tick.vt_symbol, None)
+        if buf is None:
+            buf = self.tick_buffers[tick.vt_symbol] = []
+            self.buffer_times[tick.vt_symbol] = time()
+
+        buf.append(tick)
+
+        if len(buf) >= ARCHIVE_FLUSH_SIZE:
+            self.flush_ticks(tick.vt_symbol)
+
+    def flush_ticks(self, vt_symbol: str):
+        """"""
+        buf = self.tick_buffers.pop(vt_symbol, None)
+        self.buffer_times.pop(vt_symbol, None)
+
+        if buf:
+            tick_archive.save_tick_data(buf, self.get_pricetick(vt_symbol))
+
+    def flush_all_ticks(self):
+        """"""
+        for vt_symbol in list(self.tick_buffers.keys()):
+            self.flush_ticks(vt_symbol)
+
+    def flush_expired_ticks(self):
+        """
+        Flush buffer of symbol only when its first tick is buffered for
+        longer than flush interval, so that illiquid symbols are still
+        written in blocks of many ticks instead of one block per tick.
+        """
+        now = time()
+        if now - self.last_check < 1:
+            return
+        self.last_check = now
+
+        for vt_symbol, buffer_time in list(self.buffer_times.items()):
+            if now - buffer_time >= ARCHIVE_FLUSH_INTERVAL:
+                self.flush_ticks(vt_symbol)
+
+    def get_pricetick(self, vt_symbol: str) -> float:
+        """"""
+        contract = self.main_engine.get_contract(vt_symbol)
+        if contract:
+            return contract.pricetick
+        return self.spread_priceticks.get(vt_symbol, 0)
+
     def start(self):
         """"""
         self.active = True
@@ -209,6 +282,7 @@ class RecorderEngine(BaseEngine):
         """"""
         spread: SpreadData = event.data
         tick = spread.to_tick()
+        self.spread_priceticks[tick.vt_symbol] = spread.pricetick
 
         # Filter not inited spread data
         if tick.datetime:
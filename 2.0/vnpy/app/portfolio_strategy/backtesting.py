@@ -12,7 +12,8 @@ from pandas import DataFrame
 from vnpy.trader.constant import Direction, Offset, Interval, Status
 from vnpy.trader.database import database_manager
 from vnpy.trader.object import OrderData, TradeData, BarData
-from vnpy.trader.utility import round_to, extract_vt_symbol
+from vnpy.trader.utility import round_to, extract_vt_symbol, get_day_starts
+from vnpy.trader.profiler import BacktestingProfiler
 
 from .template import StrategyTemplate
 
@@ -66,6 +67,9 @@ class BacktestingEngine:
         self.daily_results = {}
         self.daily_df = None
 
+        self.profiling = False
+        self.profiler = None
+
     def clear_data(self) -> None:
         """
         Clear all data of last backtesting.
@@ -84,6 +88,7 @@ class BacktestingEngine:
         self.logs.clear()
         self.daily_results.clear()
         self.daily_df = None
+        self.profiler = None
 
     def set_parameters(
         self,
@@ -169,30 +174,52 @@ class BacktestingEngine:
 
         self.output("所有历史数据加载完成")
 
-    def run_backtesting(self) -> None:
+    def set_profiling(self, profiling: bool) -> None:
+        """
+        Time engine stages and strategy callbacks during replay, the
+        breakdown is output together with statistics.
+        """
+        self.profiling = profiling
+
+    def start_profiling(self) -> None:
         """"""
+        self.profiler = BacktestingProfiler()
+        self.profiler.wrap_engine(self, [
+            "new_bars",
+            "cross_limit_order",
+            "update_daily_close",
+            "send_order",
+            "cancel_order",
+        ])
+        self.profiler.wrap_strategy(self.strategy, [
+            "on_bars",
+            "on_tick",
+            "update_trade",
+            "update_order",
+        ])
+        self.profiler.start()
+
+    def run_backtesting(self) -> None:
+        """
+        History data is replayed day by day, with day boundaries found in
+        batch from sorted datetime list. Daily close prices are updated
+        once at the end of each day.
+        """
         self.strategy.on_init()
 
         # Generate sorted datetime list
         dts = list(self.dts)
         dts.sort()
 
-        # Use the first [days] of history data for initializing strategy
-        day_count = 0
-        ix = 0
+        # Datetime list of each day
+        starts = get_day_starts(dts).tolist()
+        days = [dts[start:end] for start, end in zip(starts, starts[1:] + [len(dts)])]
 
-        for ix, dt in enumerate(dts):
-            if self.datetime and dt.day != self.datetime.day:
-                day_count += 1
-                if day_count >= self.days:
-                    break
+        # Use the first [days] of history data for initializing strategy
+        init_count = max(self.days, 1)
 
-            try:
-                self.new_bars(dt)
-            except Exception:
-                self.output("触发异常，回测终止")
-                self.output(traceback.format_exc())
-                return
+        if not self.replay_days(days[:init_count]):
+            return
 
         self.strategy.inited = True
         self.output("策略初始化完成")
@@ -201,16 +228,60 @@ class BacktestingEngine:
         self.strategy.trading = True
         self.output("开始回放历史数据")
 
+        if self.profiling:
+            self.start_profiling()
+        else:
+            self.profiler = None
+
         # Use the rest of history data for running backtesting
-        for dt in dts[ix:]:
+        try:
+            if not self.replay_days(days[init_count:]):
+                return
+        finally:
+            if self.profiler:
+                self.profiler.stop()
+
+        self.output("历史数据回放结束")
+
+    def replay_days(self, days: List[List[datetime]]) -> bool:
+        """
+        Replay bars of each day, return False if backtesting is terminated
+        by exception.
+        """
+        for day_dts in days:
             try:
-                self.new_bars(dt)
+                for dt in day_dts:
+                    self.new_bars(dt)
             except Exception:
                 self.output("触发异常，回测终止")
                 self.output(traceback.format_exc())
-                return
 
-        self.output("历史数据回放结束")
+                # Keep result of the unfinished day for trades in it
+                self.update_daily_close(self.bars, dt)
+                return False
+
+            self.update_daily_close(self.get_close_bars(day_dts), day_dts[-1])
+
+        return True
+
+    def get_close_bars(self, day_dts: List[datetime]) -> Dict[str, BarData]:
+        """
+        Get the last bar of each symbol in the day, in case that bar data
+        of the last datetime is missing.
+        """
+        bars = dict(self.bars)
+
+        for dt in reversed(day_dts):
+            if len(bars) == len(self.vt_symbols):
+                break
+
+            for vt_symbol in self.vt_symbols:
+                if vt_symbol not in bars:
+                    bar = self.history_data.get((dt, vt_symbol), None)
+                    if bar:
+                        bars[vt_symbol] = bar
+
+        return bars
 
     def calculate_result(self) -> None:
         """"""
@@ -389,6 +460,9 @@ class BacktestingEngine:
             self.output(f"Sharpe Ratio：\t{sharpe_ratio:,.2f}")
             self.output(f"收益回撤比：\t{return_drawdown_ratio:,.2f}")
 
+            if self.profiler:
+                self.profiler.output_report(self.output)
+
         statistics = {
             "start_date": start_date,
             "end_date": end_date,
@@ -488,8 +562,6 @@ class BacktestingEngine:
         self.cross_limit_order()
         self.strategy.on_bars(self.bars)
 
-        self.update_daily_close(self.bars, dt)
-
     def cross_limit_order(self) -> None:
         """
         Cross limit order with last bar/tick data.
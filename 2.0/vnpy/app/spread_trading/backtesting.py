@@ -1,6 +1,9 @@
 from collections import defaultdict
+from copy import deepcopy
 from datetime import date, datetime
-from typing import Callable, Type
+from itertools import islice
+from operator import attrgetter
+from typing import Callable, Optional, Sequence, Type
 
 import numpy as np
 from pandas import DataFrame
@@ -10,9 +13,20 @@ from plotly.subplots import make_subplots
 from vnpy.trader.constant import (Direction, Offset, Exchange,
                                   Interval, Status)
 from vnpy.trader.object import TradeData, BarData, TickData
+from vnpy.trader.profiler import BacktestingProfiler
+from vnpy.app.cta_strategy.base import BacktestingMode as CtaBacktestingMode
+from vnpy.app.cta_strategy.backtesting import (
+    OptimizationSetting,
+    OptimizationExecutor,
+    SharedHistoryData,
+    iterate_days,
+    run_ga
+)
 
 from .template import SpreadStrategyTemplate, SpreadAlgoTemplate
-from .base import SpreadData, BacktestingMode, load_bar_data, load_tick_data
+from .base import (
+    SpreadData, SpreadTickData, BacktestingMode, load_bar_data, load_tick_data
+)
 
 
 class BacktestingEngine:
@@ -56,6 +70,9 @@ class BacktestingEngine:
         self.daily_results = {}
         self.daily_df = None
 
+        self.profiling = False
+        self.profiler = None
+
     def output(self, msg):
         """
         Output message of backtesting engine.
@@ -80,6 +97,7 @@ class BacktestingEngine:
 
         self.logs.clear()
         self.daily_results.clear()
+        self.profiler = None
 
     def set_parameters(
         self,
@@ -137,35 +155,72 @@ class BacktestingEngine:
                 self.pricetick
             )
         else:
-            self.history_datas = load_tick_data(
+            self.history_data = load_tick_data(
                 self.spread,
                 self.start,
                 self.end
             )
 
+            if not self.history_data:
+                self.history_data = SpreadTickData(
+                    self.spread,
+                    self.start,
+                    self.end,
+                    self.pricetick
+                )
+                self.output("价差Tick数据为空，回放时由各条腿Tick数据实时合成")
+                return
+
         self.output(f"历史数据加载完成，数据量：{len(self.history_data)}")
 
-    def run_backtesting(self):
+    def set_profiling(self, profiling: bool):
+        """
+        Time engine stages and strategy callbacks during replay, the
+        breakdown is output together with statistics.
+        """
+        self.profiling = profiling
+
+    def start_profiling(self):
         """"""
-        if self.mode == BacktestingMode.BAR:
-            func = self.new_bar
-        else:
-            func = self.new_tick
+        self.profiler = BacktestingProfiler()
+        self.profiler.wrap_engine(self, [
+            "new_bar",
+            "new_tick",
+            "cross_algo",
+            "update_daily_close",
+            "start_algo",
+            "stop_algo",
+            "send_order",
+            "cancel_order",
+        ])
+        self.profiler.wrap_strategy(self.strategy, [
+            "on_spread_data",
+            "on_spread_tick",
+            "on_spread_bar",
+            "on_spread_pos",
+            "on_spread_algo",
+            "on_order",
+            "on_trade",
+        ])
+        self.profiler.start()
 
+    def run_backtesting(self):
+        """
+        History data is replayed day by day, with day boundaries found in
+        batch instead of comparing datetime of every data. Daily close
+        price is updated once at the end of each day.
+        """
         self.strategy.on_init()
 
-        # Use the first [days] of history data for initializing strategy
-        day_count = 0
-        ix = 0
+        # Data list of each day, history data not in memory is read by chunk
+        days = iterate_days(self.history_data)
 
-        for ix, data in enumerate(self.history_data):
-            if self.datetime and data.datetime.day != self.datetime.day:
-                day_count += 1
-                if day_count >= self.days:
-                    break
+        # Use the first [days] of history data for initializing strategy
+        for day_data in islice(days, max(self.days, 1)):
+            for data in day_data:
+                self.callback(data)
 
-            self.datetime = data.datetime
-            self.callback(data)
+            self.datetime = day_data[-1].datetime
 
         self.strategy.inited = True
         self.output("策略初始化完成")
@@ -174,9 +229,28 @@ class BacktestingEngine:
         self.strategy.trading = True
         self.output("开始回放历史数据")
 
+        if self.profiling:
+            self.start_profiling()
+        else:
+            self.profiler = None
+
+        if self.mode == BacktestingMode.BAR:
+            func = self.new_bar
+            get_price = attrgetter("close_price")
+        else:
+            func = self.new_tick
+            get_price = attrgetter("last_price")
+
         # Use the rest of history data for running backtesting
-        for data in self.history_data[ix:]:
-            func(data)
+        try:
+            for day_data in days:
+                for data in day_data:
+                    func(data)
+
+                self.update_daily_close(get_price(day_data[-1]))
+        finally:
+            if self.profiler:
+                self.profiler.stop()
 
         self.output("历史数据回放结束")
 
@@ -281,8 +355,12 @@ class BacktestingEngine:
             max_drawdown = df["drawdown"].min()
             max_ddpercent = df["ddpercent"].min()
             max_drawdown_end = df["drawdown"].idxmin()
-            max_drawdown_start = df["balance"][:max_drawdown_end].argmax()
-            max_drawdown_duration = (max_drawdown_end - max_drawdown_start).days
+
+            if isinstance(max_drawdown_end, date):
+                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
+                max_drawdown_duration = (max_drawdown_end - max_drawdown_start).days
+            else:
+                max_drawdown_duration = 0
 
             total_net_pnl = df["net_pnl"].sum()
             daily_net_pnl = total_net_pnl / total_days
@@ -347,6 +425,9 @@ class BacktestingEngine:
             self.output(f"Sharpe Ratio：\t{sharpe_ratio:,.2f}")
             self.output(f"收益回撤比：\t{return_drawdown_ratio:,.2f}")
 
+            if self.profiler:
+                self.profiler.output_report(self.output)
+
         statistics = {
             "start_date": start_date,
             "end_date": end_date,
@@ -420,6 +501,186 @@ class BacktestingEngine:
         fig.update_layout(height=1000, width=1000)
         fig.show()
 
+    def load_shared_data(self) -> Optional[SharedHistoryData]:
+        """
+        Load history data once and copy into shared memory for all worker
+        processes. Spread ticks synthesized from legs are generated here
+        only once as well.
+        """
+        self.load_data()
+
+        if not isinstance(self.history_data, list):
+            self.history_data = list(self.history_data)
+            self.output(f"价差Tick数据合成完成，数据量：{len(self.history_data)}")
+
+        # Shared data is created with mode enum of CTA backtesting
+        if self.mode == BacktestingMode.BAR:
+            mode = CtaBacktestingMode.BAR
+            extra_fields = ["value"]
+        else:
+            mode = CtaBacktestingMode.TICK
+            extra_fields = []
+
+        history_data = SharedHistoryData.create(self.history_data, mode, extra_fields)
+        if not history_data:
+            self.output("共享内存不可用，子进程将分别加载历史数据")
+
+        return history_data
+
+    def get_optimization_config(self, target_name: str, history_data: Sequence) -> dict:
+        """
+        Engine configuration shipped to optimization workers.
+        """
+        return {
+            "target_name": target_name,
+            "strategy_class": self.strategy_class,
+            "history_data": history_data,
+            "cache_base": None,
+            "optimize_func": optimize,
+            "parameters": {
+                "spread": self.spread,
+                "interval": self.interval,
+                "start": self.start,
+                "rate": self.rate,
+                "slippage": self.slippage,
+                "size": self.size,
+                "pricetick": self.pricetick,
+                "capital": self.capital,
+                "end": self.end,
+                "mode": self.mode
+            }
+        }
+
+    def run_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output=True,
+        executor: OptimizationExecutor = None,
+        callback: Callable = None
+    ):
+        """
+        Executor is created and stopped each time if not provided.
+        Callback is called with (finished, total, results) during running.
+        """
+        # Get optimization setting and target
+        settings = optimization_setting.generate_setting()
+        target_name = optimization_setting.target_name
+
+        if not settings:
+            self.output("优化参数组合为空，请检查")
+            return
+
+        if not target_name:
+            self.output("优化目标未设置，请检查")
+            return
+
+        history_data = self.load_shared_data()
+
+        temp_executor = not executor
+        if temp_executor:
+            executor = OptimizationExecutor(output=self.output)
+        executor.reset()
+
+        config = self.get_optimization_config(target_name, history_data)
+        progress_step = 0
+
+        def on_progress(finished: int, total: int, results: list):
+            """"""
+            nonlocal progress_step
+
+            progress = finished / total
+            if int(progress * 10) > progress_step:
+                progress_step = int(progress * 10)
+                self.output(f"优化进度：{'#' * progress_step} [{progress:.0%}]")
+
+            if callback:
+                callback(finished, total, results)
+
+        try:
+            result_values = executor.run(config, settings, on_progress)
+        finally:
+            if temp_executor:
+                executor.stop()
+
+            if history_data:
+                history_data.release()
+
+        if executor.cancelled:
+            self.output(f"参数优化已停止，完成数量：{len(result_values)}/{len(settings)}")
+
+        # Sort results and output
+        result_values.sort(reverse=True, key=lambda result: result[1])
+
+        if output:
+            for value in result_values:
+                msg = f"参数：{value[0]}, 目标：{value[1]}"
+                self.output(msg)
+
+        return result_values
+
+    def run_ga_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        population_size=100,
+        ngen_size=30,
+        output=True,
+        executor: OptimizationExecutor = None,
+        callback: Callable = None
+    ):
+        """
+        Each generation is evaluated in parallel by executor.
+        Callback is called with (finished, total, results) after each
+        generation.
+        """
+        # Get optimization setting and target
+        settings = optimization_setting.generate_setting_ga()
+        target_name = optimization_setting.target_name
+
+        if not settings:
+            self.output("优化参数组合为空，请检查")
+            return
+
+        if not target_name:
+            self.output("优化目标未设置，请检查")
+            return
+
+        history_data = self.load_shared_data()
+
+        temp_executor = not executor
+        if temp_executor:
+            executor = OptimizationExecutor(output=self.output)
+        executor.reset()
+
+        config = self.get_optimization_config(target_name, history_data)
+
+        try:
+            results = run_ga(
+                config,
+                executor,
+                settings,
+                population_size,
+                ngen_size,
+                self.output,
+                callback,
+                verbose=output
+            )
+        finally:
+            if temp_executor:
+                executor.stop()
+
+            if history_data:
+                history_data.release()
+
+        # Return result list sorted by target
+        results.sort(reverse=True, key=lambda result: result[1])
+
+        if output:
+            for value in results:
+                msg = f"参数：{value[0]}, 目标：{value[1]}"
+                self.output(msg)
+
+        return results
+
     def update_daily_close(self, price: float):
         """"""
         d = self.datetime.date()
@@ -438,8 +699,6 @@ class BacktestingEngine:
 
         self.strategy.on_spread_bar(bar)
 
-        self.update_daily_close(bar.close_price)
-
     def new_tick(self, tick: TickData):
         """"""
         self.tick = tick
@@ -453,8 +712,6 @@ class BacktestingEngine:
 
         self.strategy.on_spread_data()
 
-        self.update_daily_close(tick.last_price)
-
     def cross_algo(self):
         """
         Cross limit order with last bar/tick data.
@@ -695,3 +952,55 @@ class DailyResult:
         # Net pnl takes account of commission and slippage cost
         self.total_pnl = self.trading_pnl + self.holding_pnl
         self.net_pnl = self.total_pnl - self.commission - self.slippage
+
+
+def optimize(
+    target_name: str,
+    strategy_class: SpreadStrategyTemplate,
+    setting: dict,
+    spread: SpreadData,
+    interval: Interval,
+    start: datetime,
+    rate: float,
+    slippage: float,
+    size: float,
+    pricetick: float,
+    capital: int,
+    end: datetime,
+    mode: BacktestingMode,
+    history_data: Sequence = None
+):
+    """
+    Function for running in optimization worker process.
+    """
+    engine = BacktestingEngine()
+
+    # Position of spread is updated during backtesting, so that each
+    # setting runs with its own copy of spread shared by worker config
+    engine.set_parameters(
+        spread=deepcopy(spread),
+        interval=interval,
+        start=start,
+        rate=rate,
+        slippage=slippage,
+        size=size,
+        pricetick=pricetick,
+        capital=capital,
+        end=end,
+        mode=mode
+    )
+
+    engine.add_strategy(strategy_class, setting)
+
+    # Use history data loaded by parent process if provided
+    if history_data is not None:
+        engine.history_data = history_data
+    else:
+        engine.load_data()
+
+    engine.run_backtesting()
+    engine.calculate_result()
+    statistics = engine.calculate_statistics(output=False)
+
+    target_value = statistics[target_name]
+    return (str(setting), target_value, statistics)
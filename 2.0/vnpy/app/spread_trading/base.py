@@ -1,14 +1,20 @@
-from typing import Dict, List
-from datetime import datetime
+import heapq
+from typing import Dict, Iterator, List
+from datetime import datetime, timedelta
 from enum import Enum
 from functools import lru_cache
+from operator import attrgetter
+
+import numpy as np
 
 from vnpy.trader.object import (
     TickData, PositionData, TradeData, ContractData, BarData
 )
 from vnpy.trader.constant import Direction, Offset, Exchange, Interval
-from vnpy.trader.utility import floor_to, ceil_to, round_to, extract_vt_symbol
-from vnpy.trader.database import database_manager
+from vnpy.trader.utility import floor_to, ceil_to, extract_vt_symbol, Rounder
+from vnpy.trader.setting import SETTINGS
+from vnpy.trader.database import database_manager, tick_archive
+from vnpy.trader.database.database import array_to_bars
 
 
 EVENT_SPREAD_DATA = "eSpreadData"
@@ -16,6 +22,8 @@ EVENT_SPREAD_POS = "eSpreadPos"
 EVENT_SPREAD_LOG = "eSpreadLog"
 EVENT_SPREAD_ALGO = "eSpreadAlgo"
 EVENT_SPREAD_STRATEGY = "eSpreadStrategy"
+EVENT_SPREAD_OPTIMIZATION_PROGRESS = "eSpreadOptimizationProgress"
+EVENT_SPREAD_OPTIMIZATION_FINISHED = "eSpreadOptimizationFinished"
 
 
 class LegData:
@@ -194,73 +202,108 @@ class SpreadData:
         self.net_pos: float = 0
         self.datetime: datetime = None
 
-    def calculate_price(self):
-        """"""
+        # Cached price and volume terms of each leg in leg order:
+        # (bid term, ask term, bid volume, ask volume), None if leg
+        # price data has not been received
+        self.leg_terms: Dict[str, tuple] = {vt_symbol: None for vt_symbol in self.legs}
+
+        self.price_rounder: Rounder = Rounder(self.pricetick)
+        self.volume_rounder: Rounder = Rounder(self.min_volume)
+
+    def calculate_price(self, vt_symbol: str = ""):
+        """
+        Calculate spread price from cached terms of legs. Only terms of
+        the leg with vt_symbol are updated if given, otherwise terms of
+        all legs are updated.
+        """
+        if self.price_rounder.target != self.pricetick:
+            self.price_rounder = Rounder(self.pricetick)
+
+        # Volume terms of all legs depend on min volume
+        if self.volume_rounder.target != self.min_volume:
+            self.volume_rounder = Rounder(self.min_volume)
+            vt_symbol = ""
+
+        if vt_symbol:
+            self.update_leg_terms(self.legs[vt_symbol])
+        else:
+            for leg in self.legs.values():
+                self.update_leg_terms(leg)
+
         self.clear_price()
 
+        round_price = self.price_rounder.round
+        bid_price = 0
+        ask_price = 0
+        bid_volume = 0
+        ask_volume = 0
+
         # Go through all legs to calculate price
-        for n, leg in enumerate(self.legs.values()):
+        for n, terms in enumerate(self.leg_terms.values()):
             # Filter not all leg price data has been received
-            if not leg.bid_volume or not leg.ask_volume:
-                self.clear_price()
+            if not terms:
                 return
 
-            # Calculate price
-            price_multiplier = self.price_multipliers[leg.vt_symbol]
-            if price_multiplier > 0:
-                self.bid_price += leg.bid_price * price_multiplier
-                self.ask_price += leg.ask_price * price_multiplier
-            else:
-                self.bid_price += leg.ask_price * price_multiplier
-                self.ask_price += leg.bid_price * price_multiplier
-
-            # Round price to pricetick
-            self.bid_price = round_to(self.bid_price, self.pricetick)
-            self.ask_price = round_to(self.ask_price, self.pricetick)
-
-            # Calculate volume
-            trading_multiplier = self.trading_multipliers[leg.vt_symbol]
-            inverse_contract = self.inverse_contracts[leg.vt_symbol]
-
-            if not inverse_contract:
-                leg_bid_volume = leg.bid_volume
-                leg_ask_volume = leg.ask_volume
-            else:
-                leg_bid_volume = calculate_inverse_volume(
-                    leg.bid_volume, leg.bid_price, leg.size)
-                leg_ask_volume = calculate_inverse_volume(
-                    leg.ask_volume, leg.ask_price, leg.size)
+            leg_bid_price, leg_ask_price, leg_bid_volume, leg_ask_volume = terms
 
-            if trading_multiplier > 0:
-                adjusted_bid_volume = floor_to(
-                    leg_bid_volume / trading_multiplier,
-                    self.min_volume
-                )
-                adjusted_ask_volume = floor_to(
-                    leg_ask_volume / trading_multiplier,
-                    self.min_volume
-                )
-            else:
-                adjusted_bid_volume = floor_to(
-                    leg_bid_volume / abs(trading_multiplier),
-                    self.min_volume
-                )
-                adjusted_ask_volume = floor_to(
-                    leg_ask_volume / abs(trading_multiplier),
-                    self.min_volume
-                )
+            # Round price to pricetick after adding each leg
+            bid_price = round_price(bid_price + leg_bid_price)
+            ask_price = round_price(ask_price + leg_ask_price)
 
             # For the first leg, just initialize
             if not n:
-                self.bid_volume = adjusted_bid_volume
-                self.ask_volume = adjusted_ask_volume
+                bid_volume = leg_bid_volume
+                ask_volume = leg_ask_volume
             # For following legs, use min value of each leg quoting volume
             else:
-                self.bid_volume = min(self.bid_volume, adjusted_bid_volume)
-                self.ask_volume = min(self.ask_volume, adjusted_ask_volume)
+                bid_volume = min(bid_volume, leg_bid_volume)
+                ask_volume = min(ask_volume, leg_ask_volume)
+
+        self.bid_price = bid_price
+        self.ask_price = ask_price
+        self.bid_volume = bid_volume
+        self.ask_volume = ask_volume
+
+        # Update calculate time
+        self.datetime = datetime.now()
+
+    def update_leg_terms(self, leg: LegData):
+        """
+        Calculate price and volume terms of one leg in spread.
+        """
+        if not leg.bid_volume or not leg.ask_volume:
+            self.leg_terms[leg.vt_symbol] = None
+            return
+
+        # Calculate price
+        price_multiplier = self.price_multipliers[leg.vt_symbol]
+        if price_multiplier > 0:
+            bid_price = leg.bid_price * price_multiplier
+            ask_price = leg.ask_price * price_multiplier
+        else:
+            bid_price = leg.ask_price * price_multiplier
+            ask_price = leg.bid_price * price_multiplier
 
-            # Update calculate time
-            self.datetime = datetime.now()
+        # Calculate volume
+        trading_multiplier = abs(self.trading_multipliers[leg.vt_symbol])
+        inverse_contract = self.inverse_contracts[leg.vt_symbol]
+
+        if not inverse_contract:
+            leg_bid_volume = leg.bid_volume
+            leg_ask_volume = leg.ask_volume
+        else:
+            leg_bid_volume = calculate_inverse_volume(
+                leg.bid_volume, leg.bid_price, leg.size)
+            leg_ask_volume = calculate_inverse_volume(
+                leg.ask_volume, leg.ask_price, leg.size)
+
+        floor_volume = self.volume_rounder.floor
+        self.leg_terms[leg.vt_symbol] = (
+            bid_price,
+            ask_price,
+            floor_volume(leg_bid_volume / trading_multiplier),
+            floor_volume(leg_ask_volume / trading_multiplier)
+        )
 
     def calculate_pos(self):
         """"""
@@ -380,56 +423,96 @@ def load_bar_data(
     pricetick: float = 0
 ):
     """"""
-    # Load bar data of each spread leg
-    leg_bars: Dict[str, Dict] = {}
+    # Load bar data of each spread leg as arrays
+    leg_arrays: Dict[str, Dict[str, np.ndarray]] = {}
 
     for vt_symbol in spread.legs.keys():
         symbol, exchange = extract_vt_symbol(vt_symbol)
 
-        bar_data: List[BarData] = database_manager.load_bar_data(
+        leg_arrays[vt_symbol] = database_manager.load_bar_array(
             symbol, exchange, interval, start, end
         )
 
-        bars: Dict[datetime, BarData] = {bar.datetime: bar for bar in bar_data}
-        leg_bars[vt_symbol] = bars
-
     # Calculate spread bar data
-    spread_bars: List[BarData] = []
+    arrays = calculate_spread_bar_array(leg_arrays, spread.price_multipliers, pricetick)
 
-    for dt in bars.keys():
-        spread_price = 0
-        spread_value = 0
-        spread_available = True
+    spread_bars: List[BarData] = array_to_bars(
+        arrays, spread.name, Exchange.LOCAL, interval, "SPREAD"
+    )
+    for spread_bar, spread_value in zip(spread_bars, arrays["value"].tolist()):
+        spread_bar.value = spread_value
 
-        for leg in spread.legs.values():
-            leg_bar = leg_bars[leg.vt_symbol].get(dt, None)
+    return spread_bars
 
-            if leg_bar:
-                price_multiplier = spread.price_multipliers[leg.vt_symbol]
-                spread_price += price_multiplier * leg_bar.close_price
-                spread_value += abs(price_multiplier) * leg_bar.close_price
-            else:
-                spread_available = False
-
-        if spread_available:
-            if pricetick:
-                spread_price = round_to(spread_price, pricetick)
-
-            spread_bar = BarData(
-                symbol=spread.name,
-                exchange=exchange.LOCAL,
-                datetime=dt,
-                interval=interval,
-                open_price=spread_price,
-                high_price=spread_price,
-                low_price=spread_price,
-                close_price=spread_price,
-                gateway_name="SPREAD",
-            )
-            spread_bar.value = spread_value
-            spread_bars.append(spread_bar)
 
-    return spread_bars
+def calculate_spread_bar_array(
+    leg_arrays: Dict[str, Dict[str, np.ndarray]],
+    price_multipliers: Dict[str, int],
+    pricetick: float = 0
+) -> Dict[str, np.ndarray]:
+    """
+    Calculate spread bar arrays from bar arrays of legs, on datetimes
+    available for all legs. High/low price of spread is the sum of leg
+    high/low prices, with high and low of leg swapped for negative price
+    multiplier. Value is the sum of absolute leg close values.
+    """
+    # Sort arrays of each leg by datetime
+    for vt_symbol, arrays in leg_arrays.items():
+        datetimes = arrays["datetime"]
+        if len(datetimes) and np.any(datetimes[1:] < datetimes[:-1]):
+            ix = np.argsort(datetimes, kind="stable")
+            leg_arrays[vt_symbol] = {k: v[ix] for k, v in arrays.items()}
+
+    # Join sorted datetimes of legs by binary search
+    common = None
+    for arrays in leg_arrays.values():
+        datetimes = arrays["datetime"]
+
+        if common is None:
+            common = datetimes
+            continue
+
+        ix = np.searchsorted(datetimes, common)
+        ix[ix == len(datetimes)] = 0
+        common = common[datetimes[ix] == common] if len(datetimes) else common[:0]
+
+    if common is None:
+        common = np.array([], dtype="datetime64[us]")
+
+    count = len(common)
+    result = {
+        "datetime": common,
+        "open_price": np.zeros(count),
+        "high_price": np.zeros(count),
+        "low_price": np.zeros(count),
+        "close_price": np.zeros(count),
+        "volume": np.zeros(count),
+        "open_interest": np.zeros(count),
+        "value": np.zeros(count),
+    }
+
+    for vt_symbol, arrays in leg_arrays.items():
+        ix = np.searchsorted(arrays["datetime"], common)
+        price_multiplier = price_multipliers[vt_symbol]
+
+        close_price = arrays["close_price"][ix]
+        result["open_price"] += price_multiplier * arrays["open_price"][ix]
+        result["close_price"] += price_multiplier * close_price
+        result["value"] += abs(price_multiplier) * close_price
+
+        if price_multiplier > 0:
+            result["high_price"] += price_multiplier * arrays["high_price"][ix]
+            result["low_price"] += price_multiplier * arrays["low_price"][ix]
+        else:
+            result["high_price"] += price_multiplier * arrays["low_price"][ix]
+            result["low_price"] += price_multiplier * arrays["high_price"][ix]
+
+    if pricetick:
+        rounder = Rounder(pricetick)
+        for name in ["open_price", "high_price", "low_price", "close_price"]:
+            result[name] = rounder.round_array(result[name])
+
+    return result
 
 
 @lru_cache(maxsize=999)
@@ -439,6 +522,129 @@ def load_tick_data(
     end: datetime
 ):
     """"""
+    if SETTINGS["database.tick_archive"]:
+        return tick_archive.load_tick_data(
+            spread.name, Exchange.LOCAL, start, end
+        )
+
     return database_manager.load_tick_data(
         spread.name, Exchange.LOCAL, start, end
     )
+
+
+def copy_spread(spread: SpreadData) -> SpreadData:
+    """
+    Create a new spread with the same legs and multipliers, which has
+    contract data of legs but no price or position data.
+    """
+    legs = []
+    for vt_symbol, leg in spread.legs.items():
+        new_leg = LegData(vt_symbol)
+        new_leg.size = leg.size
+        new_leg.net_position = leg.net_position
+        new_leg.min_volume = leg.min_volume
+        new_leg.pricetick = leg.pricetick
+        legs.append(new_leg)
+
+    return SpreadData(
+        spread.name,
+        legs,
+        spread.price_multipliers,
+        spread.trading_multipliers,
+        spread.active_leg.vt_symbol,
+        spread.inverse_contracts,
+        spread.min_volume
+    )
+
+
+def load_leg_ticks(
+    vt_symbol: str,
+    start: datetime,
+    end: datetime,
+    chunk_days: int = 1
+) -> Iterator[TickData]:
+    """
+    Yield tick data of one leg loaded by period of [chunk_days], so that
+    only ticks of one period are kept in memory.
+    """
+    symbol, exchange = extract_vt_symbol(vt_symbol)
+
+    if SETTINGS["database.tick_archive"]:
+        load_func = tick_archive.load_tick_data
+    else:
+        load_func = database_manager.load_tick_data
+
+    step = timedelta(days=chunk_days)
+    period_start = start
+    last_dt = None
+
+    while period_start < end:
+        period_end = min(period_start + step, end)
+        ticks = load_func(symbol, exchange, period_start, period_end)
+
+        # Tick at period boundary is also loaded by the previous period
+        for tick in ticks:
+            if last_dt is None or tick.datetime > last_dt:
+                yield tick
+
+        if ticks:
+            last_dt = ticks[-1].datetime
+
+        period_start = period_end
+
+
+def generate_spread_ticks(
+    spread: SpreadData,
+    start: datetime,
+    end: datetime,
+    pricetick: float = 0,
+    chunk_days: int = 1
+) -> Iterator[TickData]:
+    """
+    Merge tick streams of all legs by datetime, and yield spread tick
+    calculated after each leg tick once price data of all legs is received.
+    """
+    synthetic = copy_spread(spread)
+    synthetic.pricetick = pricetick or spread.pricetick
+
+    streams = [
+        load_leg_ticks(vt_symbol, start, end, chunk_days)
+        for vt_symbol in synthetic.legs.keys()
+    ]
+    leg_terms = synthetic.leg_terms.values()
+
+    for tick in heapq.merge(*streams, key=attrgetter("datetime")):
+        synthetic.legs[tick.vt_symbol].update_tick(tick)
+        synthetic.calculate_price(tick.vt_symbol)
+
+        if None in leg_terms:
+            continue
+
+        synthetic.datetime = tick.datetime
+        yield synthetic.to_tick()
+
+
+class SpreadTickData:
+    """
+    Spread tick data synthesized from leg ticks in database when iterated,
+    used for tick mode backtesting of spread without saved tick data.
+    """
+
+    def __init__(
+        self,
+        spread: SpreadData,
+        start: datetime,
+        end: datetime,
+        pricetick: float = 0
+    ):
+        """"""
+        self.spread: SpreadData = spread
+        self.start: datetime = start
+        self.end: datetime = end
+        self.pricetick: float = pricetick
+
+    def __iter__(self) -> Iterator[TickData]:
+        """"""
+        return generate_spread_ticks(
+            self.spread, self.start, self.end, self.pricetick
+        )
@@ -1,11 +1,13 @@
 import traceback
 import importlib
 import os
-from typing import List, Dict, Set, Callable, Any, Type
+from typing import List, Dict, Set, Callable, Any, Type, TYPE_CHECKING
 from collections import defaultdict
 from copy import copy
+from functools import partial
 from pathlib import Path
 from datetime import datetime, timedelta
+from threading import Thread
 
 from vnpy.event import EventEngine, Event
 from vnpy.trader.engine import BaseEngine, MainEngine
@@ -28,11 +30,17 @@ from .base import (
     EVENT_SPREAD_DATA, EVENT_SPREAD_POS,
     EVENT_SPREAD_ALGO, EVENT_SPREAD_LOG,
     EVENT_SPREAD_STRATEGY,
-    load_bar_data, load_tick_data
+    EVENT_SPREAD_OPTIMIZATION_PROGRESS,
+    EVENT_SPREAD_OPTIMIZATION_FINISHED,
+    load_bar_data, load_tick_data, copy_spread
 )
 from .template import SpreadAlgoTemplate, SpreadStrategyTemplate
 from .algo import SpreadTakerAlgo
 
+# Backtesting imports CTA optimization and deap, only loaded when used
+if TYPE_CHECKING:
+    from .backtesting import OptimizationSetting, OptimizationExecutor
+
 
 APP_NAME = "SpreadTrading"
 
@@ -170,7 +178,7 @@ class SpreadDataEngine:
         leg.update_tick(tick)
 
         for spread in self.symbol_spread_map[tick.vt_symbol]:
-            spread.calculate_price()
+            spread.calculate_price(tick.vt_symbol)
             self.put_data_event(spread)
 
     def process_position_event(self, event: Event) -> None:
@@ -605,6 +613,9 @@ class SpreadStrategyEngine:
 
         self.vt_tradeids: Set = set()
 
+        self.executor: "OptimizationExecutor" = None
+        self.optimization_thread: Thread = None
+
         self.load_strategy_class()
 
     def start(self):
@@ -618,6 +629,10 @@ class SpreadStrategyEngine:
         """"""
         self.stop_all_strategies()
 
+        if self.executor:
+            self.executor.cancel()
+            self.executor.stop()
+
     def load_strategy_class(self):
         """
         Load strategy class from source code.
@@ -1004,6 +1019,149 @@ class SpreadStrategyEngine:
         """"""
         pass
 
+    def start_optimization(
+        self,
+        strategy_name: str,
+        interval: str,
+        start: datetime,
+        end: datetime,
+        rate: float,
+        slippage: float,
+        size: float,
+        pricetick: float,
+        capital: int,
+        optimization_setting: "OptimizationSetting",
+        use_ga: bool
+    ) -> bool:
+        """
+        Start parameter optimization of strategy class on spread of the
+        strategy in a new thread.
+        """
+        if self.optimization_thread:
+            self.write_log("已有参数优化在运行中，请等待完成")
+            return False
+
+        strategy = self.strategies[strategy_name]
+
+        self.optimization_thread = Thread(
+            target=self.run_optimization,
+            args=(
+                strategy,
+                interval,
+                start,
+                end,
+                rate,
+                slippage,
+                size,
+                pricetick,
+                capital,
+                optimization_setting,
+                use_ga
+            )
+        )
+        self.optimization_thread.start()
+
+        return True
+
+    def run_optimization(
+        self,
+        strategy: SpreadStrategyTemplate,
+        interval: str,
+        start: datetime,
+        end: datetime,
+        rate: float,
+        slippage: float,
+        size: float,
+        pricetick: float,
+        capital: int,
+        optimization_setting: "OptimizationSetting",
+        use_ga: bool
+    ):
+        """"""
+        from .backtesting import BacktestingEngine, OptimizationExecutor
+
+        strategy_name = strategy.strategy_name
+
+        if use_ga:
+            self.write_log(f"{strategy_name}开始遗传算法参数优化")
+        else:
+            self.write_log(f"{strategy_name}开始多进程参数优化")
+
+        # Worker processes are kept alive for later optimization
+        if not self.executor:
+            self.executor = OptimizationExecutor(output=self.write_log)
+
+        # Backtesting with spread copy without position of live trading
+        engine = BacktestingEngine()
+        engine.output = self.write_log
+
+        engine.set_parameters(
+            spread=copy_spread(strategy.spread),
+            interval=interval,
+            start=start,
+            end=end,
+            rate=rate,
+            slippage=slippage,
+            size=size,
+            pricetick=pricetick,
+            capital=capital
+        )
+        engine.add_strategy(strategy.__class__, {})
+
+        callback = partial(self.put_optimization_progress, strategy_name)
+        result_values = None
+
+        try:
+            if use_ga:
+                result_values = engine.run_ga_optimization(
+                    optimization_setting,
+                    output=False,
+                    executor=self.executor,
+                    callback=callback
+                )
+            else:
+                result_values = engine.run_optimization(
+                    optimization_setting,
+                    output=False,
+                    executor=self.executor,
+                    callback=callback
+                )
+
+            self.write_log(f"{strategy_name}参数优化完成")
+        except Exception:
+            msg = f"{strategy_name}参数优化触发异常\n{traceback.format_exc()}"
+            self.write_log(msg)
+
+        # Clear thread object handler.
+        self.optimization_thread = None
+
+        event = Event(
+            EVENT_SPREAD_OPTIMIZATION_FINISHED,
+            {"strategy_name": strategy_name, "results": result_values}
+        )
+        self.event_engine.put(event)
+
+    def put_optimization_progress(
+        self, strategy_name: str, finished: int, total: int, results: list
+    ):
+        """"""
+        event = Event(
+            EVENT_SPREAD_OPTIMIZATION_PROGRESS,
+            {"strategy_name": strategy_name, "finished": finished, "total": total}
+        )
+        self.event_engine.put(event)
+
+    def stop_optimization(self) -> bool:
+        """
+        Cancel running optimization, finished results are still kept.
+        """
+        if not self.optimization_thread or not self.executor:
+            return False
+
+        self.executor.cancel()
+        self.write_log("已发出停止请求，等待运行中的回测完成")
+        return True
+
     def put_strategy_event(self, strategy: SpreadStrategyTemplate):
         """"""
         data = strategy.get_data()
@@ -2,9 +2,11 @@
 Widget for spread trading.
 """
 
+from datetime import datetime, timedelta
+
 from vnpy.event import EventEngine, Event
 from vnpy.trader.engine import MainEngine
-from vnpy.trader.constant import Direction, Offset
+from vnpy.trader.constant import Direction, Offset, Interval
 from vnpy.trader.ui import QtWidgets, QtCore, QtGui
 from vnpy.trader.ui.widget import (
     BaseMonitor, BaseCell,
@@ -21,7 +23,9 @@ from ..engine import (
     EVENT_SPREAD_POS,
     EVENT_SPREAD_LOG,
     EVENT_SPREAD_ALGO,
-    EVENT_SPREAD_STRATEGY
+    EVENT_SPREAD_STRATEGY,
+    EVENT_SPREAD_OPTIMIZATION_PROGRESS,
+    EVENT_SPREAD_OPTIMIZATION_FINISHED
 )
 
 
@@ -631,6 +635,8 @@ class SpreadStrategyWidget(QtWidgets.QFrame):
         self.strategy_name = data["strategy_name"]
         self._data = data
 
+        self.optimization_dialog = None
+
         self.init_ui()
 
     def init_ui(self):
@@ -654,6 +660,9 @@ class SpreadStrategyWidget(QtWidgets.QFrame):
         remove_button = QtWidgets.QPushButton("移除")
         remove_button.clicked.connect(self.remove_strategy)
 
+        optimization_button = QtWidgets.QPushButton("优化")
+        optimization_button.clicked.connect(self.optimize_strategy)
+
         strategy_name = self._data["strategy_name"]
         spread_name = self._data["spread_name"]
         class_name = self._data["class_name"]
@@ -674,6 +683,7 @@ class SpreadStrategyWidget(QtWidgets.QFrame):
         hbox.addWidget(stop_button)
         hbox.addWidget(edit_button)
         hbox.addWidget(remove_button)
+        hbox.addWidget(optimization_button)
 
         vbox = QtWidgets.QVBoxLayout()
         vbox.addWidget(label)
@@ -714,6 +724,17 @@ class SpreadStrategyWidget(QtWidgets.QFrame):
             setting = editor.get_setting()
             self.strategy_engine.edit_strategy(strategy_name, setting)
 
+    def optimize_strategy(self):
+        """"""
+        if not self.optimization_dialog:
+            self.optimization_dialog = SpreadOptimizationDialog(
+                self.strategy_engine,
+                self.strategy_name,
+                self._data["class_name"]
+            )
+
+        self.optimization_dialog.show()
+
     def remove_strategy(self):
         """"""
         result = self.strategy_engine.remove_strategy(self.strategy_name)
@@ -723,6 +744,186 @@ class SpreadStrategyWidget(QtWidgets.QFrame):
             self.strategy_monitor.remove_strategy(self.strategy_name)
 
 
+class SpreadOptimizationDialog(QtWidgets.QDialog):
+    """
+    For running parameter optimization of spread strategy.
+    """
+
+    signal_progress = QtCore.pyqtSignal(Event)
+    signal_finished = QtCore.pyqtSignal(Event)
+
+    def __init__(
+        self,
+        strategy_engine: SpreadStrategyEngine,
+        strategy_name: str,
+        class_name: str
+    ):
+        """"""
+        super().__init__()
+
+        self.strategy_engine = strategy_engine
+        self.event_engine = strategy_engine.event_engine
+
+        self.strategy_name = strategy_name
+        self.class_name = class_name
+
+        self.result_values = None
+        self.target_display = ""
+
+        self.init_ui()
+        self.register_event()
+
+    def init_ui(self):
+        """"""
+        self.setWindowTitle(f"参数优化：{self.strategy_name}")
+
+        self.interval_combo = QtWidgets.QComboBox()
+        for interval in Interval:
+            self.interval_combo.addItem(interval.value)
+
+        end_dt = datetime.now()
+        start_dt = end_dt - timedelta(days=365)
+
+        self.start_date_edit = QtWidgets.QDateEdit(
+            QtCore.QDate(
+                start_dt.year,
+                start_dt.month,
+                start_dt.day
+            )
+        )
+        self.end_date_edit = QtWidgets.QDateEdit(
+            QtCore.QDate.currentDate()
+        )
+
+        strategy = self.strategy_engine.strategies[self.strategy_name]
+        pricetick = strategy.spread.pricetick
+
+        self.rate_line = QtWidgets.QLineEdit("0")
+        self.slippage_line = QtWidgets.QLineEdit(str(pricetick))
+        self.size_line = QtWidgets.QLineEdit("1")
+        self.pricetick_line = QtWidgets.QLineEdit(str(pricetick))
+        self.capital_line = QtWidgets.QLineEdit("1000000")
+
+        optimization_button = QtWidgets.QPushButton("参数优化")
+        optimization_button.clicked.connect(self.start_optimization)
+
+        self.stop_button = QtWidgets.QPushButton("停止优化")
+        self.stop_button.clicked.connect(self.stop_optimization)
+        self.stop_button.setEnabled(False)
+
+        self.result_button = QtWidgets.QPushButton("优化结果")
+        self.result_button.clicked.connect(self.show_optimization_result)
+        self.result_button.setEnabled(False)
+
+        self.progress_bar = QtWidgets.QProgressBar()
+
+        form = QtWidgets.QFormLayout()
+        form.addRow("K线周期", self.interval_combo)
+        form.addRow("开始日期", self.start_date_edit)
+        form.addRow("结束日期", self.end_date_edit)
+        form.addRow("手续费率", self.rate_line)
+        form.addRow("交易滑点", self.slippage_line)
+        form.addRow("合约乘数", self.size_line)
+        form.addRow("价格跳动", self.pricetick_line)
+        form.addRow("回测资金", self.capital_line)
+        form.addRow(optimization_button)
+        form.addRow(self.progress_bar)
+        form.addRow(self.stop_button)
+        form.addRow(self.result_button)
+
+        self.setLayout(form)
+
+    def register_event(self):
+        """"""
+        self.signal_progress.connect(self.process_progress_event)
+        self.signal_finished.connect(self.process_finished_event)
+
+        self.event_engine.register(
+            EVENT_SPREAD_OPTIMIZATION_PROGRESS, self.signal_progress.emit
+        )
+        self.event_engine.register(
+            EVENT_SPREAD_OPTIMIZATION_FINISHED, self.signal_finished.emit
+        )
+
+    def process_progress_event(self, event: Event):
+        """"""
+        data = event.data
+        if data["strategy_name"] != self.strategy_name:
+            return
+
+        self.progress_bar.setMaximum(data["total"])
+        self.progress_bar.setValue(data["finished"])
+
+    def process_finished_event(self, event: Event):
+        """"""
+        data = event.data
+        if data["strategy_name"] != self.strategy_name:
+            return
+
+        self.result_values = data["results"]
+
+        self.stop_button.setEnabled(False)
+        self.result_button.setEnabled(bool(self.result_values))
+
+    def start_optimization(self):
+        """"""
+        # CTA backtester widgets load backtesting modules, only when used
+        from vnpy.app.cta_backtester.ui.widget import OptimizationSettingEditor
+
+        interval = self.interval_combo.currentText()
+        start = self.start_date_edit.date().toPyDate()
+        end = self.end_date_edit.date().toPyDate()
+        rate = float(self.rate_line.text())
+        slippage = float(self.slippage_line.text())
+        size = float(self.size_line.text())
+        pricetick = float(self.pricetick_line.text())
+        capital = float(self.capital_line.text())
+
+        parameters = self.strategy_engine.get_strategy_parameters(self.strategy_name)
+        dialog = OptimizationSettingEditor(self.class_name, parameters)
+        i = dialog.exec()
+        if i != dialog.Accepted:
+            return
+
+        optimization_setting, use_ga = dialog.get_setting()
+
+        result = self.strategy_engine.start_optimization(
+            self.strategy_name,
+            interval,
+            start,
+            end,
+            rate,
+            slippage,
+            size,
+            pricetick,
+            capital,
+            optimization_setting,
+            use_ga
+        )
+
+        if result:
+            self.target_display = dialog.target_display
+
+            self.result_button.setEnabled(False)
+            self.stop_button.setEnabled(True)
+            self.progress_bar.setValue(0)
+
+    def stop_optimization(self):
+        """"""
+        if self.strategy_engine.stop_optimization():
+            self.stop_button.setEnabled(False)
+
+    def show_optimization_result(self):
+        """"""
+        from vnpy.app.cta_backtester.ui.widget import OptimizationResultMonitor
+
+        dialog = OptimizationResultMonitor(
+            self.result_values,
+            self.target_display
+        )
+        dialog.exec_()
+
+
 class StrategyDataMonitor(QtWidgets.QTableWidget):
     """
     Table monitor for parameters and variables.
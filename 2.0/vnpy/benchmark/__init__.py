@@ -0,0 +1,12 @@
+"""
+Backtesting benchmark suite running on synthetic data, no database needed.
+
+    python -m vnpy.benchmark --help
+
+Parity checks of optimized calculations against reference implementations:
+
+    python -m vnpy.benchmark.parity
+"""
+
+from .data import generate_bars, generate_ticks
+from .backtesting import run_benchmark, compare_reports
@@ -0,0 +1,5 @@
+from .backtesting import main
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+"""
+Throughput benchmark of backtesting engines.
+
+Bundled strategies are run through the CTA, portfolio and spread
+backtesting engines on synthetic data generated in memory, without any
+data stored in database. Each case runs in a new process by default, so
+that peak RSS is measured for the case only.
+
+The json report can be saved as baseline, later runs are compared with
+it for guarding performance of backtesting:
+
+    python -m vnpy.benchmark --output baseline.json
+    python -m vnpy.benchmark --baseline baseline.json --tolerance 0.2
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import platform
+import sys
+import traceback
+from datetime import datetime
+from queue import Empty
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+import vnpy
+from vnpy.trader.constant import Interval
+from vnpy.trader.database.benchmark import measure
+
+from .data import EXCHANGE, PRICETICK, generate_bars, generate_ticks
+
+
+CTA_STRATEGIES = [
+    ("atr_rsi_strategy", "AtrRsiStrategy"),
+    ("boll_channel_strategy", "BollChannelStrategy"),
+    ("double_ma_strategy", "DoubleMaStrategy"),
+    ("dual_thrust_strategy", "DualThrustStrategy"),
+    ("king_keltner_strategy", "KingKeltnerStrategy"),
+    ("multi_signal_strategy", "MultiSignalStrategy"),
+    ("multi_timeframe_strategy", "MultiTimeframeStrategy"),
+    ("turtle_signal_strategy", "TurtleSignalStrategy"),
+]
+
+PORTFOLIO_STRATEGIES = [
+    ("pair_trading_strategy", "PairTradingStrategy"),
+    ("trend_following_strategy", "TrendFollowingStrategy"),
+]
+
+# BasicSpreadStrategy is not included since it loads no history data,
+# which is required by spread backtesting engine for initializing.
+SPREAD_STRATEGIES = [
+    ("statistical_arbitrage_strategy", "StatisticalArbitrageStrategy"),
+]
+
+SYMBOL = "BENCH"
+LEG_SYMBOLS = ["BENCH1", "BENCH2"]
+
+
+def generate_cases() -> List[dict]:
+    """
+    Return all benchmark cases.
+    """
+    cases = []
+
+    for module_name, class_name in CTA_STRATEGIES:
+        cases.append({
+            "name": f"cta_bar_{class_name}",
+            "engine": "cta",
+            "mode": "bar",
+            "module": f"vnpy.app.cta_strategy.strategies.{module_name}",
+            "class_name": class_name,
+        })
+
+    cases.append({
+        "name": "cta_tick_AtrRsiStrategy",
+        "engine": "cta",
+        "mode": "tick",
+        "module": "vnpy.app.cta_strategy.strategies.atr_rsi_strategy",
+        "class_name": "AtrRsiStrategy",
+    })
+
+    for module_name, class_name in PORTFOLIO_STRATEGIES:
+        cases.append({
+            "name": f"portfolio_bar_{class_name}",
+            "engine": "portfolio",
+            "mode": "bar",
+            "module": f"vnpy.app.portfolio_strategy.strategies.{module_name}",
+            "class_name": class_name,
+        })
+
+    for module_name, class_name in SPREAD_STRATEGIES:
+        cases.append({
+            "name": f"spread_bar_{class_name}",
+            "engine": "spread",
+            "mode": "bar",
+            "module": f"vnpy.app.spread_trading.strategies.{module_name}",
+            "class_name": class_name,
+        })
+
+    cases.append({
+        "name": "cta_optimization_AtrRsiStrategy",
+        "engine": "optimization",
+        "mode": "bar",
+        "module": "vnpy.app.cta_strategy.strategies.atr_rsi_strategy",
+        "class_name": "AtrRsiStrategy",
+    })
+
+    return cases
+
+
+def load_strategy_class(case: dict) -> type:
+    """"""
+    module = importlib.import_module(case["module"])
+    return getattr(module, case["class_name"])
+
+
+def run_engine(engine) -> dict:
+    """
+    Replay history data and calculate statistics, with engine logs
+    checked for exception since it is caught inside engine.
+    """
+    logs = []
+    engine.output = logs.append
+
+    result = {
+        "replay": measure(engine.run_backtesting, len(engine.history_data)),
+    }
+
+    if "触发异常，回测终止" in logs:
+        raise RuntimeError("\n".join(logs[-2:]))
+
+    def calculate():
+        engine.calculate_result()
+        engine.calculate_statistics(output=False)
+
+    result["result"] = measure(calculate, len(engine.daily_results))
+    result["trade_count"] = len(engine.trades)
+    return result
+
+
+def run_cta_case(case: dict, parameters: dict) -> dict:
+    """"""
+    from vnpy.app.cta_strategy.backtesting import BacktestingEngine, BacktestingMode
+
+    strategy_class = load_strategy_class(case)
+
+    if case["mode"] == "bar":
+        mode = BacktestingMode.BAR
+        history_data = generate_bars([SYMBOL], parameters["bar_days"], parameters["seed"])[SYMBOL]
+    else:
+        mode = BacktestingMode.TICK
+        history_data = generate_ticks(SYMBOL, parameters["tick_days"], parameters["seed"])
+
+    engine = BacktestingEngine()
+    engine.set_parameters(
+        vt_symbol=f"{SYMBOL}.{EXCHANGE.value}",
+        interval=Interval.MINUTE,
+        start=history_data[0].datetime,
+        rate=0.0001,
+        slippage=PRICETICK,
+        size=10,
+        pricetick=PRICETICK,
+        capital=1_000_000,
+        end=history_data[-1].datetime,
+        mode=mode
+    )
+    engine.add_strategy(strategy_class, {})
+    engine.history_data = history_data
+
+    # Bar strategy is initialized with ticks of the first day in tick mode
+    if mode == BacktestingMode.TICK:
+        engine.load_tick(engine.vt_symbol, 1, engine.strategy.on_tick)
+        engine.load_bar = lambda *args, **kwargs: None
+
+    return run_engine(engine)
+
+
+def run_portfolio_case(case: dict, parameters: dict) -> dict:
+    """"""
+    from vnpy.app.portfolio_strategy.backtesting import BacktestingEngine
+
+    strategy_class = load_strategy_class(case)
+    history = generate_bars(LEG_SYMBOLS, parameters["bar_days"], parameters["seed"])
+
+    vt_symbols = [f"{symbol}.{EXCHANGE.value}" for symbol in LEG_SYMBOLS]
+    first_bars = history[LEG_SYMBOLS[0]]
+
+    engine = BacktestingEngine()
+    engine.set_parameters(
+        vt_symbols=vt_symbols,
+        interval=Interval.MINUTE,
+        start=first_bars[0].datetime,
+        rates={vt_symbol: 0.0001 for vt_symbol in vt_symbols},
+        slippages={vt_symbol: PRICETICK for vt_symbol in vt_symbols},
+        sizes={vt_symbol: 10 for vt_symbol in vt_symbols},
+        priceticks={vt_symbol: PRICETICK for vt_symbol in vt_symbols},
+        capital=1_000_000,
+        end=first_bars[-1].datetime
+    )
+
+    if case["class_name"] == "PairTradingStrategy":
+        setting = {"leg1_ratio": 3, "leg2_ratio": 2}
+    else:
+        setting = {}
+    engine.add_strategy(strategy_class, setting)
+
+    for vt_symbol, bars in zip(vt_symbols, history.values()):
+        for bar in bars:
+            engine.history_data[(bar.datetime, vt_symbol)] = bar
+            engine.dts.add(bar.datetime)
+
+    return run_engine(engine)
+
+
+def run_spread_case(case: dict, parameters: dict) -> dict:
+    """"""
+    from vnpy.trader.database.database import array_to_bars, bars_to_array
+    from vnpy.app.spread_trading.backtesting import BacktestingEngine
+    from vnpy.app.spread_trading.base import LegData, SpreadData, calculate_spread_bar_array
+
+    strategy_class = load_strategy_class(case)
+    history = generate_bars(LEG_SYMBOLS, parameters["bar_days"], parameters["seed"])
+
+    vt_symbols = [f"{symbol}.{EXCHANGE.value}" for symbol in LEG_SYMBOLS]
+    multipliers = dict(zip(vt_symbols, [3, -2]))
+
+    spread = SpreadData(
+        name="BENCH-SPREAD",
+        legs=[LegData(vt_symbol) for vt_symbol in vt_symbols],
+        price_multipliers=multipliers,
+        trading_multipliers=multipliers,
+        active_symbol=vt_symbols[0],
+        inverse_contracts={vt_symbol: False for vt_symbol in vt_symbols},
+        min_volume=1
+    )
+
+    # Spread bars calculated from bar arrays of legs
+    leg_arrays = {
+        vt_symbol: bars_to_array(bars)
+        for vt_symbol, bars in zip(vt_symbols, history.values())
+    }
+    arrays = calculate_spread_bar_array(leg_arrays, multipliers, PRICETICK)
+
+    history_data = array_to_bars(arrays, spread.name, EXCHANGE, Interval.MINUTE, "SPREAD")
+    for bar, value in zip(history_data, arrays["value"].tolist()):
+        bar.value = value
+
+    engine = BacktestingEngine()
+    engine.set_parameters(
+        spread=spread,
+        interval=Interval.MINUTE,
+        start=history_data[0].datetime,
+        rate=0.0001,
+        slippage=PRICETICK,
+        size=10,
+        pricetick=PRICETICK,
+        capital=1_000_000,
+        end=history_data[-1].datetime
+    )
+    engine.add_strategy(strategy_class, {})
+    engine.history_data = history_data
+
+    return run_engine(engine)
+
+
+def run_optimization_case(case: dict, parameters: dict) -> dict:
+    """
+    Throughput of parallel optimization, excluding starting worker processes.
+    """
+    from vnpy.app.cta_strategy.backtesting import (
+        BacktestingEngine,
+        BacktestingMode,
+        OptimizationExecutor,
+        OptimizationSetting,
+        SharedHistoryData
+    )
+
+    strategy_class = load_strategy_class(case)
+    history_data = generate_bars([SYMBOL], parameters["bar_days"], parameters["seed"])[SYMBOL]
+
+    engine = BacktestingEngine()
+    engine.output = lambda msg: None
+    engine.set_parameters(
+        vt_symbol=f"{SYMBOL}.{EXCHANGE.value}",
+        interval=Interval.MINUTE,
+        start=history_data[0].datetime,
+        rate=0.0001,
+        slippage=PRICETICK,
+        size=10,
+        pricetick=PRICETICK,
+        capital=1_000_000,
+        end=history_data[-1].datetime
+    )
+    engine.add_strategy(strategy_class, {})
+    engine.history_data = history_data
+
+    optimization_setting = OptimizationSetting()
+    optimization_setting.add_parameter("atr_length", 10, 10 + parameters["optimization_count"] - 1, 1)
+    optimization_setting.set_target("sharpe_ratio")
+    settings = optimization_setting.generate_setting()
+
+    shared_data = SharedHistoryData.create(history_data, BacktestingMode.BAR)
+    config = engine.get_optimization_config("sharpe_ratio", shared_data or history_data)
+    config["cache_base"] = None     # Never read or write result cache
+
+    executor = OptimizationExecutor(parameters["workers"], output=lambda msg: None)
+    executor.start()
+
+    try:
+        result = measure(lambda: executor.run(config, settings), len(settings))
+    finally:
+        executor.stop()
+        if shared_data:
+            shared_data.release()
+
+    result["bar_rate"] = result.get("rate", 0) * len(history_data)
+
+    return {
+        "optimization": result,
+        "workers": executor.max_workers,
+        "shared_memory": bool(shared_data),
+    }
+
+
+CASE_RUNNERS: Dict[str, Callable] = {
+    "cta": run_cta_case,
+    "portfolio": run_portfolio_case,
+    "spread": run_spread_case,
+    "optimization": run_optimization_case,
+}
+
+
+def get_peak_rss() -> Optional[float]:
+    """
+    Peak resident set size of current process in MB, None if unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss / 1024 / 1024
+    return rss / 1024
+
+
+def run_case(case: dict, parameters: dict) -> dict:
+    """
+    Run one case in current process.
+    """
+    try:
+        result = CASE_RUNNERS[case["engine"]](case, parameters)
+    except ImportError as e:
+        return {"skipped": str(e)}
+    except Exception:
+        return {"error": traceback.format_exc()}
+
+    result["peak_rss_mb"] = get_peak_rss()
+    return result
+
+
+def run_case_process(case: dict, parameters: dict, queue) -> None:
+    """
+    Function for running case in a new process.
+    """
+    queue.put(run_case(case, parameters))
+
+
+def get_case_result(process, queue) -> dict:
+    """
+    Wait for result of case process, which may exit without result.
+    """
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                return {"error": f"测试进程异常退出，退出码：{process.exitcode}"}
+
+
+def run_benchmark(
+    bar_days: int = 60,
+    tick_days: int = 2,
+    optimization_count: int = 16,
+    workers: int = 0,
+    seed: int = 0,
+    names: List[str] = None,
+    isolate: bool = True,
+    output: Callable = print
+) -> dict:
+    """
+    Run benchmark cases (filtered by names if given) and return report dict.
+    """
+    parameters = {
+        "bar_days": bar_days,
+        "tick_days": tick_days,
+        "optimization_count": optimization_count,
+        "workers": workers,
+        "seed": seed,
+    }
+
+    report = {
+        "vnpy_version": vnpy.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "datetime": datetime.now().isoformat(),
+        "parameters": parameters,
+        "results": {},
+        "skipped": [],
+    }
+
+    ctx = multiprocessing.get_context("spawn")
+
+    for case in generate_cases():
+        name = case["name"]
+        if names and not any(n in name for n in names):
+            continue
+
+        output(f"开始测试：{name}")
+        start = perf_counter()
+
+        if isolate:
+            queue = ctx.Queue()
+            process = ctx.Process(target=run_case_process, args=(case, parameters, queue))
+            process.start()
+            result = get_case_result(process, queue)
+            process.join()
+        else:
+            result = run_case(case, parameters)
+
+        if "skipped" in result:
+            output(f"{name}跳过：{result['skipped']}")
+            report["skipped"].append(name)
+            continue
+
+        if "error" in result:
+            output(f"{name}触发异常：\n{result['error']}")
+        else:
+            output(f"{name}完成，耗时{perf_counter() - start:.1f}秒")
+
+        report["results"][name] = result
+
+    return report
+
+
+def compare_reports(baseline: dict, report: dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Return messages of cases with rate lower than baseline by more than
+    tolerance ratio.
+    """
+    regressions = []
+
+    for name, result in report["results"].items():
+        base_result = baseline.get("results", {}).get(name, None)
+        if not base_result:
+            continue
+
+        for key in ["replay", "result", "optimization"]:
+            base_rate = base_result.get(key, {}).get("rate", 0)
+            rate = result.get(key, {}).get("rate", 0)
+
+            if base_rate and rate < base_rate * (1 - tolerance):
+                regressions.append(
+                    f"{name} {key}：{rate:,.0f}/秒，基准{base_rate:,.0f}/秒，"
+                    f"下降{1 - rate / base_rate:.1%}"
+                )
+
+    return regressions
+
+
+def main():
+    """"""
+    parser = argparse.ArgumentParser(description="Backtesting throughput benchmark")
+    parser.add_argument("--bar-days", type=int, default=60, help="trading days of bar data")
+    parser.add_argument("--tick-days", type=int, default=2, help="trading days of tick data")
+    parser.add_argument("--optimization-count", type=int, default=16, help="settings of optimization")
+    parser.add_argument("--workers", type=int, default=0, help="optimization workers, 0 for cpu count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--case", type=str, action="append", help="run cases with name containing it")
+    parser.add_argument("--no-isolate", action="store_true", help="run all cases in current process")
+    parser.add_argument("--output", type=str, default="", help="json report file path")
+    parser.add_argument("--baseline", type=str, default="", help="json report file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed ratio of rate decrease")
+    args = parser.parse_args()
+
+    def output(msg):
+        print(msg, file=sys.stderr)
+
+    report = run_benchmark(
+        bar_days=args.bar_days,
+        tick_days=args.tick_days,
+        optimization_count=args.optimization_count,
+        workers=args.workers,
+        seed=args.seed,
+        names=args.case,
+        isolate=not args.no_isolate,
+        output=output
+    )
+
+    data = json.dumps(report, indent=4, default=str)
+    if args.output:
+        with open(args.output, mode="w", encoding="UTF-8") as f:
+            f.write(data)
+    else:
+        print(data)
+
+    if args.baseline:
+        with open(args.baseline, encoding="UTF-8") as f:
+            baseline = json.load(f)
+
+        if baseline.get("parameters", None) != report["parameters"]:
+            output("基准报告的测试参数不一致，比较结果可能无效")
+
+        regressions = compare_reports(baseline, report, args.tolerance)
+        for msg in regressions:
+            output(f"性能下降：{msg}")
+
+        if regressions:
+            sys.exit(1)
+        output("未发现性能下降")
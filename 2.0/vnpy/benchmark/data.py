@@ -0,0 +1,183 @@
+"""
+Deterministic synthetic market data for benchmarks.
+
+Prices are seeded random walks in units of pricetick, sampled only in
+trading sessions of Chinese commodity futures on weekdays. Prices of
+multiple symbols share a common factor, so that spread and pair trading
+strategies see cointegrated legs.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from vnpy.trader.constant import Exchange, Interval
+from vnpy.trader.database.database import DB_TZ
+from vnpy.trader.object import BarData, TickData
+
+
+SESSIONS = [
+    (time(9, 0), time(10, 15)),
+    (time(10, 30), time(11, 30)),
+    (time(13, 30), time(15, 0)),
+    (time(21, 0), time(23, 0)),
+]
+
+EXCHANGE = Exchange.LOCAL
+PRICETICK = 1
+START_DATE = date(2015, 1, 5)
+
+
+def generate_datetimes(days: int, step: timedelta, start: date = START_DATE) -> np.ndarray:
+    """
+    Return datetime64 array of sampling time in sessions of [days]
+    weekdays from start.
+    """
+    step = np.timedelta64(step)
+    datetimes = []
+
+    d = start
+    count = 0
+    while count < days:
+        if d.weekday() < 5:
+            for open_time, close_time in SESSIONS:
+                datetimes.append(np.arange(
+                    np.datetime64(datetime.combine(d, open_time)),
+                    np.datetime64(datetime.combine(d, close_time)),
+                    step
+                ))
+            count += 1
+        d += timedelta(days=1)
+
+    return np.concatenate(datetimes).astype("datetime64[us]")
+
+
+def generate_prices(
+    count: int,
+    symbols: List[str],
+    seed: int,
+    base_price: float = 3000,
+    volatility: float = 2
+) -> Dict[str, np.ndarray]:
+    """
+    Random walk prices in pricetick of each symbol, with 70% of variance
+    from the common factor.
+    """
+    rng = np.random.default_rng(seed)
+    common = rng.normal(0, volatility, count)
+
+    prices = {}
+    for n, symbol in enumerate(symbols):
+        own = rng.normal(0, volatility, count)
+        steps = np.round((common * 0.84 + own * 0.55) / PRICETICK) * PRICETICK
+
+        price = base_price * (1 + n * 0.5)
+        prices[symbol] = np.maximum(price + np.cumsum(steps), PRICETICK * 10)
+
+    return prices
+
+
+def to_datetimes(datetimes: np.ndarray) -> List[datetime]:
+    """"""
+    return [DB_TZ.localize(dt) for dt in datetimes.tolist()]
+
+
+def generate_bars(
+    symbols: List[str],
+    days: int,
+    seed: int = 0
+) -> Dict[str, List[BarData]]:
+    """
+    Generate 1-minute bars of each symbol in sessions of [days] weekdays.
+    """
+    datetimes = generate_datetimes(days, timedelta(minutes=1))
+    count = len(datetimes)
+    dts = to_datetimes(datetimes)
+
+    closes = generate_prices(count, symbols, seed)
+    rng = np.random.default_rng(seed + 1)
+
+    history = {}
+    for symbol, close in closes.items():
+        open_ = np.empty(count)
+        open_[0] = close[0]
+        open_[1:] = close[:-1]
+
+        high = np.maximum(open_, close) + rng.integers(0, 4, count) * PRICETICK
+        low = np.minimum(open_, close) - rng.integers(0, 4, count) * PRICETICK
+        volume = rng.integers(1, 1000, count)
+        open_interest = 100000 + rng.integers(-100, 100, count)
+
+        history[symbol] = [
+            BarData(
+                symbol=symbol,
+                exchange=EXCHANGE,
+                datetime=dt,
+                interval=Interval.MINUTE,
+                volume=float(v),
+                open_interest=float(oi),
+                open_price=o,
+                high_price=h,
+                low_price=lo,
+                close_price=c,
+                gateway_name="DB"
+            )
+            for dt, v, oi, o, h, lo, c in zip(
+                dts,
+                volume.tolist(),
+                open_interest.tolist(),
+                open_.tolist(),
+                high.tolist(),
+                low.tolist(),
+                close.tolist()
+            )
+        ]
+
+    return history
+
+
+def generate_ticks(symbol: str, days: int, seed: int = 0) -> List[TickData]:
+    """
+    Generate 500ms ticks with 5 depth levels in sessions of [days] weekdays.
+    """
+    datetimes = generate_datetimes(days, timedelta(milliseconds=500))
+    count = len(datetimes)
+    dts = to_datetimes(datetimes)
+
+    prices = generate_prices(count, [symbol], seed, volatility=0.5)[symbol]
+    rng = np.random.default_rng(seed + 1)
+
+    last_volumes = rng.integers(0, 20, count)
+    volumes = np.cumsum(last_volumes)
+    depth_volumes = rng.integers(1, 100, (count, 10)).tolist()
+
+    ticks = []
+    for dt, price, last_volume, volume, depth in zip(
+        dts, prices.tolist(), last_volumes.tolist(), volumes.tolist(), depth_volumes
+    ):
+        tick = TickData(
+            symbol=symbol,
+            exchange=EXCHANGE,
+            datetime=dt,
+            name=symbol,
+            volume=float(volume),
+            open_interest=100000,
+            last_price=price,
+            last_volume=float(last_volume),
+            limit_up=price * 1.1,
+            limit_down=price * 0.9,
+            open_price=float(prices[0]),
+            pre_close=float(prices[0]),
+            gateway_name="DB"
+        )
+
+        for n in range(1, 6):
+            setattr(tick, f"bid_price_{n}", price - n * PRICETICK)
+            setattr(tick, f"ask_price_{n}", price + n * PRICETICK)
+            setattr(tick, f"bid_volume_{n}", depth[n - 1])
+            setattr(tick, f"ask_volume_{n}", depth[n + 4])
+
+        ticks.append(tick)
+
+    return ticks
@@ -0,0 +1,531 @@
+"""
+Parity checks of optimized calculations against their reference
+implementations, run on random data:
+
+    python -m vnpy.benchmark.parity
+
+Any mismatch is printed and the process exits with code 1.
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+
+import numpy as np
+from pandas import DataFrame
+
+from vnpy.trader.constant import Direction, Exchange, Offset
+from vnpy.trader.object import TradeData
+from vnpy.trader.utility import Rounder, round_to, floor_to, ceil_to
+from vnpy.app.cta_strategy.backtesting import BacktestingEngine, DailyResult
+from vnpy.app.spread_trading.base import LegData, SpreadData, calculate_inverse_volume
+
+
+ROUNDER_TARGETS = [
+    1, 5, 10.0, 0.5, 0.2, 0.25, 0.1, 0.01, 0.0002,
+    1.25e-4, 1e-05, 2.5e-05, 1.5e-06,
+]
+
+
+def generate_rounding_values(target: float, count: int, seed: int) -> List[float]:
+    """
+    Random values near multiples of target, including exact multiples,
+    midpoints and float sums which are just off the rounding boundary.
+    """
+    rng = np.random.default_rng(seed)
+
+    counts = rng.integers(-100000, 100000, count)
+    offsets = rng.choice([0, 0.5, 0.1, 0.49999999, 0.50000001], count)
+    noise = rng.random(count) * rng.choice([0, 1], count)
+
+    values = ((counts + offsets + noise) * target).tolist()
+
+    # Sum of multiples as in spread price calculation
+    pairs = zip(counts.tolist(), rng.integers(-1000, 1000, count).tolist())
+    values.extend(a * target + b * target for a, b in pairs)
+
+    return values
+
+
+def check_rounder(count: int = 10000, seed: int = 0) -> List[str]:
+    """
+    Compare Rounder with round_to, floor_to and ceil_to.
+    """
+    errors = []
+
+    for target in ROUNDER_TARGETS:
+        rounder = Rounder(target)
+        values = generate_rounding_values(target, count, seed)
+
+        pairs = [
+            ("round", rounder.round, round_to),
+            ("floor", rounder.floor, floor_to),
+            ("ceil", rounder.ceil, ceil_to),
+        ]
+        for name, func, reference in pairs:
+            for value in values:
+                result = func(value)
+                expected = reference(value, target)
+
+                if result != expected:
+                    errors.append(
+                        f"Rounder({target}).{name}({value!r}) = {result!r}, 应为{expected!r}"
+                    )
+
+        results = rounder.round_array(np.array(values)).tolist()
+        for value, result in zip(values, results):
+            expected = round_to(value, target)
+
+            if result != expected:
+                errors.append(
+                    f"Rounder({target}).round_array({value!r}) = {result!r}, 应为{expected!r}"
+                )
+
+    return errors
+
+
+# Contract parameters of pnl check: size, rate, slippage, inverse, capital
+PNL_CASES = [
+    (10, 1 / 10000, 0.2, False, 1_000_000),
+    (300, 0.23 / 10000, 0.2, False, 1_000_000),
+    (1, 0, 0, False, 100_000),
+    (100, 5 / 10000, 0.5, True, 100),
+]
+
+
+def generate_daily_results(
+    engine: BacktestingEngine,
+    count: int,
+    seed: int
+) -> List[DailyResult]:
+    """
+    Fill engine with random daily closes and trades, and return daily
+    results with the same closes and trades for the reference calculation.
+
+    Days without trade are generated at start and among trading days,
+    and some days have several trades.
+    """
+    rng = np.random.default_rng(seed)
+
+    closes = np.round(3000 + np.cumsum(rng.normal(0, 10, count)), 1)
+    trade_counts = rng.choice([0, 0, 1, 2, 5], count)
+    trade_counts[:min(3, count)] = 0
+    volume_fractional = rng.random() < 0.5
+
+    reference_results = []
+    start = date(2015, 1, 5)
+    tradeid = 0
+
+    for i, close_price in enumerate(closes.tolist()):
+        d = start + timedelta(days=i)
+        engine.daily_results[d] = DailyResult(d, close_price)
+        reference_result = DailyResult(d, close_price)
+        reference_results.append(reference_result)
+
+        for _ in range(int(trade_counts[i])):
+            tradeid += 1
+
+            if volume_fractional:
+                volume = float(np.round(rng.random() * 10, 3))
+            else:
+                volume = int(rng.integers(1, 10))
+
+            trade = TradeData(
+                symbol="PARITY",
+                exchange=Exchange.LOCAL,
+                orderid=str(tradeid),
+                tradeid=str(tradeid),
+                direction=rng.choice([Direction.LONG, Direction.SHORT]),
+                offset=Offset.NONE,
+                price=float(np.round(close_price + rng.normal(0, 5), 1)),
+                volume=volume,
+                datetime=datetime.combine(d, datetime.min.time()),
+                gateway_name="BACKTESTING"
+            )
+            engine.trades[trade.vt_tradeid] = trade
+            reference_result.add_trade(trade)
+
+    return reference_results
+
+
+def calculate_result_reference(
+    daily_results: List[DailyResult],
+    engine: BacktestingEngine
+) -> DataFrame:
+    """
+    Daily pnl calculated by iterating DailyResult.calculate_pnl.
+    """
+    pre_close = 0
+    start_pos = 0
+
+    for daily_result in daily_results:
+        daily_result.calculate_pnl(
+            pre_close,
+            start_pos,
+            engine.size,
+            engine.rate,
+            engine.slippage,
+            engine.inverse
+        )
+
+        pre_close = daily_result.close_price
+        start_pos = daily_result.end_pos
+
+    results = defaultdict(list)
+
+    for daily_result in daily_results:
+        for key, value in daily_result.__dict__.items():
+            results[key].append(value)
+
+    return DataFrame.from_dict(results).set_index("date")
+
+
+def calculate_statistics_reference(df: DataFrame, capital: float) -> dict:
+    """
+    Statistics calculated with pandas series operations.
+    """
+    df["balance"] = df["net_pnl"].cumsum() + capital
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["return"] = np.log(df["balance"] / df["balance"].shift(1)).fillna(0)
+    df["highlevel"] = (
+        df["balance"].rolling(
+            min_periods=1, window=len(df), center=False).max()
+    )
+    df["drawdown"] = df["balance"] - df["highlevel"]
+    df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+
+    total_days = len(df)
+    end_balance = df["balance"].iloc[-1]
+    max_ddpercent = df["ddpercent"].min()
+    max_drawdown_end = df["drawdown"].idxmin()
+    max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
+
+    total_net_pnl = df["net_pnl"].sum()
+    total_commission = df["commission"].sum()
+    total_slippage = df["slippage"].sum()
+    total_turnover = df["turnover"].sum()
+    total_trade_count = df["trade_count"].sum()
+
+    total_return = (end_balance / capital - 1) * 100
+    daily_return = df["return"].mean() * 100
+    return_std = df["return"].std() * 100
+
+    if return_std:
+        sharpe_ratio = daily_return / return_std * np.sqrt(240)
+    else:
+        sharpe_ratio = 0
+
+    statistics = {
+        "start_date": df.index[0],
+        "end_date": df.index[-1],
+        "total_days": total_days,
+        "profit_days": len(df[df["net_pnl"] > 0]),
+        "loss_days": len(df[df["net_pnl"] < 0]),
+        "capital": capital,
+        "end_balance": end_balance,
+        "max_drawdown": df["drawdown"].min(),
+        "max_ddpercent": max_ddpercent,
+        "max_drawdown_duration": (max_drawdown_end - max_drawdown_start).days,
+        "total_net_pnl": total_net_pnl,
+        "daily_net_pnl": total_net_pnl / total_days,
+        "total_commission": total_commission,
+        "daily_commission": total_commission / total_days,
+        "total_slippage": total_slippage,
+        "daily_slippage": total_slippage / total_days,
+        "total_turnover": total_turnover,
+        "daily_turnover": total_turnover / total_days,
+        "total_trade_count": total_trade_count,
+        "daily_trade_count": total_trade_count / total_days,
+        "total_return": total_return,
+        "annual_return": total_return / total_days * 240,
+        "daily_return": daily_return,
+        "return_std": return_std,
+        "sharpe_ratio": sharpe_ratio,
+        "return_drawdown_ratio": -total_return / max_ddpercent,
+    }
+
+    for key, value in statistics.items():
+        if value in (np.inf, -np.inf):
+            value = 0
+        statistics[key] = np.nan_to_num(value)
+
+    return statistics
+
+
+def is_same_value(result, expected) -> bool:
+    """
+    Values are the same if equal in type kind and bits, NaN equals NaN.
+    """
+    if isinstance(result, (float, np.floating)) or isinstance(expected, (float, np.floating)):
+        return np.float64(result).tobytes() == np.float64(expected).tobytes()
+    return result == expected
+
+
+def check_pnl(count: int = 10000, seed: int = 0) -> List[str]:
+    """
+    Compare numpy calculate_result and calculate_statistics of
+    BacktestingEngine with per day DailyResult.calculate_pnl iteration.
+    """
+    errors = []
+
+    for n, (size, rate, slippage, inverse, capital) in enumerate(PNL_CASES):
+        case = f"size={size}, rate={rate}, slippage={slippage}, inverse={inverse}"
+
+        engine = BacktestingEngine()
+        engine.output = lambda msg: None
+        engine.size = size
+        engine.rate = rate
+        engine.slippage = slippage
+        engine.inverse = inverse
+        engine.capital = capital
+
+        reference_results = generate_daily_results(engine, count, seed + n)
+
+        df = engine.calculate_result()
+        statistics = engine.calculate_statistics(output=False)
+
+        expected_df = calculate_result_reference(reference_results, engine)
+        expected_statistics = calculate_statistics_reference(expected_df, capital)
+
+        if list(df.columns) != list(expected_df.columns):
+            errors.append(f"[{case}] 列名{list(df.columns)}，应为{list(expected_df.columns)}")
+            continue
+
+        for name in df.columns:
+            if name == "trades":
+                continue
+
+            results = df[name].tolist()
+            expected_values = expected_df[name].tolist()
+
+            for d, result, expected in zip(df.index, results, expected_values):
+                if not is_same_value(result, expected):
+                    errors.append(f"[{case}] {d} {name} = {result!r}, 应为{expected!r}")
+
+        # Daily result objects are also updated for display
+        for daily_result, reference_result in zip(engine.daily_results.values(), reference_results):
+            for name, expected in reference_result.__dict__.items():
+                result = getattr(daily_result, name)
+
+                if name == "trades":
+                    if result != expected:
+                        errors.append(f"[{case}] {daily_result.date} trades不一致")
+                elif not is_same_value(result, expected):
+                    errors.append(
+                        f"[{case}] DailyResult {daily_result.date} {name} = {result!r}, 应为{expected!r}"
+                    )
+
+        for name, expected in expected_statistics.items():
+            result = statistics[name]
+
+            if not is_same_value(result, expected):
+                errors.append(f"[{case}] {name} = {result!r}, 应为{expected!r}")
+
+    return errors
+
+
+SPREAD_PRICETICKS = [1, 5, 0.2, 0.5, 0.01, 0.05, 2.5e-05]
+SPREAD_MULTIPLIERS = [-3, -2, -1, 1, 2, 3]
+SPREAD_MIN_VOLUMES = [1, 0.1, 0.01]
+SPREAD_CASES = 10
+
+
+def generate_spread(rng: np.random.Generator) -> SpreadData:
+    """
+    Spread of 2 to 4 legs with random priceticks, multipliers of both
+    signs and some inverse contracts.
+    """
+    legs = []
+    price_multipliers = {}
+    trading_multipliers = {}
+    inverse_contracts = {}
+
+    for i in range(int(rng.integers(2, 5))):
+        leg = LegData(f"LEG{i}.LOCAL")
+        leg.pricetick = float(rng.choice(SPREAD_PRICETICKS))
+        leg.size = int(rng.choice([1, 10, 100]))
+        legs.append(leg)
+
+        price_multipliers[leg.vt_symbol] = int(rng.choice(SPREAD_MULTIPLIERS))
+        trading_multipliers[leg.vt_symbol] = int(rng.choice(SPREAD_MULTIPLIERS))
+        inverse_contracts[leg.vt_symbol] = bool(rng.random() < 0.3)
+
+    return SpreadData(
+        "PARITY",
+        legs,
+        price_multipliers,
+        trading_multipliers,
+        legs[0].vt_symbol,
+        inverse_contracts,
+        float(rng.choice(SPREAD_MIN_VOLUMES))
+    )
+
+
+def update_leg(leg: LegData, rng: np.random.Generator) -> None:
+    """
+    Random quote of one leg, sometimes without price data.
+    """
+    if rng.random() < 0.1:
+        leg.bid_price = 0
+        leg.ask_price = 0
+        leg.bid_volume = 0
+        leg.ask_volume = 0
+        return
+
+    pricetick = leg.pricetick
+    ticks = int(rng.integers(1, 10000)) if pricetick >= 0.01 else int(rng.integers(1, 10 ** 6))
+    spread_ticks = int(rng.integers(1, 5))
+
+    leg.bid_price = round_to(ticks * pricetick, pricetick)
+    leg.ask_price = round_to((ticks + spread_ticks) * pricetick, pricetick)
+
+    if rng.random() < 0.5:
+        leg.bid_volume = int(rng.integers(1, 100))
+        leg.ask_volume = int(rng.integers(1, 100))
+    else:
+        leg.bid_volume = float(np.round(rng.random() * 100, 3))
+        leg.ask_volume = float(np.round(rng.random() * 100, 3))
+
+
+def calculate_spread_price_reference(spread: SpreadData) -> tuple:
+    """
+    Spread (bid price, ask price, bid volume, ask volume) calculated by
+    going through all legs with round_to and floor_to.
+    """
+    bid_price = 0
+    ask_price = 0
+    bid_volume = 0
+    ask_volume = 0
+
+    for n, leg in enumerate(spread.legs.values()):
+        # Filter not all leg price data has been received
+        if not leg.bid_volume or not leg.ask_volume:
+            return 0, 0, 0, 0
+
+        # Calculate price
+        price_multiplier = spread.price_multipliers[leg.vt_symbol]
+        if price_multiplier > 0:
+            bid_price += leg.bid_price * price_multiplier
+            ask_price += leg.ask_price * price_multiplier
+        else:
+            bid_price += leg.ask_price * price_multiplier
+            ask_price += leg.bid_price * price_multiplier
+
+        # Round price to pricetick
+        bid_price = round_to(bid_price, spread.pricetick)
+        ask_price = round_to(ask_price, spread.pricetick)
+
+        # Calculate volume
+        trading_multiplier = spread.trading_multipliers[leg.vt_symbol]
+        inverse_contract = spread.inverse_contracts[leg.vt_symbol]
+
+        if not inverse_contract:
+            leg_bid_volume = leg.bid_volume
+            leg_ask_volume = leg.ask_volume
+        else:
+            leg_bid_volume = calculate_inverse_volume(
+                leg.bid_volume, leg.bid_price, leg.size)
+            leg_ask_volume = calculate_inverse_volume(
+                leg.ask_volume, leg.ask_price, leg.size)
+
+        adjusted_bid_volume = floor_to(
+            leg_bid_volume / abs(trading_multiplier),
+            spread.min_volume
+        )
+        adjusted_ask_volume = floor_to(
+            leg_ask_volume / abs(trading_multiplier),
+            spread.min_volume
+        )
+
+        # For the first leg, just initialize
+        if not n:
+            bid_volume = adjusted_bid_volume
+            ask_volume = adjusted_ask_volume
+        # For following legs, use min value of each leg quoting volume
+        else:
+            bid_volume = min(bid_volume, adjusted_bid_volume)
+            ask_volume = min(ask_volume, adjusted_ask_volume)
+
+    return bid_price, ask_price, bid_volume, ask_volume
+
+
+def check_spread(count: int = 10000, seed: int = 0) -> List[str]:
+    """
+    Compare SpreadData.calculate_price updating terms of one leg with
+    calculation going through all legs, driven by random single leg
+    updates.
+    """
+    errors = []
+    rng = np.random.default_rng(seed)
+
+    for _ in range(SPREAD_CASES):
+        spread = generate_spread(rng)
+        legs = list(spread.legs.values())
+
+        case = ", ".join(
+            f"{leg.vt_symbol}: pricetick={leg.pricetick}, "
+            f"price={spread.price_multipliers[leg.vt_symbol]}, "
+            f"trading={spread.trading_multipliers[leg.vt_symbol]}, "
+            f"inverse={spread.inverse_contracts[leg.vt_symbol]}"
+            for leg in legs
+        ) + f", min_volume={spread.min_volume}"
+
+        for i in range(count):
+            leg = legs[int(rng.integers(len(legs)))]
+            update_leg(leg, rng)
+
+            # Full recalculation is also used, such as after reconnect
+            if i % 100 == 99:
+                spread.calculate_price()
+            else:
+                spread.calculate_price(leg.vt_symbol)
+
+            result = (spread.bid_price, spread.ask_price, spread.bid_volume, spread.ask_volume)
+            expected = calculate_spread_price_reference(spread)
+
+            if not all(is_same_value(a, b) for a, b in zip(result, expected)):
+                errors.append(f"[{case}] 第{i}次更新{leg.vt_symbol}：{result}，应为{expected}")
+
+    return errors
+
+
+CHECKS: Dict[str, Callable] = {
+    "rounder": check_rounder,
+    "pnl": check_pnl,
+    "spread": check_spread,
+}
+
+
+def main():
+    """"""
+    parser = argparse.ArgumentParser(description="Parity checks of optimized calculations")
+    parser.add_argument("--count", type=int, default=10000, help="random samples of each case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", type=str, action="append", help="run checks with name containing it")
+    args = parser.parse_args()
+
+    failed = False
+
+    for name, check in CHECKS.items():
+        if args.check and not any(s in name for s in args.check):
+            continue
+
+        errors = check(args.count, args.seed)
+
+        for msg in errors[:20]:
+            print(msg)
+
+        if errors:
+            print(f"{name}：不一致数量{len(errors)}")
+            failed = True
+        else:
+            print(f"{name}：结果一致")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
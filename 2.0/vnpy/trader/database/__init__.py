@@ -6,7 +6,10 @@ if TYPE_CHECKING:
 
 if "VNPY_TESTING" not in os.environ:
     from vnpy.trader.setting import get_settings
+    from vnpy.trader.utility import get_file_path
     from .initialize import init
+    from .tick_archive import TickArchive
 
     settings = get_settings("database.")
     database_manager: "BaseDatabaseManager" = init(settings=settings)
+    tick_archive: TickArchive = TickArchive(get_file_path("tick_archive"))
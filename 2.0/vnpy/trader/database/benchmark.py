@@ -0,0 +1,402 @@
+"""
+Storage benchmark for database drivers.
+
+Generate synthetic bar and tick data, then measure save/load/query
+performance of every available driver and output a json report, which
+can be compared across releases for tracking storage regressions.
+
+Drivers are created directly instead of using the global database
+manager, run with VNPY_TESTING set to skip initializing the latter:
+
+    VNPY_TESTING=1 python -m vnpy.trader.database.benchmark --output report.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+import vnpy
+from vnpy.trader.constant import Exchange, Interval
+from vnpy.trader.object import BarData, TickData
+
+from .database import BaseDatabaseManager, Driver, DB_TZ
+from .tick_archive import TickArchive
+
+
+SYMBOL = "BENCH"
+EXCHANGE = Exchange.LOCAL
+PRICETICK = 1
+
+
+def generate_bars(
+    count: int,
+    start: datetime = datetime(2015, 1, 5, 9),
+    seed: int = 0
+) -> List[BarData]:
+    """
+    Generate 1-minute bars from seeded random walk.
+    """
+    rng = random.Random(seed)
+    dt = DB_TZ.localize(start)
+    price = 3000
+    bars = []
+
+    for _ in range(count):
+        open_price = price
+        close_price = open_price + rng.randint(-5, 5) * PRICETICK
+        high_price = max(open_price, close_price) + rng.randint(0, 3) * PRICETICK
+        low_price = min(open_price, close_price) - rng.randint(0, 3) * PRICETICK
+
+        bar = BarData(
+            symbol=SYMBOL,
+            exchange=EXCHANGE,
+            datetime=dt,
+            interval=Interval.MINUTE,
+            volume=rng.randint(1, 1000),
+            open_interest=100000 + rng.randint(-100, 100),
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            gateway_name="DB"
+        )
+        bars.append(bar)
+
+        price = close_price
+        dt += timedelta(minutes=1)
+
+    return bars
+
+
+def generate_ticks(
+    count: int,
+    start: datetime = datetime(2015, 1, 5, 9),
+    seed: int = 0
+) -> List[TickData]:
+    """
+    Generate 500ms ticks with 5 depth levels from seeded random walk.
+    """
+    rng = random.Random(seed)
+    dt = DB_TZ.localize(start)
+    price = 3000
+    volume = 0
+    ticks = []
+
+    for _ in range(count):
+        price += rng.choice([-1, 0, 0, 1]) * PRICETICK
+        last_volume = rng.randint(0, 20)
+        volume += last_volume
+
+        tick = TickData(
+            symbol=SYMBOL,
+            exchange=EXCHANGE,
+            datetime=dt,
+            name=SYMBOL,
+            volume=volume,
+            open_interest=100000 + rng.randint(-100, 100),
+            last_price=price,
+            last_volume=last_volume,
+            limit_up=3300,
+            limit_down=2700,
+            open_price=3000,
+            high_price=3100,
+            low_price=2900,
+            pre_close=3000,
+            gateway_name="DB"
+        )
+
+        for n in range(1, 6):
+            setattr(tick, f"bid_price_{n}", price - n * PRICETICK)
+            setattr(tick, f"ask_price_{n}", price + n * PRICETICK)
+            setattr(tick, f"bid_volume_{n}", rng.randint(1, 100))
+            setattr(tick, f"ask_volume_{n}", rng.randint(1, 100))
+
+        ticks.append(tick)
+        dt += timedelta(milliseconds=500)
+
+    return ticks
+
+
+def measure(func: Callable, count: int = 1) -> dict:
+    """
+    Run function once and return elapsed seconds and processing rate.
+    """
+    start = perf_counter()
+    func()
+    seconds = perf_counter() - start
+
+    result = {"seconds": seconds, "count": count}
+    if seconds:
+        result["rate"] = count / seconds
+    return result
+
+
+def benchmark_manager(
+    manager: BaseDatabaseManager,
+    bars: List[BarData],
+    ticks: List[TickData],
+    batch_size: int,
+    single_count: int
+) -> Dict[str, dict]:
+    """
+    Measure all operations of a database manager.
+    """
+    results = {}
+    start = bars[0].datetime
+    end = bars[-1].datetime
+
+    def save_bars():
+        for i in range(0, len(bars), batch_size):
+            manager.save_bar_data(bars[i:i + batch_size])
+
+    def save_bars_single():
+        # Save one by one, same as DataRecorderEngine does
+        for bar in single_bars:
+            manager.save_bar_data([bar])
+
+    def save_ticks():
+        for i in range(0, len(ticks), batch_size):
+            manager.save_tick_data(ticks[i:i + batch_size])
+
+    single_bars = generate_bars(single_count, start=end.replace(tzinfo=None) + timedelta(minutes=1))
+
+    results["save_bar"] = measure(save_bars, len(bars))
+    results["save_bar_single"] = measure(save_bars_single, len(single_bars))
+    results["load_bar"] = measure(
+        lambda: manager.load_bar_data(SYMBOL, EXCHANGE, Interval.MINUTE, start, end),
+        len(bars)
+    )
+    results["load_bar_array"] = measure(
+        lambda: manager.load_bar_array(SYMBOL, EXCHANGE, Interval.MINUTE, start, end),
+        len(bars)
+    )
+    results["newest_bar"] = measure(
+        lambda: manager.get_newest_bar_data(SYMBOL, EXCHANGE, Interval.MINUTE)
+    )
+    results["oldest_bar"] = measure(
+        lambda: manager.get_oldest_bar_data(SYMBOL, EXCHANGE, Interval.MINUTE)
+    )
+    results["bar_overview"] = measure(manager.get_bar_overview)
+    results["bar_statistics"] = measure(manager.get_bar_data_statistics)
+
+    if ticks:
+        results["save_tick"] = measure(save_ticks, len(ticks))
+        results["load_tick"] = measure(
+            lambda: manager.load_tick_data(
+                SYMBOL, EXCHANGE, ticks[0].datetime, ticks[-1].datetime
+            ),
+            len(ticks)
+        )
+        results["newest_tick"] = measure(
+            lambda: manager.get_newest_tick_data(SYMBOL, EXCHANGE)
+        )
+
+    manager.clean(SYMBOL)
+    return results
+
+
+def benchmark_archive(path: Path, ticks: List[TickData], batch_size: int) -> Dict[str, dict]:
+    """
+    Measure tick archive, which only stores tick data.
+    """
+    archive = TickArchive(path)
+    results = {}
+
+    def save_ticks():
+        for i in range(0, len(ticks), batch_size):
+            archive.save_tick_data(ticks[i:i + batch_size], PRICETICK)
+
+    start = ticks[0].datetime
+    end = ticks[-1].datetime
+
+    results["save_tick"] = measure(save_ticks, len(ticks))
+    results["load_tick"] = measure(
+        lambda: archive.load_tick_data(SYMBOL, EXCHANGE, start, end),
+        len(ticks)
+    )
+    results["load_tick_array"] = measure(
+        lambda: archive.load_tick_array(SYMBOL, EXCHANGE, start, end),
+        len(ticks)
+    )
+
+    size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    results["disk_bytes_per_tick"] = {"count": len(ticks), "value": size / len(ticks)}
+
+    return results
+
+
+def create_sqlite(folder: Path) -> BaseDatabaseManager:
+    """"""
+    from .database_sql import init
+    return init(Driver.SQLITE, {"database": str(folder.joinpath("benchmark.db"))})
+
+
+def create_mongo(
+    settings: Optional[dict],
+    use_mongomock: bool
+) -> Optional[BaseDatabaseManager]:
+    """
+    Use real mongod if settings provided, otherwise in-process mongomock
+    if required. Mongomock only checks functionality, since its query
+    performance has nothing to do with mongod.
+    """
+    try:
+        from mongoengine import connect
+        from .database_mongo import MongoManager
+    except ImportError:
+        return None
+
+    if settings:
+        connect(**settings)
+    elif use_mongomock:
+        try:
+            import mongomock
+        except ImportError:
+            return None
+
+        connect(
+            "benchmark",
+            host="mongodb://localhost",
+            mongo_client_class=mongomock.MongoClient
+        )
+    else:
+        return None
+
+    return MongoManager()
+
+
+def create_postgresql(settings: Optional[dict]) -> Optional[BaseDatabaseManager]:
+    """
+    Use real server if settings provided, otherwise temporary server
+    started by testing.postgresql (when installed).
+    """
+    try:
+        from .database_sql import init
+    except ImportError:
+        return None
+
+    if not settings:
+        try:
+            import testing.postgresql
+        except ImportError:
+            return None
+
+        global _postgresql
+        _postgresql = testing.postgresql.Postgresql()
+        settings = _postgresql.dsn()
+
+    return init(Driver.POSTGRESQL, settings)
+
+
+_postgresql = None
+
+
+def run_benchmark(
+    bar_count: int = 100_000,
+    tick_count: int = 100_000,
+    batch_size: int = 10_000,
+    single_count: int = 1000,
+    mongo_settings: dict = None,
+    use_mongomock: bool = False,
+    postgresql_settings: dict = None,
+    output: Callable = print
+) -> dict:
+    """
+    Run benchmark for all available drivers and return report dict.
+    """
+    bars = generate_bars(bar_count)
+    ticks = generate_ticks(tick_count)
+
+    report = {
+        "vnpy_version": vnpy.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "datetime": datetime.now().isoformat(),
+        "parameters": {
+            "bar_count": bar_count,
+            "tick_count": tick_count,
+            "batch_size": batch_size,
+            "single_count": single_count,
+        },
+        "results": {},
+        "skipped": [],
+    }
+
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+
+        creators = {
+            "sqlite": lambda: create_sqlite(folder),
+            "mongodb": lambda: create_mongo(mongo_settings, use_mongomock),
+            "postgresql": lambda: create_postgresql(postgresql_settings),
+        }
+
+        for name, creator in creators.items():
+            output(f"开始测试：{name}")
+
+            try:
+                manager = creator()
+            except Exception as e:
+                output(f"{name}初始化失败：{e}")
+                manager = None
+
+            if not manager:
+                report["skipped"].append(name)
+                continue
+
+            report["results"][name] = benchmark_manager(
+                manager, bars, ticks, batch_size, single_count
+            )
+
+        output("开始测试：tick_archive")
+        report["results"]["tick_archive"] = benchmark_archive(
+            folder.joinpath("tick_archive"), ticks, batch_size
+        )
+
+    if _postgresql:
+        _postgresql.stop()
+
+    return report
+
+
+def main():
+    """"""
+    parser = argparse.ArgumentParser(description="Database storage benchmark")
+    parser.add_argument("--bars", type=int, default=100_000)
+    parser.add_argument("--ticks", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--single", type=int, default=1000)
+    parser.add_argument("--mongo", type=str, default="", help="json settings for mongoengine.connect")
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock when no mongo settings")
+    parser.add_argument("--postgresql", type=str, default="", help="json settings for postgresql")
+    parser.add_argument("--output", type=str, default="", help="json report file path")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        bar_count=args.bars,
+        tick_count=args.ticks,
+        batch_size=args.batch,
+        single_count=args.single,
+        mongo_settings=json.loads(args.mongo) if args.mongo else None,
+        use_mongomock=args.mongomock,
+        postgresql_settings=json.loads(args.postgresql) if args.postgresql else None,
+        output=lambda msg: print(msg, file=sys.stderr)
+    )
+
+    data = json.dumps(report, indent=4, default=str)
+    if args.output:
+        with open(args.output, mode="w", encoding="UTF-8") as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
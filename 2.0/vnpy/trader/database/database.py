@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from enum import Enum
 from typing import Optional, Sequence, List, Dict, TYPE_CHECKING
+
+import numpy as np
 from pytz import timezone
 
 from vnpy.trader.setting import SETTINGS
@@ -13,6 +15,144 @@ if TYPE_CHECKING:
 
 DB_TZ = timezone(SETTINGS["database.timezone"])
 
+BAR_ARRAY_FIELDS = [
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "open_interest",
+]
+
+
+def bars_to_array(bars: Sequence["BarData"]) -> Dict[str, np.ndarray]:
+    """
+    Convert a list of bar data into columnar numpy arrays.
+
+    Datetime column is stored as naive datetime64 in database timezone.
+    """
+    arrays = {
+        "datetime": np.array(
+            [bar.datetime.astimezone(DB_TZ).replace(tzinfo=None) for bar in bars],
+            dtype="datetime64[us]"
+        )
+    }
+
+    for name in BAR_ARRAY_FIELDS:
+        arrays[name] = np.array(
+            [getattr(bar, name) for bar in bars],
+            dtype=np.float64
+        )
+
+    return arrays
+
+
+def aggregate_bar_array(
+    arrays: Dict[str, np.ndarray],
+    window: int,
+    interval: "Interval"
+) -> Dict[str, np.ndarray]:
+    """
+    Aggregate 1-minute bar arrays into x-minute/x-hour bar arrays.
+
+    Follows the same rules as BarGenerator.update_bar, so that result is
+    identical to feeding the bars one by one into generator. Trailing bars
+    of an unfinished window are dropped.
+    """
+    from vnpy.trader.constant import Interval
+
+    dt = arrays["datetime"]
+
+    # Check which bar finishes a window bar
+    if interval == Interval.MINUTE:
+        minute = (dt.astype("datetime64[m]") - dt.astype("datetime64[h]")).astype(int)
+        finished = (minute + 1) % window == 0
+    elif interval == Interval.HOUR:
+        hour = (dt.astype("datetime64[h]") - dt.astype("datetime64[D]")).astype(int)
+
+        changed = np.zeros(len(dt), dtype=bool)
+        changed[1:] = hour[1:] != hour[:-1]
+        finished = changed & (np.cumsum(changed) % window == 0)
+    else:
+        raise ValueError(f"不支持的K线合成周期：{interval}")
+
+    ends = np.flatnonzero(finished)
+    if not len(ends):
+        result = {"datetime": np.array([], dtype="datetime64[us]")}
+        for name in BAR_ARRAY_FIELDS:
+            result[name] = np.array([], dtype=np.float64)
+        return result
+
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    size = ends[-1] + 1
+
+    if interval == Interval.MINUTE:
+        window_dt = dt[starts].astype("datetime64[m]")
+    else:
+        window_dt = dt[starts].astype("datetime64[h]")
+
+    return {
+        "datetime": window_dt.astype("datetime64[us]"),
+        "open_price": arrays["open_price"][starts],
+        "high_price": np.maximum.reduceat(arrays["high_price"][:size], starts),
+        "low_price": np.minimum.reduceat(arrays["low_price"][:size], starts),
+        "close_price": arrays["close_price"][ends],
+        "volume": np.add.reduceat(np.trunc(arrays["volume"][:size]), starts),
+        "open_interest": arrays["open_interest"][ends],
+    }
+
+
+def array_to_bars(
+    arrays: Dict[str, np.ndarray],
+    symbol: str,
+    exchange: "Exchange",
+    interval: "Interval" = None,
+    gateway_name: str = "DB"
+) -> List["BarData"]:
+    """
+    Convert numpy arrays back into a list of bar data.
+    """
+    from vnpy.trader.object import BarData
+
+    columns = [arrays[name].tolist() for name in BAR_ARRAY_FIELDS]
+    bars = []
+
+    for dt, values in zip(arrays["datetime"].tolist(), zip(*columns)):
+        open_price, high_price, low_price, close_price, volume, open_interest = values
+
+        bar = BarData(
+            symbol=symbol,
+            exchange=exchange,
+            datetime=DB_TZ.localize(dt),
+            interval=interval,
+            volume=volume,
+            open_interest=open_interest,
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            gateway_name=gateway_name
+        )
+        bars.append(bar)
+
+    return bars
+
+
+def aggregate_bars(
+    bars: Sequence["BarData"],
+    window: int,
+    interval: "Interval"
+) -> List["BarData"]:
+    """
+    Aggregate a list of 1-minute bars into x-minute/x-hour bars.
+    """
+    if not bars:
+        return []
+
+    bar = bars[0]
+    arrays = aggregate_bar_array(bars_to_array(bars), window, interval)
+    return array_to_bars(arrays, bar.symbol, bar.exchange, gateway_name=bar.gateway_name)
+
 
 class Driver(Enum):
     SQLITE = "sqlite"
@@ -34,6 +174,41 @@ class BaseDatabaseManager(ABC):
     ) -> Sequence["BarData"]:
         pass
 
+    def load_bar_array(
+        self,
+        symbol: str,
+        exchange: "Exchange",
+        interval: "Interval",
+        start: datetime,
+        end: datetime
+    ) -> Dict[str, np.ndarray]:
+        """
+        Load bar data as a dict of numpy arrays with datetime and
+        BAR_ARRAY_FIELDS columns. Drivers may override this with
+        a faster columnar query.
+        """
+        bars = self.load_bar_data(symbol, exchange, interval, start, end)
+        return bars_to_array(bars)
+
+    def load_window_bar_data(
+        self,
+        symbol: str,
+        exchange: "Exchange",
+        interval: "Interval",
+        window: int,
+        start: datetime,
+        end: datetime
+    ) -> List["BarData"]:
+        """
+        Load 1-minute bar data and aggregate into x-minute/x-hour bars
+        with the same rules as BarGenerator.
+        """
+        from vnpy.trader.constant import Interval
+
+        arrays = self.load_bar_array(symbol, exchange, Interval.MINUTE, start, end)
+        arrays = aggregate_bar_array(arrays, window, interval)
+        return array_to_bars(arrays, symbol, exchange)
+
     @abstractmethod
     def load_tick_data(
         self,
@@ -107,6 +282,22 @@ class BaseDatabaseManager(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_bar_overview(self) -> List[Dict]:
+        """
+        Return overview of bar data in database with a list of
+        symbol/exchange/interval/count/start/end, read from overview
+        records maintained on every write, without scanning bar data.
+        """
+        pass
+
+    @abstractmethod
+    def rebuild_bar_overview(self):
+        """
+        Rebuild overview records by scanning all bar data in database.
+        """
+        pass
+
     @abstractmethod
     def delete_bar_data(
         self,
@@ -1,13 +1,15 @@
+from collections import defaultdict
 from datetime import datetime
-from enum import Enum
-from typing import Optional, Sequence, List
+from typing import Optional, Sequence, List, Dict
 
+import numpy as np
 from mongoengine import DateTimeField, Document, FloatField, StringField, connect
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 
 from vnpy.trader.constant import Exchange, Interval
 from vnpy.trader.object import BarData, TickData
 
-from .database import BaseDatabaseManager, Driver, DB_TZ
+from .database import BaseDatabaseManager, Driver, DB_TZ, BAR_ARRAY_FIELDS
 
 
 def init(_: Driver, settings: dict):
@@ -35,6 +37,36 @@ def init(_: Driver, settings: dict):
     return MongoManager()
 
 
+# Max number of write operations sent in one bulk_write call
+BULK_SIZE = 10000
+
+TICK_FIELDS = [
+    "name",
+    "volume",
+    "open_interest",
+    "last_price",
+    "last_volume",
+    "limit_up",
+    "limit_down",
+    "open_price",
+    "high_price",
+    "low_price",
+    "pre_close",
+]
+for n in range(1, 6):
+    TICK_FIELDS.extend([
+        f"bid_price_{n}",
+        f"ask_price_{n}",
+        f"bid_volume_{n}",
+        f"ask_volume_{n}",
+    ])
+
+OVERVIEW_COLLECTION_NAME = "db_bar_overview"
+
+BAR_PROJECTION = {"_id": 0, "datetime": 1, **{k: 1 for k in BAR_ARRAY_FIELDS}}
+TICK_PROJECTION = {"_id": 0, "datetime": 1, **{k: 1 for k in TICK_FIELDS}}
+
+
 class DbBarData(Document):
     """
     Candlestick bar data for database storage.
@@ -192,6 +224,54 @@ class DbTickData(Document):
 
 
 class MongoManager(BaseDatabaseManager):
+    """
+    Mongo database manager based on raw pymongo collection operations.
+
+    Documents classes above are kept for defining collection schema,
+    while all read/write go through bulk_write and projection queries
+    to avoid the overhead of mongoengine document objects.
+    """
+
+    def __init__(self):
+        """"""
+        self.bar_collection = DbBarData._get_collection()
+        self.tick_collection = DbTickData._get_collection()
+        self.overview_collection = self.bar_collection.database[
+            OVERVIEW_COLLECTION_NAME
+        ]
+
+        self.bar_collection.create_index(
+            [
+                ("symbol", ASCENDING),
+                ("exchange", ASCENDING),
+                ("interval", ASCENDING),
+                ("datetime", ASCENDING),
+            ],
+            unique=True
+        )
+        self.tick_collection.create_index(
+            [
+                ("symbol", ASCENDING),
+                ("exchange", ASCENDING),
+                ("datetime", ASCENDING),
+            ],
+            unique=True
+        )
+        self.overview_collection.create_index(
+            [
+                ("symbol", ASCENDING),
+                ("exchange", ASCENDING),
+                ("interval", ASCENDING),
+            ],
+            unique=True
+        )
+
+        # Build overview for database created before overview collection exists
+        if (
+            not self.overview_collection.find_one()
+            and self.bar_collection.find_one()
+        ):
+            self.rebuild_bar_overview()
 
     def load_bar_data(
         self,
@@ -201,128 +281,300 @@ class MongoManager(BaseDatabaseManager):
         start: datetime,
         end: datetime,
     ) -> Sequence[BarData]:
-        s = DbBarData.objects(
-            symbol=symbol,
-            exchange=exchange.value,
-            interval=interval.value,
-            datetime__gte=start,
-            datetime__lte=end,
-        )
-        data = [db_bar.to_bar() for db_bar in s]
+        cursor = self.bar_collection.find(
+            self.bar_filter(symbol, exchange, interval, start, end),
+            BAR_PROJECTION
+        ).sort("datetime", ASCENDING)
+
+        data = [
+            self.to_bar(d, symbol, exchange, interval) for d in cursor
+        ]
         return data
 
+    def load_bar_array(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Decode projection query result into numpy arrays directly.
+        """
+        cursor = self.bar_collection.find(
+            self.bar_filter(symbol, exchange, interval, start, end),
+            BAR_PROJECTION
+        ).sort("datetime", ASCENDING)
+
+        columns = {k: [] for k in BAR_ARRAY_FIELDS}
+        datetimes = []
+
+        for d in cursor:
+            datetimes.append(d["datetime"])
+            for k, column in columns.items():
+                column.append(d.get(k, 0))
+
+        arrays = {"datetime": np.array(datetimes, dtype="datetime64[us]")}
+        for k, column in columns.items():
+            arrays[k] = np.array(column, dtype=np.float64)
+
+        return arrays
+
     def load_tick_data(
         self, symbol: str, exchange: Exchange, start: datetime, end: datetime
     ) -> Sequence[TickData]:
-        s = DbTickData.objects(
+        cursor = self.tick_collection.find(
+            {
+                "symbol": symbol,
+                "exchange": exchange.value,
+                "datetime": {"$gte": start, "$lte": end},
+            },
+            TICK_PROJECTION
+        ).sort("datetime", ASCENDING)
+
+        data = [self.to_tick(d, symbol, exchange) for d in cursor]
+        return data
+
+    @staticmethod
+    def bar_filter(
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime
+    ) -> dict:
+        """"""
+        return {
+            "symbol": symbol,
+            "exchange": exchange.value,
+            "interval": interval.value,
+            "datetime": {"$gte": start, "$lte": end},
+        }
+
+    @staticmethod
+    def to_bar(
+        d: dict,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval
+    ) -> BarData:
+        """
+        Generate BarData object from raw projection document.
+        """
+        d["datetime"] = d["datetime"].replace(tzinfo=DB_TZ)
+
+        bar = BarData(
             symbol=symbol,
-            exchange=exchange.value,
-            datetime__gte=start,
-            datetime__lte=end,
+            exchange=exchange,
+            interval=interval,
+            gateway_name="DB",
+            **d
         )
-        data = [db_tick.to_tick() for db_tick in s]
-        return data
+        return bar
 
     @staticmethod
-    def to_update_param(d) -> dict:
-        dt = d.datetime.astimezone(DB_TZ)
-        d.datetime = dt.replace(tzinfo=None)
+    def to_tick(d: dict, symbol: str, exchange: Exchange) -> TickData:
+        """
+        Generate TickData object from raw projection document.
+        """
+        d["datetime"] = d["datetime"].replace(tzinfo=DB_TZ)
 
-        param = {
-            "set__" + k: v.value if isinstance(v, Enum) else v
-            for k, v in d.__dict__.items()
-        }
-        return param
+        tick = TickData(
+            symbol=symbol,
+            exchange=exchange,
+            gateway_name="DB",
+            **d
+        )
+        return tick
+
+    @staticmethod
+    def to_db_datetime(dt: datetime) -> datetime:
+        """
+        Change datetime to database timezone, then remove tzinfo.
+        """
+        return dt.astimezone(DB_TZ).replace(tzinfo=None)
 
     def save_bar_data(self, datas: Sequence[BarData]):
-        for d in datas:
-            updates = self.to_update_param(d)
-            updates.pop("set__gateway_name")
-            updates.pop("set__vt_symbol")
-            (
-                DbBarData.objects(
-                    symbol=d.symbol, interval=d.interval.value, datetime=d.datetime
-                ).update_one(upsert=True, **updates)
-            )
+        requests = []
+        request_series = []
+        ranges = {}
+
+        for bar in datas:
+            dt = self.to_db_datetime(bar.datetime)
+            key = {
+                "symbol": bar.symbol,
+                "exchange": bar.exchange.value,
+                "interval": bar.interval.value,
+                "datetime": dt,
+            }
+            values = {k: getattr(bar, k) for k in BAR_ARRAY_FIELDS}
+            values.update(key)
+
+            requests.append(UpdateOne(key, {"$set": values}, upsert=True))
+
+            # Datetime range of each bar series in this batch
+            series = (key["symbol"], key["exchange"], key["interval"])
+            request_series.append(series)
+
+            if series in ranges:
+                start, end = ranges[series]
+                ranges[series] = (min(start, dt), max(end, dt))
+            else:
+                ranges[series] = (dt, dt)
+
+        # Upsert may overwrite existing bars, so only requests which
+        # inserted new document are counted as new bars. Bars inserted by
+        # other writers at the same time are not counted.
+        added = defaultdict(int)
+
+        for ix in self.bulk_write(self.bar_collection, requests):
+            added[request_series[ix]] += 1
+
+        for series, (start, end) in ranges.items():
+            self.update_bar_overview(series, start, end, added[series])
+
+    def update_bar_overview(
+        self,
+        series: tuple,
+        start: datetime,
+        end: datetime,
+        added: int
+    ):
+        """
+        Update overview of a series with newly saved bars atomically.
+        """
+        symbol, exchange, interval = series
+
+        self.overview_collection.update_one(
+            {"symbol": symbol, "exchange": exchange, "interval": interval},
+            {
+                "$inc": {"count": added},
+                "$min": {"start": start},
+                "$max": {"end": end},
+            },
+            upsert=True
+        )
 
     def save_tick_data(self, datas: Sequence[TickData]):
-        for d in datas:
-            updates = self.to_update_param(d)
-            updates.pop("set__gateway_name")
-            updates.pop("set__vt_symbol")
-            (
-                DbTickData.objects(
-                    symbol=d.symbol, exchange=d.exchange.value, datetime=d.datetime
-                ).update_one(upsert=True, **updates)
-            )
+        requests = []
+
+        for tick in datas:
+            key = {
+                "symbol": tick.symbol,
+                "exchange": tick.exchange.value,
+                "datetime": self.to_db_datetime(tick.datetime),
+            }
+            values = {k: getattr(tick, k) for k in TICK_FIELDS}
+            values.update(key)
+
+            requests.append(UpdateOne(key, {"$set": values}, upsert=True))
+
+        self.bulk_write(self.tick_collection, requests)
+
+    @staticmethod
+    def bulk_write(collection, requests: List[UpdateOne]) -> List[int]:
+        """
+        Send write requests in unordered batches, return indexes of
+        requests which inserted new document by upsert.
+        """
+        upserted = []
+
+        for i in range(0, len(requests), BULK_SIZE):
+            result = collection.bulk_write(requests[i:i + BULK_SIZE], ordered=False)
+            upserted.extend(i + ix for ix in result.upserted_ids)
+
+        return upserted
 
     def get_newest_bar_data(
         self, symbol: str, exchange: "Exchange", interval: "Interval"
     ) -> Optional["BarData"]:
-        s = (
-            DbBarData.objects(
-                symbol=symbol,
-                exchange=exchange.value,
-                interval=interval.value
-            )
-            .order_by("-datetime")
-            .first()
+        d = self.bar_collection.find_one(
+            {
+                "symbol": symbol,
+                "exchange": exchange.value,
+                "interval": interval.value
+            },
+            BAR_PROJECTION,
+            sort=[("datetime", DESCENDING)]
         )
-        if s:
-            return s.to_bar()
+        if d:
+            return self.to_bar(d, symbol, exchange, interval)
         return None
 
     def get_oldest_bar_data(
         self, symbol: str, exchange: "Exchange", interval: "Interval"
     ) -> Optional["BarData"]:
-        s = (
-            DbBarData.objects(
-                symbol=symbol,
-                exchange=exchange.value,
-                interval=interval.value
-            )
-            .order_by("+datetime")
-            .first()
+        d = self.bar_collection.find_one(
+            {
+                "symbol": symbol,
+                "exchange": exchange.value,
+                "interval": interval.value
+            },
+            BAR_PROJECTION,
+            sort=[("datetime", ASCENDING)]
         )
-        if s:
-            return s.to_bar()
+        if d:
+            return self.to_bar(d, symbol, exchange, interval)
         return None
 
     def get_newest_tick_data(
         self, symbol: str, exchange: "Exchange"
     ) -> Optional["TickData"]:
-        s = (
-            DbTickData.objects(symbol=symbol, exchange=exchange.value)
-            .order_by("-datetime")
-            .first()
+        d = self.tick_collection.find_one(
+            {"symbol": symbol, "exchange": exchange.value},
+            TICK_PROJECTION,
+            sort=[("datetime", DESCENDING)]
         )
-        if s:
-            return s.to_tick()
+        if d:
+            return self.to_tick(d, symbol, exchange)
         return None
 
     def get_bar_data_statistics(self) -> List:
         """"""
-        s = (
-            DbBarData.objects.aggregate({
+        return self.get_bar_overview()
+
+    def get_bar_overview(self) -> List[Dict]:
+        """"""
+        result = []
+
+        for d in self.overview_collection.find({}, {"_id": 0}):
+            d["start"] = d["start"].replace(tzinfo=DB_TZ)
+            d["end"] = d["end"].replace(tzinfo=DB_TZ)
+            result.append(d)
+
+        return result
+
+    def rebuild_bar_overview(self):
+        """"""
+        s = self.bar_collection.aggregate(
+            [{
                 "$group": {
                     "_id": {
                         "symbol": "$symbol",
                         "exchange": "$exchange",
                         "interval": "$interval",
                     },
-                    "count": {"$sum": 1}
+                    "count": {"$sum": 1},
+                    "start": {"$min": "$datetime"},
+                    "end": {"$max": "$datetime"},
                 }
-            })
+            }],
+            allowDiskUse=True
         )
 
-        result = []
+        overviews = []
 
         for d in s:
             data = d["_id"]
             data["count"] = d["count"]
-            result.append(data)
+            data["start"] = d["start"]
+            data["end"] = d["end"]
+            overviews.append(data)
 
-        return result
+        self.overview_collection.delete_many({})
+        if overviews:
+            self.overview_collection.insert_many(overviews)
 
     def delete_bar_data(
         self,
@@ -333,14 +585,18 @@ class MongoManager(BaseDatabaseManager):
         """
         Delete all bar data with given symbol + exchange + interval.
         """
-        count = DbBarData.objects(
-            symbol=symbol,
-            exchange=exchange.value,
-            interval=interval.value
-        ).delete()
+        series = {
+            "symbol": symbol,
+            "exchange": exchange.value,
+            "interval": interval.value
+        }
+
+        result = self.bar_collection.delete_many(series)
+        self.overview_collection.delete_one(series)
 
-        return count
+        return result.deleted_count
 
     def clean(self, symbol: str):
-        DbTickData.objects(symbol=symbol).delete()
-        DbBarData.objects(symbol=symbol).delete()
+        self.tick_collection.delete_many({"symbol": symbol})
+        self.bar_collection.delete_many({"symbol": symbol})
+        self.overview_collection.delete_many({"symbol": symbol})
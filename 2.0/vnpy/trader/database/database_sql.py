@@ -1,26 +1,34 @@
 """"""
+from contextlib import contextmanager
 from datetime import datetime
+from threading import Lock
+from time import perf_counter
 from typing import List, Dict, Optional, Sequence, Type
 
+import numpy as np
 from peewee import (
     AutoField,
     CharField,
+    IntegerField,
     Database,
     DateTimeField,
     FloatField,
     Model,
-    MySQLDatabase,
-    PostgresqlDatabase,
     SqliteDatabase,
     chunked,
     fn
 )
+from playhouse.pool import (
+    PooledDatabase,
+    PooledMySQLDatabase,
+    PooledPostgresqlDatabase
+)
 
 from vnpy.trader.constant import Exchange, Interval
 from vnpy.trader.object import BarData, TickData
 from vnpy.trader.utility import get_file_path
 
-from .database import BaseDatabaseManager, Driver, DB_TZ
+from .database import BaseDatabaseManager, Driver, DB_TZ, BAR_ARRAY_FIELDS
 
 
 def init(driver: Driver, settings: dict):
@@ -32,31 +40,117 @@ def init(driver: Driver, settings: dict):
     assert driver in init_funcs
 
     db = init_funcs[driver](settings)
-    bar, tick = init_models(db, driver)
-    return SqlManager(bar, tick)
+    bar, tick, overview = init_models(db, driver)
+    return SqlManager(bar, tick, overview)
+
+
+# Pragmas for allowing concurrent readers while recorder thread is writing
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "cache_size": -64 * 1000,       # 64MB page cache
+    "busy_timeout": 10 * 1000,      # wait 10s on locked database
+}
 
 
 def init_sqlite(settings: dict):
     database = settings["database"]
     path = str(get_file_path(database))
-    db = SqliteDatabase(path)
+    db = SqliteDatabase(path, pragmas=SQLITE_PRAGMAS)
     return db
 
 
 def init_mysql(settings: dict):
     keys = {"database", "user", "password", "host", "port"}
+    pool_settings = get_pool_settings(settings)
     settings = {k: v for k, v in settings.items() if k in keys}
-    db = MySQLDatabase(**settings)
+    db = MonitoredPooledMySQLDatabase(**settings, **pool_settings)
     return db
 
 
 def init_postgresql(settings: dict):
     keys = {"database", "user", "password", "host", "port"}
+    pool_settings = get_pool_settings(settings)
     settings = {k: v for k, v in settings.items() if k in keys}
-    db = PostgresqlDatabase(**settings)
+    db = MonitoredPooledPostgresqlDatabase(**settings, **pool_settings)
     return db
 
 
+def get_pool_settings(settings: dict) -> dict:
+    """
+    Generate connection pool parameters from database settings.
+    """
+    return {
+        "max_connections": settings.get("pool_size", 10),
+        "timeout": settings.get("pool_timeout", 10),
+        "stale_timeout": 300,
+    }
+
+
+class PoolMonitorMixin:
+    """
+    Record time spent on acquiring connection from pool.
+    """
+
+    def connect(self, reuse_if_open: bool = False):
+        """"""
+        start = perf_counter()
+        result = super().connect(reuse_if_open)
+        wait = perf_counter() - start
+
+        with self.monitor_lock:
+            self.connect_count += 1
+            self.wait_time_total += wait
+            self.wait_time_max = max(self.wait_time_max, wait)
+
+        return result
+
+    def init_monitor(self):
+        """"""
+        self.monitor_lock = Lock()
+        self.connect_count = 0
+        self.wait_time_total = 0
+        self.wait_time_max = 0
+
+    def get_pool_statistics(self) -> dict:
+        """
+        Return connection pool usage and wait time metrics (in seconds).
+        """
+        with self.monitor_lock:
+            if self.connect_count:
+                wait_time_avg = self.wait_time_total / self.connect_count
+            else:
+                wait_time_avg = 0
+
+            return {
+                "pool_size": self._max_connections,
+                "in_use": len(self._in_use),
+                "idle": len(self._connections),
+                "connect_count": self.connect_count,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_avg": wait_time_avg,
+                "wait_time_max": self.wait_time_max,
+            }
+
+
+class MonitoredPooledMySQLDatabase(PoolMonitorMixin, PooledMySQLDatabase):
+    """"""
+
+    def __init__(self, *args, **kwargs):
+        """"""
+        self.init_monitor()
+        super().__init__(*args, **kwargs)
+
+
+class MonitoredPooledPostgresqlDatabase(PoolMonitorMixin, PooledPostgresqlDatabase):
+    """"""
+
+    def __init__(self, *args, **kwargs):
+        """"""
+        self.init_monitor()
+        super().__init__(*args, **kwargs)
+
+
 class ModelBase(Model):
 
     def to_dict(self):
@@ -331,16 +425,91 @@ def init_models(db: Database, driver: Driver):
                     for c in chunked(dicts, 50):
                         DbTickData.insert_many(c).on_conflict_replace().execute()
 
-    db.connect()
-    db.create_tables([DbBarData, DbTickData])
-    return DbBarData, DbTickData
+    class DbBarOverview(ModelBase):
+        """
+        Overview of bar data stored in database, one record for each
+        symbol + exchange + interval, maintained on every write/delete.
+        """
+
+        id = AutoField()
+
+        symbol: str = CharField()
+        exchange: str = CharField()
+        interval: str = CharField()
+        count: int = IntegerField()
+        start: datetime = DateTimeField()
+        end: datetime = DateTimeField()
+
+        class Meta:
+            database = db
+            indexes = ((("symbol", "exchange", "interval"), True),)
+
+        def to_overview(self) -> dict:
+            """
+            Generate overview dict from DbBarOverview.
+            """
+            return {
+                "symbol": self.symbol,
+                "exchange": self.exchange,
+                "interval": self.interval,
+                "count": self.count,
+                "start": self.start.replace(tzinfo=DB_TZ),
+                "end": self.end.replace(tzinfo=DB_TZ),
+            }
+
+    with db.connection_context():
+        db.create_tables([DbBarData, DbTickData, DbBarOverview])
+    return DbBarData, DbTickData, DbBarOverview
 
 
 class SqlManager(BaseDatabaseManager):
 
-    def __init__(self, class_bar: Type[Model], class_tick: Type[Model]):
+    def __init__(
+        self,
+        class_bar: Type[Model],
+        class_tick: Type[Model],
+        class_overview: Type[Model]
+    ):
         self.class_bar = class_bar
         self.class_tick = class_tick
+        self.class_overview = class_overview
+
+        self.db: Database = class_bar._meta.database
+        self.pooled: bool = isinstance(self.db, PooledDatabase)
+
+        # Build overview for database created before overview table exists
+        with self.connection():
+            if (
+                not self.class_overview.select().exists()
+                and self.class_bar.select().exists()
+            ):
+                self.rebuild_bar_overview()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection from pool for current thread and return
+        it afterwards, so that threads never hold pooled connections
+        between operations. Non-pooled database (SQLite) keeps using
+        its thread-local connection.
+        """
+        if not self.pooled or not self.db.is_closed():
+            yield
+            return
+
+        self.db.connect()
+        try:
+            yield
+        finally:
+            self.db.close()
+
+    def get_pool_statistics(self) -> dict:
+        """
+        Return connection pool metrics, empty for non-pooled database.
+        """
+        if not self.pooled:
+            return {}
+        return self.db.get_pool_statistics()
 
     def load_bar_data(
         self,
@@ -361,9 +530,44 @@ class SqlManager(BaseDatabaseManager):
             )
             .order_by(self.class_bar.datetime)
         )
-        data = [db_bar.to_bar() for db_bar in s]
+        with self.connection():
+            data = [db_bar.to_bar() for db_bar in s]
         return data
 
+    def load_bar_array(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Select columns as tuples and convert into numpy arrays directly.
+        """
+        fields = [getattr(self.class_bar, name) for name in BAR_ARRAY_FIELDS]
+        s = (
+            self.class_bar.select(self.class_bar.datetime, *fields)
+                .where(
+                (self.class_bar.symbol == symbol)
+                & (self.class_bar.exchange == exchange.value)
+                & (self.class_bar.interval == interval.value)
+                & (self.class_bar.datetime >= start)
+                & (self.class_bar.datetime <= end)
+            )
+            .order_by(self.class_bar.datetime)
+            .tuples()
+        )
+        with self.connection():
+            rows = list(s)
+
+        columns = list(zip(*rows)) or [()] * (len(fields) + 1)
+
+        arrays = {"datetime": np.array(columns[0], dtype="datetime64[us]")}
+        for name, column in zip(BAR_ARRAY_FIELDS, columns[1:]):
+            arrays[name] = np.array(column, dtype=np.float64)
+        return arrays
+
     def load_tick_data(
         self, symbol: str, exchange: Exchange, start: datetime, end: datetime
     ) -> Sequence[TickData]:
@@ -378,30 +582,109 @@ class SqlManager(BaseDatabaseManager):
             .order_by(self.class_tick.datetime)
         )
 
-        data = [db_tick.to_tick() for db_tick in s]
+        with self.connection():
+            data = [db_tick.to_tick() for db_tick in s]
         return data
 
     def save_bar_data(self, datas: Sequence[BarData]):
         ds = [self.class_bar.from_bar(i) for i in datas]
-        self.class_bar.save_all(ds)
+
+        # Datetimes of each bar series in this batch
+        series_datetimes: Dict[tuple, set] = {}
+        for d in ds:
+            key = (d.symbol, d.exchange, d.interval)
+            series_datetimes.setdefault(key, set()).add(d.datetime)
+
+        with self.connection():
+            with self.db.atomic():
+                # Upsert may overwrite existing bars, so bars already saved
+                # at datetimes of batch are not counted as new bars.
+                added = {
+                    key: len(datetimes) - self.count_existing_bars(key, datetimes)
+                    for key, datetimes in series_datetimes.items()
+                }
+
+                self.class_bar.save_all(ds)
+
+                for key, datetimes in series_datetimes.items():
+                    self.update_bar_overview(
+                        key, min(datetimes), max(datetimes), added[key]
+                    )
+
+    def count_existing_bars(self, key: tuple, datetimes: set) -> int:
+        """
+        Count bars of a series already saved at given datetimes.
+        """
+        symbol, exchange, interval = key
+        count = 0
+
+        # Query in batches to stay within sqlite variable limit
+        for batch in chunked(sorted(datetimes), 500):
+            count += (
+                self.class_bar.select()
+                .where(
+                    (self.class_bar.symbol == symbol)
+                    & (self.class_bar.exchange == exchange)
+                    & (self.class_bar.interval == interval)
+                    & (self.class_bar.datetime.in_(batch))
+                )
+                .count()
+            )
+        return count
+
+    def update_bar_overview(
+        self,
+        key: tuple,
+        start: datetime,
+        end: datetime,
+        added: int
+    ):
+        """
+        Update overview of a series with newly saved bars.
+        """
+        symbol, exchange, interval = key
+
+        overview = self.class_overview.get_or_none(
+            (self.class_overview.symbol == symbol)
+            & (self.class_overview.exchange == exchange)
+            & (self.class_overview.interval == interval)
+        )
+
+        if not overview:
+            overview = self.class_overview(
+                symbol=symbol,
+                exchange=exchange,
+                interval=interval,
+                count=added,
+                start=start,
+                end=end
+            )
+        else:
+            overview.count += added
+            overview.start = min(overview.start, start)
+            overview.end = max(overview.end, end)
+
+        overview.save()
 
     def save_tick_data(self, datas: Sequence[TickData]):
         ds = [self.class_tick.from_tick(i) for i in datas]
-        self.class_tick.save_all(ds)
+        with self.connection():
+            self.class_tick.save_all(ds)
 
     def get_newest_bar_data(
         self, symbol: str, exchange: "Exchange", interval: "Interval"
     ) -> Optional["BarData"]:
-        s = (
-            self.class_bar.select()
-                .where(
-                (self.class_bar.symbol == symbol)
-                & (self.class_bar.exchange == exchange.value)
-                & (self.class_bar.interval == interval.value)
+        with self.connection():
+            s = (
+                self.class_bar.select()
+                    .where(
+                    (self.class_bar.symbol == symbol)
+                    & (self.class_bar.exchange == exchange.value)
+                    & (self.class_bar.interval == interval.value)
+                )
+                .order_by(self.class_bar.datetime.desc())
+                .first()
             )
-            .order_by(self.class_bar.datetime.desc())
-            .first()
-        )
         if s:
             return s.to_bar()
         return None
@@ -409,16 +692,17 @@ class SqlManager(BaseDatabaseManager):
     def get_oldest_bar_data(
         self, symbol: str, exchange: "Exchange", interval: "Interval"
     ) -> Optional["BarData"]:
-        s = (
-            self.class_bar.select()
-                .where(
-                (self.class_bar.symbol == symbol)
-                & (self.class_bar.exchange == exchange.value)
-                & (self.class_bar.interval == interval.value)
+        with self.connection():
+            s = (
+                self.class_bar.select()
+                    .where(
+                    (self.class_bar.symbol == symbol)
+                    & (self.class_bar.exchange == exchange.value)
+                    & (self.class_bar.interval == interval.value)
+                )
+                .order_by(self.class_bar.datetime.asc())
+                .first()
             )
-            .order_by(self.class_bar.datetime.asc())
-            .first()
-        )
         if s:
             return s.to_bar()
         return None
@@ -426,45 +710,53 @@ class SqlManager(BaseDatabaseManager):
     def get_newest_tick_data(
         self, symbol: str, exchange: "Exchange"
     ) -> Optional["TickData"]:
-        s = (
-            self.class_tick.select()
-                .where(
-                (self.class_tick.symbol == symbol)
-                & (self.class_tick.exchange == exchange.value)
+        with self.connection():
+            s = (
+                self.class_tick.select()
+                    .where(
+                    (self.class_tick.symbol == symbol)
+                    & (self.class_tick.exchange == exchange.value)
+                )
+                .order_by(self.class_tick.datetime.desc())
+                .first()
             )
-            .order_by(self.class_tick.datetime.desc())
-            .first()
-        )
         if s:
             return s.to_tick()
         return None
 
     def get_bar_data_statistics(self) -> List[Dict]:
+        """"""
+        return self.get_bar_overview()
+
+    def get_bar_overview(self) -> List[Dict]:
+        """"""
+        with self.connection():
+            result = [o.to_overview() for o in self.class_overview.select()]
+        return result
+
+    def rebuild_bar_overview(self):
         """"""
         s = (
             self.class_bar.select(
                 self.class_bar.symbol,
                 self.class_bar.exchange,
                 self.class_bar.interval,
-                fn.COUNT(self.class_bar.id).alias("count")
+                fn.COUNT(self.class_bar.id).alias("count"),
+                fn.MIN(self.class_bar.datetime).alias("start"),
+                fn.MAX(self.class_bar.datetime).alias("end")
             ).group_by(
                 self.class_bar.symbol,
                 self.class_bar.exchange,
                 self.class_bar.interval
-            )
+            ).dicts()
         )
 
-        result = []
-
-        for data in s:
-            result.append({
-                "symbol": data.symbol,
-                "exchange": data.exchange,
-                "interval": data.interval,
-                "count": data.count
-            })
+        with self.connection():
+            with self.db.atomic():
+                self.class_overview.delete().execute()
 
-        return result
+                for c in chunked(list(s), 50):
+                    self.class_overview.insert_many(c).execute()
 
     def delete_bar_data(
         self,
@@ -480,9 +772,21 @@ class SqlManager(BaseDatabaseManager):
             & (self.class_bar.exchange == exchange.value)
             & (self.class_bar.interval == interval.value)
         )
-        count = query.execute()
+        with self.connection():
+            with self.db.atomic():
+                count = query.execute()
+
+                self.class_overview.delete().where(
+                    (self.class_overview.symbol == symbol)
+                    & (self.class_overview.exchange == exchange.value)
+                    & (self.class_overview.interval == interval.value)
+                ).execute()
         return count
 
     def clean(self, symbol: str):
-        self.class_bar.delete().where(self.class_bar.symbol == symbol).execute()
-        self.class_tick.delete().where(self.class_tick.symbol == symbol).execute()
+        with self.connection():
+            self.class_bar.delete().where(self.class_bar.symbol == symbol).execute()
+            self.class_tick.delete().where(self.class_tick.symbol == symbol).execute()
+            self.class_overview.delete().where(
+                self.class_overview.symbol == symbol
+            ).execute()
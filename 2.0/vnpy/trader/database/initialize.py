@@ -12,7 +12,7 @@ def init(settings: dict) -> BaseDatabaseManager:
 
 def init_sql(driver: Driver, settings: dict):
     from .database_sql import init
-    keys = {'database', "host", "port", "user", "password"}
+    keys = {"database", "host", "port", "user", "password", "pool_size", "pool_timeout"}
     settings = {k: v for k, v in settings.items() if k in keys}
     _database_manager = init(driver, settings)
     return _database_manager
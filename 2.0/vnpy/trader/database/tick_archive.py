@@ -0,0 +1,433 @@
+"""
+Compressed tick data archive.
+
+Ticks are stored in one file per symbol per calendar date of tick
+datetime in database timezone, so that night session ticks after
+midnight are in the file of next date. Each file contains one or more
+appended blocks. Each block is columnar:
+    * datetime and values on price tick grid are delta encoded from first
+      value kept in column meta, zigzag mapped into unsigned integers and
+      narrowed to smallest dtype
+    * depth level columns are run-length encoded when unchanged
+    * values not on grid are kept as raw float64
+    * whole payload is compressed with zlib
+"""
+
+import json
+import struct
+import zlib
+from dataclasses import fields
+from datetime import date, datetime, timedelta
+from operator import attrgetter
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from vnpy.trader.constant import Exchange
+from vnpy.trader.object import TickData
+from vnpy.trader.utility import get_digits
+
+from .database import DB_TZ
+
+
+MAGIC = b"VTK1"
+SUFFIX = ".vtk"
+
+DEPTH_FIELDS = []
+for n in range(1, 6):
+    DEPTH_FIELDS.extend([
+        f"bid_price_{n}",
+        f"ask_price_{n}",
+        f"bid_volume_{n}",
+        f"ask_volume_{n}",
+    ])
+
+PRICE_FIELDS = [
+    "last_price",
+    "limit_up",
+    "limit_down",
+    "open_price",
+    "high_price",
+    "low_price",
+    "pre_close",
+] + [f for f in DEPTH_FIELDS if "price" in f]
+
+TICK_FIELDS = [
+    "volume",
+    "open_interest",
+    "last_volume",
+    "last_price",
+    "limit_up",
+    "limit_down",
+    "open_price",
+    "high_price",
+    "low_price",
+    "pre_close",
+] + DEPTH_FIELDS
+
+# Numeric fields in the same order as TickData definition,
+# for creating TickData objects with positional arguments.
+TICK_ORDERED_FIELDS = [f.name for f in fields(TickData) if f.name in TICK_FIELDS]
+
+UINT_DTYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """
+    Map signed int64 into uint64 so that small magnitude has small code.
+    """
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(codes: np.ndarray) -> np.ndarray:
+    """"""
+    codes = codes.astype(np.uint64)
+    return ((codes >> np.uint64(1)).astype(np.int64) ^ -(codes & np.uint64(1)).astype(np.int64))
+
+
+def narrow_uint(codes: np.ndarray) -> np.ndarray:
+    """
+    Cast uint64 array into smallest unsigned dtype holding all values.
+    """
+    max_code = int(codes.max()) if len(codes) else 0
+
+    for dtype in UINT_DTYPES:
+        if max_code <= np.iinfo(dtype).max:
+            return codes.astype(dtype)
+
+
+def rle_encode(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return run values and run lengths.
+    """
+    if not len(values):
+        return values, np.zeros(0, dtype=np.uint32)
+
+    change = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [len(values)])))
+    return values[starts], lengths.astype(np.uint32)
+
+
+def rle_decode(run_values: np.ndarray, run_lengths: np.ndarray) -> np.ndarray:
+    """"""
+    return np.repeat(run_values, run_lengths)
+
+
+def to_grid(values: np.ndarray, pricetick: float) -> np.ndarray:
+    """
+    Convert values into int64 multiples of pricetick, return None if any
+    value can not be restored exactly from the grid.
+    """
+    if not pricetick or not np.isfinite(values).all():
+        return None
+
+    ticks = np.round(values / pricetick)
+    if np.abs(ticks).max(initial=0) >= 2 ** 62:
+        return None
+
+    ticks = ticks.astype(np.int64)
+    digits = get_digits(pricetick)
+    if not np.array_equal(np.round(ticks * pricetick, digits), values):
+        return None
+
+    return ticks
+
+
+def encode_column(values: np.ndarray, scale: float, rle: bool) -> Tuple[dict, List[bytes]]:
+    """
+    Encode one column into (meta, buffers).
+    """
+    ticks = to_grid(values, scale)
+
+    if ticks is None:
+        return {"mode": "float"}, [values.astype(np.float64).tobytes()]
+
+    # First value is kept in meta, so that it does not widen dtype of deltas
+    first = int(ticks[0]) if len(ticks) else 0
+    deltas = np.diff(ticks, prepend=np.int64(first))
+    codes = narrow_uint(zigzag_encode(deltas))
+
+    if rle:
+        run_values, run_lengths = rle_encode(codes)
+
+        # Only use RLE when it is actually smaller
+        if run_values.nbytes + run_lengths.nbytes < codes.nbytes:
+            meta = {
+                "mode": "rle",
+                "scale": scale,
+                "dtype": codes.dtype.str,
+                "runs": len(run_values),
+                "first": first,
+            }
+            return meta, [run_values.tobytes(), run_lengths.tobytes()]
+
+    meta = {"mode": "delta", "scale": scale, "dtype": codes.dtype.str, "first": first}
+    return meta, [codes.tobytes()]
+
+
+def decode_deltas(meta: dict, codes: np.ndarray) -> np.ndarray:
+    """
+    Restore int64 values from zigzag delta codes. Blocks written without
+    first value in meta are delta encoded from 0.
+    """
+    return np.cumsum(zigzag_decode(codes)) + meta.get("first", 0)
+
+
+def decode_column(meta: dict, payload: memoryview, offset: int, count: int) -> Tuple[np.ndarray, int]:
+    """
+    Decode one column starting from offset, return (values, new offset).
+    """
+    mode = meta["mode"]
+
+    if mode == "float":
+        values = np.frombuffer(payload, np.float64, count, offset)
+        return values.copy(), offset + values.nbytes
+
+    dtype = np.dtype(meta["dtype"])
+
+    if mode == "rle":
+        runs = meta["runs"]
+        run_values = np.frombuffer(payload, dtype, runs, offset)
+        offset += run_values.nbytes
+        run_lengths = np.frombuffer(payload, np.uint32, runs, offset)
+        offset += run_lengths.nbytes
+        codes = rle_decode(run_values, run_lengths)
+    else:
+        codes = np.frombuffer(payload, dtype, count, offset)
+        offset += codes.nbytes
+
+    ticks = decode_deltas(meta, codes)
+
+    scale = meta["scale"]
+    if scale == 1:
+        values = ticks.astype(np.float64)
+    else:
+        values = np.round(ticks * scale, get_digits(scale))
+
+    return values, offset
+
+
+def encode_block(ticks: Sequence[TickData], pricetick: float) -> bytes:
+    """
+    Encode a list of ticks of the same symbol into one block.
+    """
+    dts = np.array(
+        [to_db_datetime(tick.datetime) for tick in ticks],
+        dtype="datetime64[us]"
+    ).astype(np.int64)
+
+    # Datetime is encoded from int64 directly to keep microsecond precision
+    first = int(dts[0])
+    codes = narrow_uint(zigzag_encode(np.diff(dts, prepend=np.int64(first))))
+    metas = {
+        "datetime": {"mode": "delta", "scale": 1, "dtype": codes.dtype.str, "first": first}
+    }
+    buffers = [codes.tobytes()]
+
+    getter = attrgetter(*TICK_FIELDS)
+    matrix = np.array([getter(tick) for tick in ticks], dtype=np.float64)
+
+    for i, name in enumerate(TICK_FIELDS):
+        values = matrix[:, i]
+
+        if name in PRICE_FIELDS:
+            scale = pricetick
+        else:
+            scale = 1
+
+        meta, column_buffers = encode_column(values, scale, name in DEPTH_FIELDS)
+        metas[name] = meta
+        buffers.extend(column_buffers)
+
+    header = {
+        "symbol": ticks[0].symbol,
+        "exchange": ticks[0].exchange.value,
+        "name": ticks[0].name,
+        "count": len(ticks),
+        "pricetick": pricetick,
+        "columns": metas,
+    }
+
+    header_data = json.dumps(header).encode("UTF-8")
+    payload_data = zlib.compress(b"".join(buffers))
+
+    return b"".join([
+        MAGIC,
+        struct.pack("<I", len(header_data)),
+        header_data,
+        struct.pack("<I", len(payload_data)),
+        payload_data,
+    ])
+
+
+def decode_blocks(data: bytes) -> List[Tuple[dict, Dict[str, np.ndarray]]]:
+    """
+    Decode all blocks in a file into (header, arrays) pairs.
+    """
+    blocks = []
+    offset = 0
+
+    while offset < len(data):
+        if data[offset:offset + 4] != MAGIC:
+            raise ValueError("Tick archive file corrupted")
+        offset += 4
+
+        header_size = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        header = json.loads(data[offset:offset + header_size].decode("UTF-8"))
+        offset += header_size
+
+        payload_size = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        payload = memoryview(zlib.decompress(data[offset:offset + payload_size]))
+        offset += payload_size
+
+        count = header["count"]
+        arrays = {}
+        column_offset = 0
+
+        for name, meta in header["columns"].items():
+            if name == "datetime":
+                codes = np.frombuffer(payload, np.dtype(meta["dtype"]), count, column_offset)
+                column_offset += codes.nbytes
+                arrays[name] = decode_deltas(meta, codes).astype("datetime64[us]")
+            else:
+                arrays[name], column_offset = decode_column(meta, payload, column_offset, count)
+
+        blocks.append((header, arrays))
+
+    return blocks
+
+
+def to_db_datetime(dt: datetime) -> datetime:
+    """
+    Change datetime to database timezone, then remove tzinfo.
+    """
+    if dt.tzinfo:
+        dt = dt.astimezone(DB_TZ)
+    return dt.replace(tzinfo=None)
+
+
+class TickArchive:
+    """
+    File based compressed tick data storage.
+    """
+
+    def __init__(self, path: Path):
+        """"""
+        self.path: Path = Path(path)
+
+    def get_file_path(self, symbol: str, exchange: Exchange, day: date) -> Path:
+        """"""
+        return self.path.joinpath(
+            exchange.value,
+            symbol,
+            day.strftime("%Y%m%d") + SUFFIX
+        )
+
+    def save_tick_data(self, ticks: Sequence[TickData], pricetick: float = 0):
+        """
+        Append ticks into archive files. Prices are stored on pricetick grid
+        if provided, otherwise raw float value is kept.
+        """
+        # Group ticks by symbol and calendar date in database timezone
+        groups: Dict[Tuple, List[TickData]] = {}
+
+        for tick in ticks:
+            day = to_db_datetime(tick.datetime).date()
+            key = (tick.symbol, tick.exchange, day)
+            groups.setdefault(key, []).append(tick)
+
+        for (symbol, exchange, day), day_ticks in groups.items():
+            file_path = self.get_file_path(symbol, exchange, day)
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+
+            block = encode_block(day_ticks, pricetick)
+            with open(file_path, "ab") as f:
+                f.write(block)
+
+    def load_tick_array(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        start: datetime,
+        end: datetime
+    ) -> Dict[str, np.ndarray]:
+        """
+        Load ticks as numpy arrays of datetime (naive in database timezone)
+        and TICK_FIELDS, sorted by datetime with duplicates removed.
+        """
+        start = to_db_datetime(start)
+        end = to_db_datetime(end)
+
+        parts: Dict[str, List[np.ndarray]] = {k: [] for k in ["datetime"] + TICK_FIELDS}
+        names: List[np.ndarray] = []
+
+        day = start.date()
+        while day <= end.date():
+            file_path = self.get_file_path(symbol, exchange, day)
+            day += timedelta(days=1)
+
+            if not file_path.exists():
+                continue
+
+            with open(file_path, "rb") as f:
+                data = f.read()
+
+            for header, arrays in decode_blocks(data):
+                for k, v in arrays.items():
+                    parts[k].append(v)
+                names.append(np.full(header["count"], header["name"], dtype=object))
+
+        if not names:
+            result = {k: np.zeros(0, dtype=np.float64) for k in TICK_FIELDS}
+            result["datetime"] = np.zeros(0, dtype="datetime64[us]")
+            result["name"] = np.zeros(0, dtype=object)
+            return result
+
+        result = {k: np.concatenate(v) for k, v in parts.items()}
+        result["name"] = np.concatenate(names)
+
+        # Sort by datetime and keep last one of duplicated timestamps
+        dts = result["datetime"]
+        if len(dts) > 1 and not (dts[1:] > dts[:-1]).all():
+            order = np.argsort(dts, kind="stable")
+            dts = dts[order]
+            keep = np.append(dts[1:] != dts[:-1], True)
+            index = order[keep]
+            result = {k: v[index] for k, v in result.items()}
+            dts = result["datetime"]
+
+        # Filter datetime range
+        mask = (dts >= np.datetime64(start, "us")) & (dts <= np.datetime64(end, "us"))
+        if not mask.all():
+            result = {k: v[mask] for k, v in result.items()}
+
+        return result
+
+    def load_tick_data(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        start: datetime,
+        end: datetime
+    ) -> List[TickData]:
+        """
+        Load ticks from archive and generate TickData objects.
+        """
+        arrays = self.load_tick_array(symbol, exchange, start, end)
+
+        dts = [
+            dt.replace(tzinfo=DB_TZ)
+            for dt in arrays["datetime"].astype(datetime)
+        ]
+        names = arrays["name"]
+        columns = [arrays[k].tolist() for k in TICK_ORDERED_FIELDS]
+
+        ticks = [
+            TickData("DB", symbol, exchange, dts[i], names[i], *values)
+            for i, values in enumerate(zip(*columns))
+        ]
+        return ticks
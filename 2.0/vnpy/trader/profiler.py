@@ -0,0 +1,201 @@
+"""
+Low overhead profiler of backtesting engines.
+
+Engine stages, strategy callbacks and indicator methods of ArrayManager
+are replaced by timers on the instance only, so that nothing changes
+when profiling is not enabled. Each timer counts calls, total time and
+self time (excluding time of other timed methods called inside), and
+all timers are removed after backtesting replay.
+"""
+
+import inspect
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Sequence
+
+from .utility import ArrayManager, BarGenerator
+
+
+ARRAY_MANAGER_METHODS = [
+    name for name, value in vars(ArrayManager).items()
+    if inspect.isfunction(value) and not name.startswith("_")
+]
+
+MISSING = object()
+
+
+class TimedMethod:
+    """
+    Callable replacing method of instance for timing.
+    """
+
+    __slots__ = ("func", "record", "stack")
+
+    def __init__(self, func: Callable, record: list, stack: list):
+        """"""
+        self.func = func
+        self.record = record
+        self.stack = stack
+
+    def __call__(self, *args, **kwargs):
+        """"""
+        stack = self.stack
+        stack.append(0.0)
+        start = perf_counter()
+
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            child_time = stack.pop()
+
+            record = self.record
+            record[0] += 1
+            record[1] += elapsed
+            record[2] += elapsed - child_time
+
+            if stack:
+                stack[-1] += elapsed
+
+    def __reduce__(self):
+        """
+        Pickled as the original function, so that strategy can still be
+        saved into checkpoint during profiling.
+        """
+        return get_original_func, (self.func,)
+
+
+class BacktestingProfiler:
+    """
+    Wrap engine and strategy, then call start and stop around replay.
+    """
+
+    def __init__(self):
+        """"""
+        self.records: Dict[str, list] = {}      # name: [count, total time, self time]
+        self.stack: List[float] = []
+        self.patches: List[tuple] = []
+
+        self.start_time = 0
+        self.total_time = 0
+
+    def wrap(self, obj: Any, name: str, record_name: str) -> None:
+        """
+        Replace method or callback attribute of object with timer.
+        """
+        func = getattr(obj, name, None)
+        if not callable(func) or isinstance(func, TimedMethod):
+            return
+
+        record = self.records.setdefault(record_name, [0, 0.0, 0.0])
+        self.patches.append((obj, name, vars(obj).get(name, MISSING)))
+        setattr(obj, name, TimedMethod(func, record, self.stack))
+
+    def wrap_engine(self, engine: Any, names: Sequence[str]) -> None:
+        """"""
+        for name in names:
+            self.wrap(engine, name, f"engine.{name}")
+
+    def wrap_strategy(self, strategy: Any, names: Sequence[str]) -> None:
+        """
+        Wrap callbacks of strategy, together with window bar callbacks of
+        BarGenerator and indicators of ArrayManager used by strategy.
+        """
+        for name in names:
+            self.wrap(strategy, name, f"strategy.{name}")
+
+        for value in list(vars(strategy).values()):
+            if isinstance(value, dict):
+                objs = list(value.values())
+            elif isinstance(value, (list, tuple)):
+                objs = value
+            else:
+                objs = [value]
+
+            for obj in objs:
+                if isinstance(obj, BarGenerator):
+                    for name in ["on_bar", "on_window_bar"]:
+                        func = getattr(obj, name)
+                        func_name = getattr(func, "__name__", name)
+                        self.wrap(obj, name, f"strategy.{func_name}")
+                elif isinstance(obj, ArrayManager):
+                    for name in ARRAY_MANAGER_METHODS:
+                        self.wrap(obj, name, f"ArrayManager.{name}")
+
+    def start(self) -> None:
+        """"""
+        self.start_time = perf_counter()
+
+    def stop(self) -> None:
+        """
+        Stop timing and remove all timers.
+        """
+        if self.start_time:
+            self.total_time += perf_counter() - self.start_time
+            self.start_time = 0
+
+        for obj, name, original in reversed(self.patches):
+            if original is MISSING:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self.patches.clear()
+
+    def get_report(self) -> List[dict]:
+        """
+        Return time of each record sorted by self time, with time not
+        spent in any timed method as engine.loop.
+        """
+        report = []
+        self_time_sum = 0
+
+        for name, (count, total_time, self_time) in self.records.items():
+            if not count:
+                continue
+
+            report.append({
+                "name": name,
+                "count": count,
+                "total_time": total_time,
+                "self_time": self_time,
+            })
+            self_time_sum += self_time
+
+        report.append({
+            "name": "engine.loop",
+            "count": 0,
+            "total_time": self.total_time,
+            "self_time": max(self.total_time - self_time_sum, 0),
+        })
+
+        for row in report:
+            if self.total_time:
+                row["percent"] = row["self_time"] / self.total_time * 100
+            else:
+                row["percent"] = 0
+
+        report.sort(reverse=True, key=lambda row: row["self_time"])
+        return report
+
+    def output_report(self, output: Callable) -> None:
+        """"""
+        output("-" * 30)
+        output(f"回放总耗时：\t{self.total_time:.3f}秒")
+
+        for row in self.get_report():
+            if row["count"]:
+                per_call = row["total_time"] / row["count"] * 1_000_000
+                count_str = f"调用{row['count']}次，单次{per_call:.2f}微秒，"
+            else:
+                count_str = ""
+
+            output(
+                f"{row['name']}：\t{count_str}总耗时{row['total_time']:.3f}秒，"
+                f"自身耗时{row['self_time']:.3f}秒（{row['percent']:.1f}%）"
+            )
+
+
+def get_original_func(func: Callable) -> Callable:
+    """
+    Used for unpickling TimedMethod.
+    """
+    return func
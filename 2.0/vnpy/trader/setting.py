@@ -35,6 +35,11 @@ SETTINGS: Dict[str, Any] = {
     "database.user": "root",
     "database.password": "",
     "database.authentication_source": "admin",  # for mongodb
+    "database.pool_size": 10,                   # for mysql/postgresql connection pool
+    "database.pool_timeout": 10,                # seconds to wait for free pooled connection
+    "database.tick_archive": False,             # store tick data in compressed archive files
+
+    "backtester.cache_size": 1024,              # MB of backtesting result cache, 0 to disable
 }
 
 # Load global setting from json file.
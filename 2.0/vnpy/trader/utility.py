@@ -5,10 +5,13 @@ General utility functions.
 import json
 import logging
 import sys
+from datetime import datetime
 from pathlib import Path
-from typing import Callable, Dict, Tuple, Union
+from typing import Callable, Dict, Iterable, Iterator, Tuple, Union
 from decimal import Decimal
+from itertools import islice
 from math import floor, ceil
+from operator import attrgetter
 
 import numpy as np
 import talib
@@ -147,6 +150,94 @@ def ceil_to(value: float, target: float) -> float:
     return result
 
 
+class Rounder:
+    """
+    Round value to multiple of a fixed target, giving the same result as
+    round_to, floor_to and ceil_to. Target is converted into integer units
+    of its decimal scale only once, and Decimal is used only if quotient
+    of float division is too close to the rounding boundary.
+    """
+
+    __slots__ = ("target", "units", "scale")
+
+    def __init__(self, target: float):
+        """"""
+        # Scale from Decimal exponent also works for scientific notation
+        exponent = Decimal(str(target)).as_tuple().exponent
+
+        self.target: float = target
+        self.scale: int = 10 ** max(-exponent, 0)
+        self.units: int = int(Decimal(str(target)) * self.scale)
+
+    def to_float(self, count: int) -> float:
+        """
+        Float value of count times target, correctly rounded as Decimal.
+        """
+        return count * self.units / self.scale
+
+    def is_multiple(self, value: float, count: int) -> bool:
+        """
+        Whether value is exactly count times target, which is certain when
+        the product has less than 15 significant digits.
+        """
+        return abs(count * self.units) < 10 ** 15 and self.to_float(count) == value
+
+    def round(self, value: float) -> float:
+        """"""
+        if self.units:
+            n = value / self.target
+            count = round(n)
+
+            if abs(abs(n - count) - 0.5) > (abs(n) + 1) * 1e-9:
+                return self.to_float(count)
+
+        return round_to(value, self.target)
+
+    def round_array(self, values: np.ndarray) -> np.ndarray:
+        """
+        Round array of values with the same result as round.
+        """
+        n = values / self.target
+        counts = np.round(n)
+        result = counts * self.units / self.scale
+
+        ambiguous = np.abs(np.abs(n - counts) - 0.5) <= (np.abs(n) + 1) * 1e-9
+        for ix in np.flatnonzero(ambiguous).tolist():
+            result[ix] = round_to(float(values[ix]), self.target)
+
+        return result
+
+    def floor(self, value: float) -> float:
+        """"""
+        if self.units:
+            n = value / self.target
+            count = round(n)
+
+            if self.is_multiple(value, count):
+                return self.to_float(count)
+
+            count = floor(n)
+            if min(n - count, count + 1 - n) > (abs(n) + 1) * 1e-9:
+                return self.to_float(count)
+
+        return floor_to(value, self.target)
+
+    def ceil(self, value: float) -> float:
+        """"""
+        if self.units:
+            n = value / self.target
+            count = round(n)
+
+            if self.is_multiple(value, count):
+                return self.to_float(count)
+
+            count = ceil(n)
+            if min(count - n, n - count + 1) > (abs(n) + 1) * 1e-9:
+                return self.to_float(count)
+
+        return ceil_to(value, self.target)
+
+
 def get_digits(value: float) -> int:
     """
     Get number of digits after decimal point.
@@ -163,6 +254,50 @@ def get_digits(value: float) -> int:
         return 0
 
 
+def get_day_starts(datetimes: Iterable[datetime]) -> np.ndarray:
+    """
+    Return index array of the first datetime of each day, by comparing
+    dates of all datetimes in batch. Datetime64 array is also accepted.
+    """
+    if isinstance(datetimes, np.ndarray) and datetimes.dtype.kind == "M":
+        ordinals = datetimes.astype("datetime64[D]").astype(np.int64)
+    else:
+        ordinals = np.fromiter(map(datetime.toordinal, datetimes), dtype=np.int64)
+    if not len(ordinals):
+        return ordinals
+
+    return np.concatenate(([0], np.flatnonzero(np.diff(ordinals)) + 1))
+
+
+def split_days(data: Iterable, chunk_size: int = 100000) -> Iterator[list]:
+    """
+    Yield list of bar/tick data of each day. Day boundaries of a list are
+    found at once, other iterable is read by chunk and data of the last
+    unfinished day is carried into the next chunk.
+    """
+    if isinstance(data, list):
+        chunks = [data] if data else []
+    else:
+        iterator = iter(data)
+        chunks = iter(lambda: list(islice(iterator, chunk_size)), [])
+
+    day_data = []
+
+    for chunk in chunks:
+        if day_data:
+            chunk = day_data + chunk
+
+        starts = get_day_starts(map(attrgetter("datetime"), chunk)).tolist()
+
+        for start, end in zip(starts, starts[1:]):
+            yield chunk[start:end]
+
+        day_data = chunk[starts[-1]:]
+
+    if day_data:
+        yield day_data
+
+
 class BarGenerator:
     """
     For: